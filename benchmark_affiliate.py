@@ -0,0 +1,91 @@
+"""
+Micro-benchmark för affiliate-matchningen
+Jämför den kompilerade katalogen (ett regex, ett svep) med den tidigare metoden
+(gemener + en substring-sökning per nyckelord och kategori) på typiska coach-svar,
+både med dagens katalog och med syntetiskt större kataloger
+
+Exempel:
+    python benchmark_affiliate.py --iterations 20000 --scale 1 10 50
+"""
+
+import sys
+import os
+import argparse
+import copy
+import json
+import time
+from typing import Callable, Dict, List
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.affiliate_matcher import CompiledCatalog
+from utils.config import Config
+
+SAMPLES = [
+    ("Hur kommer jag igång med machine learning?",
+     "Ett bra första steg är en grundkurs i Python och sedan ett litet eget projekt. "
+     "Sätt ett konkret mål för de kommande fyra veckorna och följ upp varje fredag. " * 3),
+    ("Jag känner mig stressad över mitt nya ledaransvar",
+     "Det är helt naturligt att känna så i en ny roll. Vilka situationer upplever du som "
+     "mest krävande just nu? Ofta hjälper det att skilja på det du kan påverka och det du inte kan. " * 4),
+    ("Hur skapar vi en AI-strategi för universitetet?",
+     "Börja med en kartläggning av befintliga initiativ, identifiera nyckelintressenter och "
+     "välj ett pilotprojekt med tydlig nytta. Governance och etik behöver finnas med från start. " * 5),
+]
+
+def legacy_matcher(catalog: CompiledCatalog) -> Callable[[str, str], List[str]]:
+    """Den tidigare metoden: substring-sökning per nyckelord över sammanslagen gemen text"""
+    categories = [(c.id, [k.rstrip("*") for k in c.keywords]) for c in catalog.categories]
+
+    def match(ai_response: str, user_message: str) -> List[str]:
+        combined_text = (ai_response.lower() + " " + user_message.lower()).strip()
+        return [cid for cid, keywords in categories if any(k in combined_text for k in keywords)]
+
+    return match
+
+def scaled_catalog(data: Dict, scale: int) -> Dict:
+    """Katalog med ``scale`` gånger så många nyckelord (syntetiska, matchar aldrig)"""
+    data = copy.deepcopy(data)
+    for category in data["categories"]:
+        base = list(category["keywords"])
+        category["keywords"] += [f"{k.rstrip('*')}zq{i}" for i in range(1, scale) for k in base]
+    return data
+
+def time_it(fn: Callable, iterations: int) -> float:
+    """Mikrosekunder per anrop över alla exempeltexter"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for user_message, ai_response in SAMPLES:
+            fn(ai_response, user_message)
+    return (time.perf_counter() - started) / (iterations * len(SAMPLES)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark för affiliate-matchning")
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 5, 20],
+                        help="Multiplicera katalogens antal nyckelord")
+    args = parser.parse_args()
+
+    with open(Config.AFFILIATE_CATALOG_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    catalog = CompiledCatalog(data)
+    legacy = legacy_matcher(catalog)
+
+    print("🚀 Affiliate-matchning")
+    for user_message, ai_response in SAMPLES:
+        print(f"   {user_message[:40]:<40} gammal={legacy(ai_response, user_message)} "
+              f"ny={catalog.match(ai_response, user_message)}")
+
+    print(f"\n{'nyckelord':>10} {'substring µs':>14} {'regex µs':>10} {'kvot':>6}")
+    for scale in args.scale:
+        catalog = CompiledCatalog(scaled_catalog(data, scale))
+        keywords = sum(len(c.keywords) for c in catalog.categories)
+        iterations = max(1, args.iterations // scale)
+        legacy_us = time_it(legacy_matcher(catalog), iterations)
+        compiled_us = time_it(catalog.match, iterations)
+        print(f"{keywords:>10} {legacy_us:>14.2f} {compiled_us:>10.2f} {legacy_us / compiled_us:>5.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Benchmark för AI-Coachen
+Mäter vår egen overhead per steg i get_response (prompt-bygge med RAG, cache-uppslag,
+affiliate-efterbehandling, usage-spårning, sammanfattning) och end-to-end-percentiler
+vid olika samtidighet - mot den lokala stub-servern, utan API-nyckel eller kostnad
+
+Exempel:
+    python benchmark_ai_coach.py --requests 50 --concurrency 1 4 16 --latency-ms 200
+    python benchmark_ai_coach.py --stream --json resultat.json
+"""
+
+import sys
+import os
+import argparse
+import json
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Benchmarken ska aldrig skriva i appens riktiga databaser
+_BENCH_DIR = tempfile.mkdtemp(prefix="ai_coach_bench_")
+os.environ.setdefault("RESPONSE_CACHE_PATH", os.path.join(_BENCH_DIR, "response_cache.db"))
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(_BENCH_DIR, "coach.db"))
+os.environ.setdefault("MEMORY_DB_PATH", os.path.join(_BENCH_DIR, "memory.db"))
+
+from core.ai_coach import AICoach, CoachingMode
+from utils.api_usage_tracker import usage_tracker
+from utils.openai_stub_server import StubServer
+
+# Steg som mäts; "upstream" är tiden i själva API-anropet (inkl. retries)
+STAGES = {
+    "_prepare_api_messages": "prompt (RAG + packning)",
+    "_lookup_cached_response": "cache-uppslag",
+    "_affiliate_annotations": "affiliate",
+    "_track_usage": "usage-spårning",
+    "_refresh_summary": "sammanfattning",
+}
+
+QUESTIONS = [
+    "Hur kommer jag igång med machine learning?",
+    "Jag vill bli bättre på att prioritera mina mål",
+    "Hur skapar jag en AI-strategi för vårt universitet?",
+    "Vad är skillnaden mellan AI och machine learning?",
+    "Hur hanterar jag motstånd mot förändring i min grupp?",
+    "Vilken Python-kurs rekommenderar du för nybörjare?",
+]
+
+def percentile(samples: List[float], p: float) -> float:
+    """Percentil med närmaste rang"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+class StageTimer:
+    """Trådsäker insamling av tid per steg (och upstream-tid för aktuell tur per tråd)"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.turn = threading.local()
+        self._lock = threading.Lock()
+
+    def wrap(self, name: str, fn):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(name, (time.perf_counter() - started) * 1000)
+        return timed
+
+    def add(self, name: str, ms: float):
+        with self._lock:
+            self.samples[name].append(ms)
+
+class TimedCaller:
+    """Mäter tiden i API-anropen och för över resten till den riktiga ResilientCaller"""
+
+    def __init__(self, caller, timer: StageTimer):
+        self.caller = caller
+        self.timer = timer
+
+    def call(self, fn, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.caller.call(fn, **kwargs)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.timer.add("upstream", elapsed)
+            self.timer.turn.upstream_ms = getattr(self.timer.turn, "upstream_ms", 0.0) + elapsed
+
+    def __getattr__(self, name):
+        return getattr(self.caller, name)
+
+def instrument(coach: AICoach, timer: StageTimer):
+    """Mät coachens steg genom att omsluta instansens metoder (ersätter tidigare mätning)"""
+    for method in STAGES:
+        setattr(coach, method, timer.wrap(method, getattr(type(coach), method).__get__(coach)))
+
+    caller = coach.caller.caller if isinstance(coach.caller, TimedCaller) else coach.caller
+    coach.caller = TimedCaller(caller, timer)
+
+def run_level(coach: AICoach, concurrency: int, requests: int, stream: bool) -> Dict:
+    """Kör ``requests`` turer fördelade på ``concurrency`` parallella sessioner"""
+    timer = StageTimer()
+    instrument(coach, timer)
+
+    session_ids = [coach.start_session(f"bench_{concurrency}_{i}", CoachingMode.HYBRID)
+                   for i in range(concurrency)]
+    end_to_end: List[float] = []
+    own_overhead: List[float] = []
+    ttft: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one_turn(index: int):
+        nonlocal errors
+        session_id = session_ids[index % concurrency]
+        question = QUESTIONS[index % len(QUESTIONS)] + f" (#{index})"
+        timer.turn.upstream_ms = 0.0
+        started = time.perf_counter()
+        if stream:
+            first = None
+            for _ in coach.stream_response(question, session_id=session_id):
+                if first is None:
+                    first = (time.perf_counter() - started) * 1000
+            metadata = coach.get_last_response_metadata(session_id)
+        else:
+            _, metadata = coach.get_response(question, session_id=session_id)
+            first = None
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            end_to_end.append(elapsed)
+            if not stream:
+                # Vid streaming ligger läsningen av strömmen utanför upstream-mätningen
+                own_overhead.append(elapsed - timer.turn.upstream_ms)
+            if first is not None:
+                ttft.append(first)
+            if "error" in metadata:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_turn, range(requests)))
+    wall = time.perf_counter() - started
+
+    for session_id in session_ids:
+        coach.sessions.remove(session_id)
+
+    stages = {
+        STAGES.get(name, name): {
+            "p50_ms": percentile(samples, 50),
+            "p95_ms": percentile(samples, 95),
+            "mean_ms": sum(samples) / len(samples)
+        }
+        for name, samples in timer.samples.items()
+    }
+
+    result = {
+        "concurrency": concurrency,
+        "requests": requests,
+        "stream": stream,
+        "errors": errors,
+        "throughput_rps": requests / wall if wall else 0,
+        "end_to_end": {p: percentile(end_to_end, float(p[1:])) for p in ("p50", "p95", "p99")},
+        "own_overhead": {p: percentile(own_overhead, float(p[1:])) for p in ("p50", "p95")},
+        "stages": stages
+    }
+    if ttft:
+        result["ttft"] = {p: percentile(ttft, float(p[1:])) for p in ("p50", "p95", "p99")}
+    return result
+
+def print_result(result: Dict):
+    """Skriv ut resultat för en samtidighetsnivå"""
+    e2e = result["end_to_end"]
+    print(f"\n⚙️  Samtidighet {result['concurrency']}: {result['requests']} anrop, "
+          f"{result['throughput_rps']:.1f} anrop/s, {result['errors']} fel")
+    print(f"   End-to-end p50/p95/p99: {e2e['p50']:.1f} / {e2e['p95']:.1f} / {e2e['p99']:.1f} ms")
+    if "ttft" in result:
+        ttft = result["ttft"]
+        print(f"   Första token p50/p95/p99: {ttft['p50']:.1f} / {ttft['p95']:.1f} / {ttft['p99']:.1f} ms")
+    if not result["stream"]:
+        overhead = result["own_overhead"]
+        print(f"   Egen overhead (exkl. upstream) p50/p95: {overhead['p50']:.2f} / {overhead['p95']:.2f} ms")
+    for name, stage in sorted(result["stages"].items(), key=lambda item: -item[1]["mean_ms"]):
+        print(f"   - {name:<26} p50 {stage['p50_ms']:8.2f} ms   p95 {stage['p95_ms']:8.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark av AICoach.get_response mot lokal stub")
+    parser.add_argument("--requests", type=int, default=40, help="Anrop per samtidighetsnivå")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency-ms", type=float, default=100, help="Stubbens svarstid")
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stream", action="store_true", help="Mät stream_response istället")
+    parser.add_argument("--with-cache", action="store_true", help="Behåll svarscacharna påslagna")
+    parser.add_argument("--json", help="Spara resultat som JSON")
+    args = parser.parse_args()
+
+    # Usage-historiken ska inte hamna i data/api_usage.json
+    usage_tracker.usage_file = os.path.join(_BENCH_DIR, "api_usage.json")
+    usage_tracker.usage_history = []
+
+    print("🚀 AI-Coachen benchmark")
+    results = []
+    with StubServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                    ttft_ms=args.latency_ms / 2, token_interval_ms=2,
+                    error_rate=args.error_rate, error_status=503, seed=42) as stub:
+        coach = AICoach(api_key="benchmark", base_url=stub.base_url)
+        if not args.with_cache:
+            coach.response_cache = None
+            coach.semantic_cache = None
+
+        # Uppvärmning: RAG-index, token-räknare och HTTP-anslutningar
+        run_level(AICoach(api_key="benchmark", base_url=stub.base_url), 1, 3, args.stream)
+
+        for concurrency in args.concurrency:
+            result = run_level(coach, concurrency, args.requests, args.stream)
+            print_result(result)
+            results.append(result)
+        print(f"\n🧪 Stubben tog emot {stub.requests} anrop ({stub.errors_injected} injicerade fel)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultat sparat i {args.json}")
+
+if __name__ == "__main__":
+    main()
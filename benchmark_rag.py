@@ -0,0 +1,115 @@
+"""
+Jämförelse av kunskapsbasens scorers
+Mäter recall@k på en liten märkt frågemängd (svenska frågor med böjda former och
+skiljetecken) samt latens per fråga för Jaccard-scorern och BM25F-scorern, både
+med dagens kunskapsbas och med kunskapsbasen utökad med syntetiska avsnitt (egen
+vokabulär, så latensen ska ligga still när antalet dokument växer)
+
+Exempel:
+    python benchmark_rag.py --iterations 200 --docs 26 2600 26000
+"""
+
+import sys
+import os
+import argparse
+import time
+from typing import Dict, List, Set, Tuple
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.ai_expert_knowledge import ai_expert_knowledge
+from utils.rag_system import SimpleRAGSystem
+
+# (fråga, titlar som ska finnas bland de k första)
+LABELED_QUERIES: List[Tuple[str, Set[str]]] = [
+    ("Vad är machine learning och vilka typer finns?", {"Machine Learning Fundamentals"}),
+    ("Hur tränar man neurala nätverk med deep learning?", {"Deep Learning Essentials"}),
+    ("Hur fungerar attention i transformer-modellerna?", {"Transformer Architecture Deep Dive"}),
+    ("Vilka språkmodeller (LLM:er) passar för prompt engineering?", {"Large Language Models (LLMs)"}),
+    ("Kan generativ AI skapa bilder åt oss?", {"Generative AI Models"}),
+    ("Hur sätter vi upp MLOps och övervakning av modellerna?", {"MLOps Best Practices"}),
+    ("Datakvaliteten i våra AI-projekt är dålig, vad gör vi?", {"Data Quality for AI Success"}),
+    ("Hur driftsätter vi modellen med Docker och Kubernetes?", {"AI Model Deployment Strategies"}),
+    ("Hur räknar jag på ROI för ett AI-pilotprojekt?", {"AI ROI and Business Case Development"}),
+    ("Vi behöver en roadmap för AI-transformationen", {"AI Transformation Roadmap"}),
+    ("Hur mogen är organisationen för AI? Vi vill göra en assessment", {"AI Maturity Assessment"}),
+    ("Vilka Python-bibliotek behöver jag för ML, t.ex. Pandas?", {"Python for AI/ML Development"}),
+    ("Ska vi välja Azure eller AWS för våra AI-tjänster i molnet?", {"Cloud AI Services Strategy"}),
+    ("Hur använder vi embeddings och en vektordatabas för RAG i vår AI-app?", {"Vector Databases and Embeddings"}),
+    ("Hur skyddar vi modellen mot prompt injection och adversarial attacker?", {"AI Security Best Practices"}),
+    ("Vad kräver GDPR och EU AI Act av vår AI-lösning?", {"GDPR and AI Compliance"}),
+    ("Hur minskar vi bias och gör AI:n mer etisk?", {"Ethical AI and Bias Mitigation"}),
+    ("Hur kan AI hjälpa forskningen med litteraturöversikter?", {"AI in Academic Research"}),
+    ("Hur använder universitetet learning analytics för studenterna?", {"Learning Analytics and Educational AI"}),
+    ("Hur utbildar vi lärarna (faculty) i AI?", {"Faculty AI Training and Support"}),
+]
+
+def recall_at_k(rag: SimpleRAGSystem, k: int) -> Tuple[float, List[str]]:
+    """Andel förväntade titlar bland de k första, och frågorna som missade"""
+    found = 0
+    expected_total = 0
+    misses = []
+    for query, expected in LABELED_QUERIES:
+        titles = {ctx.title for ctx in rag.retrieve_relevant_context(query, top_k=k)}
+        hits = len(expected & titles)
+        found += hits
+        expected_total += len(expected)
+        if hits < len(expected):
+            misses.append(query)
+    return found / expected_total, misses
+
+def scaled_docs(docs: List[Dict], total: int) -> List[Dict]:
+    """Kunskapsbasen plus syntetiska avsnitt upp till ``total`` dokument"""
+    filler = [
+        {
+            "title": f"Avsnitt zq{index}",
+            "content": " ".join(f"zq{(index * 31 + word) % 20011}" for word in range(80)),
+            "keywords": [f"zk{index % 997}"],
+            "category": "syntet",
+            "coaching_context": ""
+        }
+        for index in range(max(0, total - len(docs)))
+    ]
+    return list(docs) + filler
+
+def time_per_query(rag: SimpleRAGSystem, iterations: int) -> float:
+    """Mikrosekunder per retrieve_relevant_context över frågemängden"""
+    queries = [query for query, _ in LABELED_QUERIES]
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for query in queries:
+            rag.retrieve_relevant_context(query)
+    return (time.perf_counter() - started) / (iterations * len(queries)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Jämför Jaccard- och BM25F-scorern för kunskapsbasen")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--docs", type=int, nargs="+", default=[26, 2600, 26000],
+                        help="Antal dokument (kunskapsbasen fylls på med syntetiska avsnitt)")
+    args = parser.parse_args()
+
+    docs = ai_expert_knowledge.get_all_knowledge()
+    scorers = ("jaccard", "bm25")
+
+    print(f"🎯 Recall@{args.k} på {len(LABELED_QUERIES)} märkta frågor")
+    for scorer in scorers:
+        recall, misses = recall_at_k(SimpleRAGSystem(docs, scorer=scorer), args.k)
+        print(f"   {scorer:<8} {recall:.0%}")
+        for query in misses:
+            print(f"      miss: {query}")
+
+    print(f"\n{'dokument':>10} {'jaccard µs':>12} {'bm25 µs':>10} {'bygg bm25 s':>12}")
+    for total in args.docs:
+        scaled = scaled_docs(docs, total)
+        iterations = args.iterations
+        jaccard_us = time_per_query(SimpleRAGSystem(scaled, scorer="jaccard"), iterations)
+        started = time.perf_counter()
+        bm25 = SimpleRAGSystem(scaled, scorer="bm25")
+        build_s = time.perf_counter() - started
+        bm25_us = time_per_query(bm25, iterations)
+        print(f"{len(scaled):>10} {jaccard_us:>12.1f} {bm25_us:>10.1f} {build_s:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Mätning av uppstartstid
+Kör varje mätning i en ny Python-process: importtid för core.ai_coach, tid till
+första RAG-svar (det enkla systemet byggs vid första användning) och hur lång
+tid det fullständiga RAG-systemet tar att bygga - det som importen tidigare
+blockerade på innan Streamlit kunde rendera något
+
+Exempel:
+    python benchmark_startup.py --runs 5
+"""
+
+import sys
+import os
+import argparse
+import json
+import statistics
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import core.ai_coach
+imported = time.perf_counter()
+from utils.rag_system import rag_system, create_rag_system
+rag_system.build_context_block("Vad är machine learning?")
+first_answer = time.perf_counter()
+eager_started = time.perf_counter()
+create_rag_system()
+eager = time.perf_counter() - eager_started
+rag_system.warm_up(background=False)
+print(json.dumps({
+    "import_s": imported - started,
+    "first_rag_answer_s": first_answer - imported,
+    "eager_rag_build_s": eager,
+    "warmup_s": rag_system.get_status()["warmup_seconds"],
+    "backend": rag_system.get_status()["backend"]
+}))
+"""
+
+def run_probe() -> dict:
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=PROJECT_ROOT,
+                            capture_output=True, text=True, timeout=600)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Mät importtid och RAG-uppvärmning i nya processer")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_probe() for _ in range(args.runs)]
+
+    print(f"🚀 Uppstart ({args.runs} nya processer, median)")
+    print(f"   RAG-backend efter uppvärmning: {runs[-1]['backend']}")
+    for key, label in [
+        ("import_s", "import core.ai_coach"),
+        ("first_rag_answer_s", "första RAG-svar (SimpleRAGSystem)"),
+        ("eager_rag_build_s", "create_rag_system() (tidigare vid import)"),
+        ("warmup_s", "uppvärmning i bakgrunden"),
+    ]:
+        print(f"   {label:<45} {statistics.median(run[key] for run in runs) * 1000:>9.1f} ms")
+
+if __name__ == "__main__":
+    main()
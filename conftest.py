@@ -0,0 +1,17 @@
+"""
+Gemensam pytest-konfiguration
+Under pytest importeras alla testmoduler i samma process och Config läses vid
+första importen, så databaser och cacher pekas mot en temporär katalog innan
+någon testmodul laddas. Testskripten sätter samma variabler själva när de körs
+direkt med python
+"""
+
+import os
+import tempfile
+
+_TEST_DIR = tempfile.mkdtemp(prefix="coach_pytest_")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DIR, "sessions.db")
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+os.environ["RAG_EMBEDDING_CACHE_DIR"] = os.path.join(_TEST_DIR, "embeddings")
+os.environ["MODEL_ROUTER_LOG_PATH"] = os.path.join(_TEST_DIR, "model_routing.jsonl")
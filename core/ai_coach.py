@@ -7,14 +7,29 @@ Nu med AI-expertis via RAG-system för förbättrade AI-relaterade svar
 import os
 import json
 import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
 
 import openai
 from pydantic import BaseModel
-import tiktoken
+
+from utils.token_counter import count_static_tokens, count_tokens, get_encoding
+from utils.context_packer import ContextPacker
+from utils.config import Config
+from utils.response_cache import response_cache
+from utils.semantic_cache import semantic_cache
+from utils.affiliate_matcher import affiliate_matcher
+from utils.resilient_client import DeadlineExceededError, UpstreamUnavailableError, resilient_caller
+from utils.model_router import FALLBACK_ERRORS, RoutingDecision, model_router
+from utils.single_flight import FlightAbandoned, request_flights
+from utils.long_term_memory import build_extraction_messages, long_term_memory, parse_extraction
+from utils.spans import span_registry
+from core.session_registry import Message, session_registry
 
 # Importera AI-expertis moduler
 try:
@@ -24,6 +39,10 @@ except ImportError:
     AI_EXPERT_AVAILABLE = False
     logging.warning("AI Expert integration inte tillgänglig - kör utan AI-expertis")
 
+def _as_datetime(value) -> datetime:
+    """Tidsstämpel från databasen: ISO-sträng i SQLite, datetime i Postgres"""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
 class CoachingMode(Enum):
     PERSONAL = "personal"
     UNIVERSITY = "university"
@@ -40,19 +59,51 @@ class CoachingSession:
     user_id: str
     mode: CoachingMode
     start_time: datetime
-    messages: List[Dict]
+    messages: List[Message]
     context: Dict
     goals: List[str]
     progress_notes: str
+    total_tokens: int = 0  # Löpande summa av meddelandenas token-antal
+    summary: str = ""  # Rullande sammanfattning av meddelanden utanför kontextfönstret
+    summary_tokens: int = 0
+    summarized_count: int = 0  # Antal historikmeddelanden som vävts in i sammanfattningen
+    context_start: int = 0  # Index i historiken för äldsta meddelandet i senaste prompten
+    persisted_count: int = 1  # Antal meddelanden (inkl. system-prompt) som finns i databasen
+    history_offset: int = 0  # Äldre historikmeddelanden som bara finns i databasen (ej inladdade)
+    older_cursor: Optional[int] = None  # messages.id för äldsta inladdade meddelande
+    annotation_tokens_saved: int = 0  # Annoteringstokens som hållits utanför prompterna
+    memory_tokens: int = 0  # Tokens från långtidsminnet i senaste prompten
+    template_tokens_saved: int = 0  # Tokens som förkompilerade expertismallar sparade i senaste prompten
+    total_template_tokens_saved: int = 0
+    last_response_metadata: Dict = field(default_factory=dict)
 
 class AICoach:
     """Huvudklass för AI-coachen med dubbla roller"""
     
-    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo"):
-        self.client = openai.OpenAI(api_key=api_key)
+    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo", base_url: str = None):
+        self.client = self._create_client(api_key, base_url or Config.OPENAI_BASE_URL)
         self.model = model
-        self.encoding = tiktoken.encoding_for_model(model)
-        self.max_tokens = 4000
+        self.encoding = get_encoding(model)
+        self.max_tokens = 4000  # Token-budget för hela prompten
+        self.context_packer = ContextPacker(budget_tokens=self.max_tokens)
+        self.response_cache = response_cache if Config.ENABLE_RESPONSE_CACHE else None
+        self.semantic_cache = semantic_cache if Config.ENABLE_SEMANTIC_CACHE else None
+        # Deadlines, retries, hedging och circuit breaker för alla API-anrop
+        self.caller = resilient_caller
+        
+        # Modellval per tur (avstängd router ger alltid self.model)
+        self.router = model_router
+        
+        # Idempotensnycklar och koalescering av identiska anrop
+        self.flights = request_flights
+        # Fakta från avslutade sessioner per användare (Config.ENABLE_MEMORY); extraktionen
+        # körs i en egen tråd så att end_session inte väntar på modellanropet
+        self.memory = long_term_memory
+        self._memory_executor: Optional[ThreadPoolExecutor] = None
+        self._memory_tasks: List[Future] = []
+        self._memory_lock = threading.Lock()
+        # Tidsmätning per steg (Config.SPAN_SAMPLE_RATE av turerna)
+        self.spans = span_registry
         
         # Setup logging
         logging.basicConfig(level=logging.INFO)
@@ -65,9 +116,32 @@ class AICoach:
             CoachingMode.HYBRID: self._get_hybrid_coach_persona()
         }
         
-        # Current session
+        # Statiska AI-riktlinjer hör till det stabila prefixet så att det är identiskt varje tur
+        if AI_EXPERT_AVAILABLE:
+            guidelines = ai_expert_integration.get_static_guidelines()
+            self.personas = {mode: f"{persona}\n{guidelines}" for mode, persona in self.personas.items()}
+        
+        # Token-antal för personas räknas en gång per process
+        self.persona_tokens = {
+            mode: count_static_tokens(persona, model)
+            for mode, persona in self.personas.items()
+        }
+        
+        # Processgemensamt sessionsregister - en coach-motor betjänar alla sessioner
+        self.sessions = session_registry
+        self.sessions.restorer = self._restore_session
+        
+        # Current session (för enkla skript med en användare)
         self.current_session: Optional[CoachingSession] = None
         
+        # Metadata från senaste strömmade svaret
+        self.last_response_metadata: Dict = {}
+    
+    def _create_client(self, api_key: str, base_url: str = None):
+        """Skapa OpenAI-klienten (överskuggas av den asynkrona varianten)"""
+        # Retries sköts av self.caller så att de räknas mot anropets deadline
+        return openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        
     def _get_personal_coach_persona(self) -> str:
         """Personlig coach-persona"""
         return """
@@ -133,9 +207,151 @@ class AICoach:
     def start_session(self, user_id: str, mode: CoachingMode, 
                      context: Dict = None) -> str:
         """Starta en ny coaching-session"""
-        session_id = f"{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        session = self._new_session(user_id, mode, context)
+        session_id = self.sessions.add(session)
+        self.current_session = session
+        
+        self.logger.info(f"Started session {session_id} in {mode.value} mode")
+        return session_id
+    
+    def _resolve_session(self, session_id: Optional[str] = None) -> CoachingSession:
+        """Hämta session via id från registret, annars aktuell session"""
+        if session_id:
+            session = self.sessions.get(session_id)
+            if not session:
+                raise ValueError(f"Ingen aktiv session med id {session_id}")
+            return session
+        
+        if not self.current_session:
+            raise ValueError("Ingen aktiv session. Starta en session först.")
+        return self.current_session
+    
+    def _restore_session(self, row: Dict, data_manager) -> CoachingSession:
+        """Bygg upp en session från databasen (används av sessionsregistret)
+        
+        Bara det senaste fönstret läses in: sidor hämtas nyast först tills context
+        packerns budget är fylld och alla meddelanden som ännu inte vävts in i den
+        sparade sammanfattningen finns med. Äldre meddelanden ligger kvar i databasen
+        och hämtas för gränssnittet med ``get_message_page``, så återupptagningen tar
+        lika lång tid oavsett hur lång sessionen är.
+        """
+        mode = CoachingMode(row['mode'])
+        session = CoachingSession(
+            session_id=row['id'],
+            user_id=row['user_id'],
+            mode=mode,
+            start_time=_as_datetime(row['start_time']),
+            messages=[Message("system", self.personas[mode], self.persona_tokens[mode])],
+            context=row.get('context') or {},
+            goals=row.get('goals') or [],
+            progress_notes=row.get('progress_notes') or "",
+            total_tokens=self.persona_tokens[mode]
+        )
         
-        self.current_session = CoachingSession(
+        stored = data_manager.count_session_messages(session.session_id)
+        summarized = row.get('summarized_count') or 0
+        pages = []
+        loaded = 0
+        window_tokens = 0
+        before_id = None
+        while loaded < min(stored, Config.RESUME_MAX_MESSAGES):
+            rows = data_manager.load_session_messages_page(session.session_id, before_id,
+                                                           Config.RESUME_PAGE_SIZE)
+            if not rows:
+                break
+            page = [self._message_from_row(message_row) for message_row in rows]
+            pages.append(page)
+            loaded += len(page)
+            window_tokens += sum(message.tokens for message in page)
+            before_id = rows[0]['id']
+            if window_tokens >= self.context_packer.budget_tokens and stored - loaded <= summarized:
+                break
+        
+        for page in reversed(pages):
+            session.messages.extend(page)
+        session.total_tokens += window_tokens
+        session.history_offset = max(0, stored - loaded)
+        session.older_cursor = before_id if session.history_offset else None
+        
+        session.summary = row.get('summary') or ""
+        session.summary_tokens = count_tokens(session.summary, self.model)
+        session.summarized_count = max(0, summarized - session.history_offset)
+        session.persisted_count = len(session.messages)
+        return session
+    
+    def _message_from_row(self, message_row: Dict) -> Message:
+        """Meddelandepost från en rad i messages-tabellen"""
+        metadata = message_row.get('metadata') or {}
+        content = message_row['content']
+        annotations = metadata.get('annotations')
+        if annotations is None and message_row['role'] == ConversationRole.ASSISTANT.value:
+            # Äldre rader har affiliate-blocket inbakat i texten
+            content, annotations = affiliate_matcher.split_annotations(content)
+            metadata.pop('tokens', None)
+        tokens = metadata.get('tokens')
+        if tokens is None:
+            tokens = count_tokens(content, self.model)
+        return Message(
+            message_row['role'],
+            content,
+            tokens,
+            _as_datetime(message_row['timestamp']).timestamp(),
+            annotations or ""
+        )
+    
+    def resume_session(self, session_id: str) -> Optional[str]:
+        """Återuppta en sparad session (laddar bara fönstret som kontexten behöver)"""
+        session = self.sessions.resume(session_id)
+        if session is None:
+            return None
+        self.current_session = session
+        self.logger.info(f"Resumed session {session_id} ({len(session.messages) - 1} messages loaded, "
+                         f"{session.history_offset} older left in the database)")
+        return session.session_id
+    
+    def get_display_messages(self, session_id: Optional[str] = None) -> List[Dict]:
+        """Inladdade meddelanden (utan system-prompt) i visningsformat för gränssnittet"""
+        session = self._resolve_session(session_id)
+        return [
+            {"role": message.role, "content": message.display_text, "timestamp": message.timestamp}
+            for message in session.messages[1:]
+        ]
+    
+    def get_history_cursor(self, session_id: Optional[str] = None) -> Optional[int]:
+        """Cursor för första sidan äldre meddelanden (None om allt redan är inladdat)"""
+        return self._resolve_session(session_id).older_cursor
+    
+    def get_message_page(self, session_id: Optional[str] = None, before_id: Optional[int] = None,
+                         limit: int = None) -> Tuple[List[Dict], Optional[int]]:
+        """Äldre meddelanden för bläddring bakåt i gränssnittet
+        
+        Utan ``before_id`` ges sidan närmast före det inladdade fönstret (se
+        ``get_history_cursor``); returnerad cursor skickas in som ``before_id`` nästa
+        gång och är None när det inte finns något äldre. Sidorna läggs inte in i
+        sessionen.
+        """
+        session = self._resolve_session(session_id)
+        before_id = before_id if before_id is not None else session.older_cursor
+        if before_id is None:
+            return [], None
+        
+        limit = limit or Config.RESUME_PAGE_SIZE
+        rows = self.sessions.message_page(session.session_id, before_id, limit)
+        messages = []
+        for message_row in rows:
+            message = self._message_from_row(message_row)
+            messages.append({"role": message.role, "content": message.display_text,
+                             "timestamp": message.timestamp})
+        next_cursor = rows[0]['id'] if len(rows) == limit else None
+        return messages, next_cursor
+    
+    def _new_session(self, user_id: str, mode: CoachingMode, 
+                     context: Dict = None) -> CoachingSession:
+        """Skapa en ny session med system-prompt för valt läge"""
+        # Mikrosekunder: en avslutad session finns kvar i databasen men inte i registret
+        session_id = f"{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        
+        session = CoachingSession(
             session_id=session_id,
             user_id=user_id,
             mode=mode,
@@ -148,226 +364,695 @@ class AICoach:
         
         # Lägg till system-prompt baserat på läge
         system_prompt = self.personas[mode]
-        self.current_session.messages.append({
-            "role": "system",
-            "content": system_prompt
-        })
+        session.messages.append(Message("system", system_prompt, self.persona_tokens[mode]))
+        session.total_tokens = self.persona_tokens[mode]
         
-        self.logger.info(f"Started session {session_id} in {mode.value} mode")
-        return session_id
+        return session
     
-    def add_message(self, message: str, role: ConversationRole = ConversationRole.USER) -> str:
+    def add_message(self, message: str, role: ConversationRole = ConversationRole.USER,
+                    session_id: Optional[str] = None) -> str:
         """Lägg till meddelande i sessionen"""
-        if not self.current_session:
-            raise ValueError("Ingen aktiv session. Starta en session först.")
-        
-        self.current_session.messages.append({
-            "role": role.value,
-            "content": message,
-            "timestamp": datetime.now().isoformat()
-        })
+        self._append_message(self._resolve_session(session_id), message, role)
         
         return "Message added successfully"
     
-    def get_response(self, user_message: str) -> Tuple[str, Dict]:
-        """Få svar från AI-coachen med AI-expertis integration"""
-        if not self.current_session:
-            raise ValueError("Ingen aktiv session. Starta en session först.")
+    def _append_message(self, session: CoachingSession, message: str,
+                        role: ConversationRole = ConversationRole.USER, annotations: str = ""):
+        """Lägg till meddelande i en given session
         
-        # Lägg till användarmeddelande
-        self.add_message(user_message, ConversationRole.USER)
+        ``annotations`` visas bara i gränssnittet och räknas inte in i ``total_tokens``.
+        """
+        # Token-antalet räknas en gång här så att varje tur slipper koda om historiken
+        with self.spans.span("token_counting"):
+            tokens = count_tokens(message, self.model)
+        session.messages.append(Message(role.value, message, tokens, annotations=annotations))
+        session.total_tokens += tokens
+    
+    def _prepare_api_messages(self, session: CoachingSession, user_message: str) -> List[Dict]:
+        """Bygg meddelandelistan som skickas till OpenAI för aktuell tur"""
+        with self.spans.span("history_prep"):
+            return self._build_api_messages(session, user_message)
+    
+    def _build_api_messages(self, session: CoachingSession, user_message: str) -> List[Dict]:
+        """Promptbygget i _prepare_api_messages (mäts som spanen history_prep)"""
+        system_prompt = session.messages[0].content
+        system_tokens = session.messages[0].tokens
+        
+        # AI-expertis och RAG-kontext för aktuell fråga läggs efter det stabila prefixet
+        # (persona + historik) så att leverantörens prompt-cache kan träffa
+        # (expertismallen är förkompilerad med känt token-antal - bara RAG-delen räknas per tur)
+        turn_context = ""
+        turn_context_tokens = 0
+        session.template_tokens_saved = 0
+        if AI_EXPERT_AVAILABLE:
+            with self.spans.span("prompt_enhancement"):
+                built = ai_expert_integration.build_turn_context(user_message, session.mode.value)
+            turn_context, turn_context_tokens = built.text, built.tokens
+            session.template_tokens_saved = built.template_tokens_saved
+            session.total_template_tokens_saved += built.template_tokens_saved
+        
+        # Relevanta minnen från användarens tidigare sessioner, inom minnets token-budget
+        session.memory_tokens = 0
+        if self.memory is not None and self.memory.enabled:
+            with self.spans.span("memory_recall"):
+                memory_context, session.memory_tokens = self.memory.recall(
+                    session.user_id, user_message, exclude_session_id=session.session_id
+                )
+            if memory_context:
+                turn_context = f"{memory_context}\n\n{turn_context}" if turn_context else memory_context
+                turn_context_tokens += session.memory_tokens
+        
+        # Packa historiken nyast först inom token-budgeten
+        packed = self.context_packer.pack(
+            system_prompt, system_tokens, session.messages[1:],
+            summary=session.summary, summary_tokens=session.summary_tokens,
+            turn_context=turn_context, turn_context_tokens=turn_context_tokens
+        )
+        session.context_start = packed.first_included
+        
+        # Annoteringar i historiken skickas aldrig - räkna vad det sparar per session
+        # (blocken är få och delade, så token-antalet cachas som för statiska texter)
+        session.annotation_tokens_saved += sum(
+            count_static_tokens(msg.annotations, self.model)
+            for msg in session.messages[1 + packed.first_included:]
+            if msg.annotations
+        )
+        
+        return packed.messages
+    
+    def _route(self, session: CoachingSession, user_message: str) -> RoutingDecision:
+        """Välj modell för turen utifrån frågans expertisnivå, läge och budget"""
+        level = "intermediate"
+        if AI_EXPERT_AVAILABLE:
+            level = ai_expert_integration.detect_expertise_level(user_message).value
+        return self.router.route(level, session.mode.value, self.model)
+    
+    def _call_model(self, decision: RoutingDecision, completion_kwargs: Dict, **extra):
+        """Anropa modellerna i reservkedjan tills någon svarar
+        
+        Hela kedjan delar turens deadline. Efteråt är ``completion_kwargs["model"]``
+        modellen som svarade.
+        """
+        deadline = self.caller.new_deadline()
+        for index, model in enumerate(decision.models):
+            completion_kwargs["model"] = model
+            try:
+                response = self.caller.call(self.client.chat.completions.create, deadline=deadline,
+                                            **completion_kwargs, **extra)
+                decision.model_used = model
+                return response
+            except FALLBACK_ERRORS as e:
+                if index == len(decision.models) - 1:
+                    raise
+                decision.fallbacks.append(model)
+                self.logger.warning(f"{model} svarade inte ({type(e).__name__}), försöker med "
+                                    f"{decision.models[index + 1]}")
+    
+    def _pending_summary(self, session: CoachingSession) -> List[Dict]:
+        """Meddelanden som fallit ur fönstret och ska vävas in i sammanfattningen"""
+        return self.context_packer.pending_for_summary(
+            session.messages[1:], session.summarized_count, session.context_start
+        )
+    
+    def _apply_summary(self, session: CoachingSession, summary: str, pending_count: int):
+        """Spara ny rullande sammanfattning på sessionen"""
+        session.summary = summary.strip()
+        session.summary_tokens = count_tokens(session.summary, self.model)
+        session.summarized_count += pending_count
+        self.logger.info(f"Uppdaterade sammanfattning för session {session.session_id} "
+                         f"({session.summarized_count} meddelanden, {session.summary_tokens} tokens)")
+    
+    def _refresh_summary(self, session: CoachingSession):
+        """Gör om den rullande sammanfattningen när tillräckligt mycket fallit ur fönstret"""
+        pending = self._pending_summary(session)
+        if not pending:
+            return
         
         try:
-            # Förbered meddelanden för API-anrop
-            messages_for_api = []
-            for msg in self.current_session.messages:
-                if msg["role"] in ["system", "user", "assistant"]:
-                    messages_for_api.append({
-                        "role": msg["role"],
-                        "content": msg["content"]
-                    })
-            
-            # Kontrollera token-längd
-            total_tokens = sum(len(self.encoding.encode(msg["content"])) 
-                             for msg in messages_for_api)
+            model = self.router.summary_model(self.model)
+            with self.spans.span("summary_refresh"):
+                response = self.caller.call(
+                    self.client.chat.completions.create,
+                    model=model,
+                    messages=ContextPacker.build_summary_messages(session.summary, pending),
+                    max_tokens=300,
+                    temperature=0.3
+                )
+            self._track_usage(session, response, model=model)
+            self._apply_summary(session, response.choices[0].message.content, len(pending))
+        except Exception as e:
+            # Behåll föregående sammanfattning - nästa tur försöker igen
+            self.logger.warning(f"Kunde inte uppdatera sammanfattning: {str(e)}")
+    
+    def _track_usage(self, session: CoachingSession, usage_source,
+                     latency_ms: Optional[float] = None,
+                     time_to_first_token_ms: Optional[float] = None,
+                     model: Optional[str] = None):
+        """Spåra API-användning för en session (returnerar APIUsage eller None)"""
+        from utils.api_usage_tracker import usage_tracker
+        with self.spans.span("usage_tracking"):
+            return usage_tracker.track_usage(
+                response=usage_source,
+                session_id=session.session_id,
+                mode=session.mode.value,
+                model=model or self.model,
+                latency_ms=latency_ms,
+                time_to_first_token_ms=time_to_first_token_ms
+            )
+    
+    @staticmethod
+    def _error_reply(error: Exception) -> str:
+        """Användarvänligt svar när API-anropet misslyckats"""
+        if isinstance(error, UpstreamUnavailableError):
+            return "AI-coachen är tillfälligt överbelastad. Försök igen om en liten stund."
+        if isinstance(error, DeadlineExceededError):
+            return "Svaret tog för lång tid att ta fram. Kan du försöka igen?"
+        return "Jag beklagar, det uppstod ett fel. Kan du försöka igen?"
+    
+    def _completion_kwargs(self, messages_for_api: List[Dict], model: Optional[str] = None) -> Dict:
+        """Gemensamma parametrar för chat completion-anrop"""
+        return {
+            "model": model or self.model,
+            "messages": messages_for_api,
+            "max_tokens": 1000,
+            "temperature": 0.7
+        }
+    
+    @staticmethod
+    def _is_first_turn(session: CoachingSession) -> bool:
+        """Första turen = system-prompt + ett användarmeddelande"""
+        return len(session.messages) == 2
+    
+    @classmethod
+    def _uses_semantic_cache(cls, session: CoachingSession) -> bool:
+        """Semantiska cachen delas mellan användare - bara första turen utan personliga minnen
+        
+        Svaret på en prompt med användarens minnen är skrivet för den användaren och får
+        varken hämtas från eller sparas i den delade cachen.
+        """
+        return cls._is_first_turn(session) and session.memory_tokens == 0
+    
+    def _lookup_cached_response(self, session: CoachingSession, completion_kwargs: Dict,
+                                user_message: str, cacheable: bool = False
+                                ) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Slå upp svar i exakt och semantisk cache
+        
+        Returnerar (cache-nyckel, cachat svar, källa) där källa är "exact" eller "semantic".
+        """
+        cache_key = self._response_cache_key(session, completion_kwargs, cacheable)
+        if cache_key:
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None:
+                return cache_key, cached_response, "exact"
+        
+        if self.semantic_cache and self._uses_semantic_cache(session):
+            try:
+                match = self.semantic_cache.lookup(session.mode.value, user_message)
+            except Exception as e:
+                self.logger.warning(f"Semantisk cache-uppslagning misslyckades: {str(e)}")
+                match = None
+            if match:
+                self.logger.info(f"Semantisk cacheträff med likhet {match[1]:.2f}")
+                return cache_key, match[0], "semantic"
+        
+        return cache_key, None, None
+    
+    def _store_cached_response(self, session: CoachingSession, completion_kwargs: Dict,
+                               user_message: str, assistant_response: str, cacheable: bool = False):
+        """Spara nytt modellsvar i cacharna (anropas innan svaret läggs i historiken)
+        
+        Nyckeln byggs från ``completion_kwargs`` efter anropet, dvs. för modellen som
+        faktiskt svarade - ett svar från en reservmodell cachas inte som förstahandsvalets.
+        """
+        cache_key = self._response_cache_key(session, completion_kwargs, cacheable)
+        if cache_key:
+            self.response_cache.put(cache_key, assistant_response, session.mode.value,
+                                    completion_kwargs["model"])
+        
+        if self.semantic_cache and self._uses_semantic_cache(session):
+            try:
+                self.semantic_cache.add(session.mode.value, user_message, assistant_response)
+            except Exception as e:
+                self.logger.warning(f"Kunde inte spara i semantisk cache: {str(e)}")
+    
+    def _response_cache_key(self, session: CoachingSession, completion_kwargs: Dict,
+                            cacheable: bool = False) -> Optional[str]:
+        """Cache-nyckel för deterministiska vägar, annars None"""
+        if not self.response_cache:
+            return None
+        
+        if not (cacheable or self._is_first_turn(session)):
+            return None
+        
+        return self.response_cache.make_key(
+            session.mode.value,
+            completion_kwargs["messages"],
+            completion_kwargs["model"],
+            completion_kwargs["temperature"]
+        )
+    
+    def _finalize_response(self, session: CoachingSession, assistant_response: str, user_message: str,
+                           usage_source, latency_ms: float,
+                           time_to_first_token_ms: Optional[float] = None,
+                           cache_source: Optional[str] = None,
+                           decision: Optional[RoutingDecision] = None) -> Tuple[str, Dict]:
+        """Spåra användning, lägg till affiliate-förslag och spara svaret i historiken
+        
+        Historiken lagrar modelltexten och affiliate-blocket separat så att blocket
+        aldrig skickas tillbaka till modellen; anroparen får den visade texten.
+        """
+        # Spåra API-användning och routingutfallet
+        model = (decision.model_used or decision.model) if decision else self.model
+        api_usage = self._track_usage(session, usage_source, latency_ms, time_to_first_token_ms, model=model)
+        if decision:
+            self.router.record(decision, latency_ms, api_usage, cache_source=cache_source)
+        
+        # Affiliate-länkar baserat på svarinnehåll, endast för visning
+        annotations = self._affiliate_annotations(assistant_response, user_message)
+        self._append_message(session, assistant_response, ConversationRole.ASSISTANT, annotations)
+        enhanced_response = session.messages[-1].display_text
+        
+        # Turen sparas i bakgrunden så att konversationen överlever en omstart
+        if self.sessions.writer.enabled:
+            self.sessions.persist(session)
+        
+        usage = getattr(usage_source, "usage", None)
+        
+        # Generera metadata
+        metadata = {
+            "session_id": session.session_id,
+            "mode": session.mode.value,
+            "message_count": session.history_offset + len(session.messages),
+            "timestamp": datetime.now().isoformat(),
+            "tokens_used": usage.total_tokens if usage else None,
+            "latency_ms": round(latency_ms, 1),
+            "history_in_context": len(session.messages) - 1 - session.context_start,
+            "cache_hit": cache_source is not None,
+            "cache_source": cache_source,
+            "model": model,
+            "model_tier": decision.tier if decision else None,
+            "annotation_tokens_saved": session.annotation_tokens_saved,
+            "memory_tokens": session.memory_tokens,
+            "template_tokens_saved": session.template_tokens_saved
+        }
+        if time_to_first_token_ms is not None:
+            metadata["time_to_first_token_ms"] = round(time_to_first_token_ms, 1)
+        
+        session.last_response_metadata = metadata
+        return enhanced_response, metadata
+    
+    def get_response(self, user_message: str, cacheable: bool = False,
+                     session_id: Optional[str] = None,
+                     idempotency_key: Optional[str] = None) -> Tuple[str, Dict]:
+        """Få svar från AI-coachen med AI-expertis integration
+        
+        ``cacheable`` markerar deterministiska frågor (t.ex. föreslagna frågor) som får
+        besvaras från svarscachen även efter första turen. ``session_id`` väljer session
+        i sessionsregistret, annars används aktuell session. Samma ``idempotency_key``
+        inom en session ger samma svar utan ett nytt anrop (metadata ``deduplicated``).
+        """
+        session = self._resolve_session(session_id)
+        with self.spans.turn():
+            if idempotency_key is None:
+                return self._get_response(session, user_message, cacheable)
             
-            if total_tokens > self.max_tokens:
-                # Trimma historia men behåll system-prompt
-                system_msg = messages_for_api[0]
-                recent_messages = messages_for_api[-10:]  # Behåll senaste 10
-                messages_for_api = [system_msg] + recent_messages
+            (response, metadata), shared = self.flights.do(
+                ("turn", session.session_id, idempotency_key),
+                lambda: self._get_response(session, user_message, cacheable),
+                remember=lambda result: "error" not in result[1]
+            )
+        if shared:
+            return response, {**metadata, "deduplicated": True}
+        return response, metadata
+    
+    def complete_once(self, system_prompt: str, user_prompt: str, usage_label: str,
+                      max_tokens: int = 1000) -> str:
+        """Enstaka modellanrop utan session (t.ex. bloggredigering i admin)
+        
+        Ingen session skapas, så varken registret, current_session eller skrivkön
+        påverkas; användningen spåras under ``usage_label``. Fel kastas vidare.
+        """
+        started = time.perf_counter()
+        response = self.caller.call(
+            self.client.chat.completions.create,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=max_tokens,
+            temperature=0.7
+        )
+        from utils.api_usage_tracker import usage_tracker
+        usage_tracker.track_usage(response, session_id=usage_label, mode=usage_label, model=self.model,
+                                  latency_ms=(time.perf_counter() - started) * 1000)
+        return response.choices[0].message.content or ""
+    
+    def _call_model_coalesced(self, decision: RoutingDecision, completion_kwargs: Dict,
+                              cache_key: Optional[str]):
+        """Anropa modellen; samtidiga identiska cachebara anrop delar ett anrop (ger (svar, delat))"""
+        if cache_key is None:
+            return self._call_model(decision, completion_kwargs), False
+        return self.flights.do(
+            ("upstream", cache_key),
+            lambda: self._call_model(decision, completion_kwargs),
+            remember=lambda response: False
+        )
+    
+    def _get_response(self, session: CoachingSession, user_message: str,
+                      cacheable: bool = False) -> Tuple[str, Dict]:
+        """En tur i en given session (se get_response)"""
+        # Lägg till användarmeddelande
+        self._append_message(session, user_message, ConversationRole.USER)
+        decision = self._route(session, user_message)
+        
+        try:
+            messages_for_api = self._prepare_api_messages(session, user_message)
+            completion_kwargs = self._completion_kwargs(messages_for_api, decision.model)
             
-            # NYTT: Förbättra system-prompt med AI-expertis om tillgängligt
-            if AI_EXPERT_AVAILABLE and len(messages_for_api) > 0:
-                original_system_prompt = messages_for_api[0]["content"]
-                mode_string = self.current_session.mode.value
-                
-                enhanced_system_prompt = ai_expert_integration.create_enhanced_prompt(
-                    original_system_prompt, 
-                    user_message, 
-                    mode_string
+            started = time.perf_counter()
+            with self.spans.span("cache_lookup"):
+                cache_key, cached_response, cache_source = self._lookup_cached_response(
+                    session, completion_kwargs, user_message, cacheable
                 )
-                
-                # Uppdatera system-prompt med AI-expertis
-                messages_for_api[0]["content"] = enhanced_system_prompt
-                
-                self.logger.info("Enhanced system prompt med AI-expertis för AI-relaterad fråga")
             
-            # Anropa OpenAI API
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages_for_api,
-                max_tokens=1000,
-                temperature=0.7
-            )
+            if cached_response is not None:
+                latency_ms = (time.perf_counter() - started) * 1000
+                result = self._finalize_response(session, cached_response, user_message, None,
+                                                 latency_ms, cache_source=cache_source, decision=decision)
+                self._refresh_summary(session)
+                return result
+            
+            # Anropa OpenAI API (med reservmodeller)
+            with self.spans.span("api_call"):
+                response, shared = self._call_model_coalesced(decision, completion_kwargs, cache_key)
+            latency_ms = (time.perf_counter() - started) * 1000
             
             assistant_response = response.choices[0].message.content
+            if shared:
+                # Ett samtidigt identiskt anrop gjorde jobbet (och debiterades)
+                result = self._finalize_response(session, assistant_response, user_message, None, latency_ms,
+                                                 cache_source="coalesced", decision=decision)
+            else:
+                self._store_cached_response(session, completion_kwargs, user_message, assistant_response,
+                                            cacheable)
+                result = self._finalize_response(session, assistant_response, user_message, response,
+                                                 latency_ms, decision=decision)
+            self._refresh_summary(session)
             
-            # Spåra API-användning
-            from utils.api_usage_tracker import usage_tracker
-            api_usage = usage_tracker.track_usage(
-                response=response,
-                session_id=self.current_session.session_id,
-                mode=self.current_session.mode.value,
-                model=self.model
-            )
+            return result
+            
+        except Exception as e:
+            self.logger.error(f"Error getting response: {str(e)}")
+            self.router.record(decision, error=e)
+            return self._error_reply(e), {"error": str(e)}
+    
+    def stream_response(self, user_message: str, cacheable: bool = False,
+                        session_id: Optional[str] = None,
+                        idempotency_key: Optional[str] = None) -> Iterator[str]:
+        """Strömma svaret token för token från AI-coachen
+        
+        Generatorn ger text-deltan i takt med att de kommer från OpenAI. När strömmen
+        stängts spåras användningen, affiliate-förslagen skickas som sista delta och
+        svaret sparas i historiken. Metadata för turen finns därefter via
+        ``get_last_response_metadata``. En dubblett av en pågående eller nyss avslutad
+        tur (samma ``idempotency_key``) väntar in svaret och ger det som ett enda delta.
+        """
+        session = self._resolve_session(session_id)
+        if idempotency_key is None:
+            yield from self._stream_response(session, user_message, cacheable)
+            return
+        
+        key = ("turn", session.session_id, idempotency_key)
+        while True:
+            flight, leader = self.flights.begin(key)
+            if leader:
+                break
+            try:
+                text, metadata = self.flights.wait(flight)
+            except FlightAbandoned:
+                continue
+            session.last_response_metadata = {**metadata, "deduplicated": True}
+            self.last_response_metadata = session.last_response_metadata
+            yield text
+            return
+        
+        parts = []
+        finished = False
+        try:
+            for delta in self._stream_response(session, user_message, cacheable):
+                parts.append(delta)
+                yield delta
+            metadata = session.last_response_metadata
+            self.flights.finish(key, flight, ("".join(parts), metadata), remember="error" not in metadata)
+            finished = True
+        finally:
+            # Avbruten ström (t.ex. Streamlit-omkörning) - väntande dubbletter gör anropet själva
+            if not finished:
+                self.flights.abandon(key, flight)
+    
+    def _stream_response(self, session: CoachingSession, user_message: str,
+                         cacheable: bool = False) -> Iterator[str]:
+        """Strömma en tur i en given session (se stream_response)"""
+        with self.spans.turn("stream_turn"):
+            yield from self._stream_turn(session, user_message, cacheable)
+    
+    def _stream_turn(self, session: CoachingSession, user_message: str,
+                     cacheable: bool = False) -> Iterator[str]:
+        """Själva strömmade turen (mäts som spanen stream_turn)"""
+        # Lägg till användarmeddelande
+        self._append_message(session, user_message, ConversationRole.USER)
+        session.last_response_metadata = {}
+        self.last_response_metadata = {}
+        decision = self._route(session, user_message)
+        upstream_key, flight = None, None
+        
+        try:
+            messages_for_api = self._prepare_api_messages(session, user_message)
+            completion_kwargs = self._completion_kwargs(messages_for_api, decision.model)
+            
+            started = time.perf_counter()
+            with self.spans.span("cache_lookup"):
+                cache_key, cached_response, cache_source = self._lookup_cached_response(
+                    session, completion_kwargs, user_message, cacheable
+                )
             
-            # NYTT: Lägg till affiliate-länkar baserat på svarinnehåll
-            enhanced_response = self._add_affiliate_suggestions(assistant_response, user_message)
+            # Samtidiga identiska cachebara anrop: ett strömmar, övriga väntar in texten
+            if cached_response is None and cache_key is not None:
+                upstream_key = ("upstream-stream", cache_key)
+                leader_flight, leader = self.flights.begin(upstream_key)
+                if leader:
+                    flight = leader_flight
+                else:
+                    try:
+                        cached_response, cache_source = self.flights.wait(leader_flight), "coalesced"
+                    except FlightAbandoned:
+                        pass
             
-            # Lägg till förbättrat assistent-svar
-            self.add_message(enhanced_response, ConversationRole.ASSISTANT)
+            parts = []
+            usage_chunk = None
+            time_to_first_token_ms = None
+            if cached_response is not None:
+                time_to_first_token_ms = (time.perf_counter() - started) * 1000
+                parts.append(cached_response)
+                yield cached_response
+            else:
+                stream = self._call_model(
+                    decision, completion_kwargs,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                
+                for chunk in stream:
+                    # Sista chunken bär usage och har inga choices
+                    if getattr(chunk, "usage", None):
+                        usage_chunk = chunk
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if time_to_first_token_ms is None:
+                            time_to_first_token_ms = (time.perf_counter() - started) * 1000
+                        parts.append(delta)
+                        yield delta
+            latency_ms = (time.perf_counter() - started) * 1000
+            if cached_response is None:
+                # Hela strömmen inkluderar konsumentens tid mellan deltan - första token är OpenAI:s
+                self.spans.observe("api_first_token", time_to_first_token_ms or latency_ms)
+                self.spans.observe("api_stream", latency_ms)
+            
+            assistant_response = "".join(parts)
+            if cached_response is None:
+                self._store_cached_response(session, completion_kwargs, user_message, assistant_response,
+                                            cacheable)
+            if flight is not None:
+                self.flights.finish(upstream_key, flight, assistant_response, remember=False)
+                flight = None
+            
+            enhanced_response, metadata = self._finalize_response(
+                session, assistant_response, user_message, usage_chunk, latency_ms,
+                time_to_first_token_ms=time_to_first_token_ms,
+                cache_source=cache_source,
+                decision=decision
+            )
+            self.last_response_metadata = metadata
             
-            # Generera metadata
-            metadata = {
-                "session_id": self.current_session.session_id,
-                "mode": self.current_session.mode.value,
-                "message_count": len(self.current_session.messages),
-                "timestamp": datetime.now().isoformat(),
-                "tokens_used": response.usage.total_tokens if response.usage else None
-            }
+            # Affiliate-förslagen läggs till efter att modellen svarat klart
+            if len(enhanced_response) > len(assistant_response):
+                yield enhanced_response[len(assistant_response):]
             
-            return enhanced_response, metadata
+            self._refresh_summary(session)
             
         except Exception as e:
-            self.logger.error(f"Error getting response: {str(e)}")
-            error_response = "Jag beklagar, det uppstod ett fel. Kan du försöka igen?"
-            return error_response, {"error": str(e)}
+            self.logger.error(f"Error streaming response: {str(e)}")
+            self.router.record(decision, error=e)
+            session.last_response_metadata = {"error": str(e)}
+            self.last_response_metadata = session.last_response_metadata
+            yield self._error_reply(e)
+        finally:
+            if flight is not None:
+                self.flights.abandon(upstream_key, flight)
     
-    def set_goals(self, goals: List[str]):
+    def set_goals(self, goals: List[str], session_id: Optional[str] = None):
         """Sätt mål för sessionen"""
-        if not self.current_session:
-            raise ValueError("Ingen aktiv session.")
-        
-        self.current_session.goals = goals
-        self.logger.info(f"Set {len(goals)} goals for session {self.current_session.session_id}")
+        session = self._resolve_session(session_id)
+        session.goals = goals
+        self.logger.info(f"Set {len(goals)} goals for session {session.session_id}")
     
-    def add_progress_note(self, note: str):
+    def add_progress_note(self, note: str, session_id: Optional[str] = None):
         """Lägg till progress-anteckning"""
-        if not self.current_session:
-            raise ValueError("Ingen aktiv session.")
-        
+        session = self._resolve_session(session_id)
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-        self.current_session.progress_notes += f"\n[{timestamp}] {note}"
+        session.progress_notes += f"\n[{timestamp}] {note}"
     
-    def get_session_summary(self) -> Dict:
+    def get_session_summary(self, session_id: Optional[str] = None) -> Dict:
         """Få sammanfattning av sessionen"""
-        if not self.current_session:
+        try:
+            session = self._resolve_session(session_id)
+        except ValueError:
             return {"error": "Ingen aktiv session"}
         
+        return self._summarize_session(session)
+    
+    def get_last_response_metadata(self, session_id: Optional[str] = None) -> Dict:
+        """Metadata för sessionens senaste svar"""
+        try:
+            return self._resolve_session(session_id).last_response_metadata
+        except ValueError:
+            return {}
+    
+    def _summarize_session(self, session: CoachingSession) -> Dict:
+        """Bygg sammanfattning för en given session"""
         return {
-            "session_id": self.current_session.session_id,
-            "mode": self.current_session.mode.value,
-            "duration": str(datetime.now() - self.current_session.start_time),
-            "message_count": len(self.current_session.messages),
-            "goals": self.current_session.goals,
-            "progress_notes": self.current_session.progress_notes,
-            "context": self.current_session.context
+            "session_id": session.session_id,
+            "mode": session.mode.value,
+            "duration": str(datetime.now() - session.start_time),
+            "message_count": session.history_offset + len(session.messages),
+            "total_tokens": session.total_tokens,
+            "summarized_messages": session.summarized_count,
+            "annotation_tokens_saved": session.annotation_tokens_saved,
+            "template_tokens_saved": session.total_template_tokens_saved,
+            "goals": session.goals,
+            "progress_notes": session.progress_notes,
+            "context": session.context
         }
     
-    def end_session(self) -> Dict:
-        """Avsluta sessionen och få sammanfattning"""
-        if not self.current_session:
+    def end_session(self, session_id: Optional[str] = None) -> Dict:
+        """Avsluta sessionen, spara den och få sammanfattning"""
+        try:
+            session = self._resolve_session(session_id)
+        except ValueError:
             return {"error": "Ingen aktiv session att avsluta"}
         
-        summary = self.get_session_summary()
-        self.logger.info(f"Ended session {self.current_session.session_id}")
-        self.current_session = None
+        summary = self._summarize_session(session)
+        summary["memories_scheduled"] = self._schedule_remember(session)
+        self.sessions.remove(session.session_id, persist=True)
+        if self.current_session is session:
+            self.current_session = None
+        self.logger.info(f"Ended session {session.session_id}")
         
         return summary
     
+    def _schedule_remember(self, session: CoachingSession) -> bool:
+        """Lägg minnesextraktionen för en avslutad session i bakgrundstråden (True om köad)"""
+        if self.memory is None or not self.memory.enabled:
+            return False
+        user_turns = sum(1 for msg in session.messages if msg.role == ConversationRole.USER.value)
+        if user_turns < Config.MEMORY_MIN_USER_MESSAGES:
+            return False
+        
+        with self._memory_lock:
+            if self._memory_executor is None:
+                self._memory_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory")
+            task = self._memory_executor.submit(self._remember_session, session)
+            self._memory_tasks.append(task)
+        task.add_done_callback(self._forget_task)
+        return True
+    
+    def _forget_task(self, task: Future):
+        with self._memory_lock:
+            if task in self._memory_tasks:
+                self._memory_tasks.remove(task)
+    
+    def wait_for_memories(self, timeout: Optional[float] = None) -> bool:
+        """Vänta in köade minnesextraktioner (True om alla hann klart)"""
+        with self._memory_lock:
+            tasks = list(self._memory_tasks)
+        _, pending = wait(tasks, timeout=timeout)
+        return not pending
+    
+    def _remember_session(self, session: CoachingSession) -> int:
+        """Spara bestående fakta och en sammanfattning från sessionen i långtidsminnet"""
+        try:
+            return self.memory.add(session.user_id, session.session_id, self._extract_memories(session))
+        except Exception as e:
+            self.logger.warning(f"Kunde inte spara långtidsminne: {str(e)}")
+            return 0
+    
+    def _extract_memories(self, session: CoachingSession) -> List[Tuple[str, str]]:
+        """Låt modellen plocka ut fakta ur det som inte redan sammanfattats
+        
+        Högst Config.CONVERSATION_HISTORY_LIMIT meddelanden skickas med; misslyckas
+        anropet används sessionens sammanfattning och mål istället.
+        """
+        transcript = session.messages[1 + session.summarized_count:][-Config.CONVERSATION_HISTORY_LIMIT:]
+        try:
+            model = self.router.summary_model(self.model)
+            response = self.caller.call(
+                self.client.chat.completions.create,
+                model=model,
+                messages=build_extraction_messages(session.summary, transcript),
+                max_tokens=400,
+                temperature=0.2
+            )
+            self._track_usage(session, response, model=model)
+            items = parse_extraction(response.choices[0].message.content or "")
+            if items:
+                return items
+        except Exception as e:
+            self.logger.warning(f"Kunde inte extrahera minnen: {str(e)}")
+        return self._fallback_memories(session)
+    
+    @staticmethod
+    def _fallback_memories(session: CoachingSession) -> List[Tuple[str, str]]:
+        """Minnen utan modellanrop: rullande sammanfattning och satta mål"""
+        items = [("fact", f"Mål: {goal}") for goal in session.goals]
+        if session.summary:
+            items.insert(0, ("summary", session.summary))
+        return items
+    
     def _add_affiliate_suggestions(self, ai_response: str, user_message: str) -> str:
-        """Lägg till relevanta affiliate-länkar baserat på AI-svar och användarfråga"""
-        
-        # Konvertera till lowercase för nyckelordsmatching
-        response_lower = ai_response.lower()
-        user_lower = user_message.lower()
-        combined_text = (response_lower + " " + user_lower).strip()
-        
-        affiliate_suggestions = []
-        
-        # 1. AI & Machine Learning Kurser (Coursera)
-        ai_keywords = ["machine learning", "ai", "artificial intelligence", "neural network", 
-                      "deep learning", "python", "data science", "tensorflow", "pytorch", "kurs", "utbildning"]
-        if any(keyword in combined_text for keyword in ai_keywords):
-            affiliate_suggestions.append({
-                "text": "🎓 **Rekommenderad AI-kurs**: [Machine Learning Specialization på Coursera](https://www.coursera.org/specializations/machine-learning-introduction?irclickid=xGxzRaW4%3AxyPW4Q1a%3A1V1TjUkHzbp0k4ywuzs0&irgwc=1&utm_medium=partners&utm_source=impact&utm_campaign=3294490&utm_content=b2c) - Starta din AI-resa med Andrew Ng!",
-                "category": "education"
-            })
-        
-        # 2. Böcker (Amazon Associates) 
-        book_keywords = ["bok", "läsa", "studera", "litteratur", "författare", "research"]
-        if any(keyword in combined_text for keyword in book_keywords):
-            affiliate_suggestions.append({
-                "text": "📚 **Rekommenderad bok**: [Hands-On Machine Learning på Amazon](https://amzn.to/3AICoachen) - Praktisk guide för AI-implementering",
-                "category": "books"
-            })
-        
-        # 3. Produktivitetsverktyg (Notion, ClickUp)
-        productivity_keywords = ["produktivitet", "planering", "organisation", "projekt", "mål", "tracking", "notes"]
-        if any(keyword in combined_text for keyword in productivity_keywords):
-            affiliate_suggestions.append({
-                "text": "⚡ **Produktivitetsverktyg**: [Notion Pro](https://affiliate.notion.so/aicoachen) - Perfekt för att organisera dina AI-studier och coaching-mål (20% rabatt första året!)",
-                "category": "productivity"
-            })
-        
-        # 4. AI-verktyg och Premium Services
-        ai_tools_keywords = ["chatgpt", "claude", "midjourney", "ai tool", "automation", "premium"]
-        if any(keyword in combined_text for keyword in ai_tools_keywords):
-            affiliate_suggestions.append({
-                "text": "🤖 **AI-verktyg**: [ChatGPT Plus](https://openai.com/chatgpt/plus/?ref=aicoachen) - Upplev kraften av GPT-4 för dina AI-projekt",
-                "category": "ai_tools"
-            })
-        
-        # 5. Coaching & Certifiering
-        coaching_keywords = ["coaching", "certifiering", "utveckling", "karriär", "ledarskap", "mentor"]
-        if any(keyword in combined_text for keyword in coaching_keywords):
-            affiliate_suggestions.append({
-                "text": "🎯 **Coaching-certifiering**: [ICF Coaching Certification](https://coachfederation.org/?affiliate=aicoachen) - Utveckla dina coaching-färdigheter professionellt",
-                "category": "coaching"
-            })
-        
-        # 6. Cloud & Development Tools
-        tech_keywords = ["cloud", "aws", "azure", "deployment", "development", "kod", "programming"]
-        if any(keyword in combined_text for keyword in tech_keywords):
-            affiliate_suggestions.append({
-                "text": "☁️ **Cloud-utveckling**: [AWS Training Courses](https://aws.amazon.com/training/?trk=affiliate_aicoachen) - Lär dig deploiera AI i molnet",
-                "category": "cloud"
-            })
-        
-        # Lägg till max 2 affiliate-förslag för att inte överväldiga
-        if affiliate_suggestions:
-            selected_suggestions = affiliate_suggestions[:2]  # Max 2 förslag
-            
-            affiliate_text = "\n\n---\n\n💡 **Rekommenderade resurser baserat på vårt samtal:**\n\n"
-            for suggestion in selected_suggestions:
-                affiliate_text += suggestion["text"] + "\n\n"
-            
-            affiliate_text += "*Som AI-Coach rekommenderar jag endast verktyg som verkligen kan hjälpa din utveckling. Genom att använda dessa länkar stödjer du också utvecklingen av AI-Coachen.*"
-            
-            return ai_response + affiliate_text
+        """Lägg till relevanta affiliate-länkar baserat på AI-svar och användarfråga
         
-        return ai_response
+        Kategorierna kommer från affiliate-katalogen som matchas i ett svep (max 2 förslag
+        för att inte överväldiga, se data/affiliate_catalog.json).
+        """
+        return ai_response + self._affiliate_annotations(ai_response, user_message)
+    
+    def _affiliate_annotations(self, ai_response: str, user_message: str) -> str:
+        """Affiliate-blocket som visas under svaret (tom sträng om inget matchar)"""
+        with self.spans.span("affiliate"):
+            return affiliate_matcher.suggestions_text(ai_response, user_message)
 
 # Factory function för enkel instansiering
 def create_ai_coach(api_key: str = None, model: str = "gpt-3.5-turbo") -> AICoach:
@@ -0,0 +1,363 @@
+"""
+Async AI Coach - asyncio-baserad variant av AI-coachen
+Betjänar många coaching-sessioner samtidigt på en event loop med en delad
+AsyncOpenAI-klient (och därmed en delad HTTP connection pool). Blockerande steg
+(SQLite, usage-filen, embeddings, RAG och långtidsminnet) körs med
+asyncio.to_thread så att event loopen aldrig väntar på dem
+"""
+
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+import openai
+
+from core.ai_coach import AICoach, CoachingMode, CoachingSession, ConversationRole
+from utils.config import Config
+from utils.context_packer import ContextPacker
+from utils.model_router import FALLBACK_ERRORS, RoutingDecision
+from utils.single_flight import FlightAbandoned
+
+class AsyncAICoach(AICoach):
+    """AI-coach för samtidiga sessioner med begränsat antal parallella API-anrop
+    
+    Turerna körs med ``aget_response`` och ``astream_response`` (samma
+    parameterordning som ``get_response``/``stream_response`` i AICoach).
+    """
+    
+    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo",
+                 max_concurrency: Optional[int] = None, http_client=None, base_url: str = None):
+        # http_client måste finnas innan basklassen skapar klienten
+        self._http_client = http_client
+        super().__init__(api_key=api_key, model=model, base_url=base_url)
+        
+        self.max_concurrency = max_concurrency or Config.ASYNC_MAX_CONCURRENCY
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        # Sessionerna ligger i det delade registret; ett lås per session så att turer inte blandas
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        # Strömmade turer som fortsätter efter att konsumenten slutat läsa
+        self._turn_tasks: Set[asyncio.Task] = set()
+        self.in_flight = 0
+    
+    def _create_client(self, api_key: str, base_url: str = None):
+        """Skapa en AsyncOpenAI-klient som delas av alla sessioner"""
+        return openai.AsyncOpenAI(api_key=api_key, base_url=base_url,
+                                  http_client=self._http_client, max_retries=0)
+    
+    def start_session(self, user_id: str, mode: CoachingMode, 
+                     context: Dict = None) -> str:
+        """Starta en ny session och registrera den i sessionsregistret"""
+        session_id = self.sessions.add(self._new_session(user_id, mode, context))
+        
+        self.logger.info(f"Started async session {session_id} in {mode.value} mode")
+        return session_id
+    
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        """Lås för sessionen, skapas vid första turen (även för återställda sessioner)"""
+        return self._session_locks.setdefault(session_id, asyncio.Lock())
+    
+    def get_response(self, *args, **kwargs):
+        """Klienten är asynkron - se aget_response"""
+        raise TypeError("AsyncAICoach är asynkron - använd await aget_response(...)")
+    
+    def stream_response(self, *args, **kwargs):
+        """Klienten är asynkron - se astream_response"""
+        raise TypeError("AsyncAICoach är asynkron - använd async for ... in astream_response(...)")
+    
+    async def _acall_model(self, decision: RoutingDecision, completion_kwargs: Dict, **extra):
+        """Asynkron motsvarighet till AICoach._call_model (kedjan delar turens deadline)"""
+        deadline = self.caller.new_deadline()
+        for index, model in enumerate(decision.models):
+            completion_kwargs["model"] = model
+            try:
+                response = await self.caller.acall(
+                    self.client.chat.completions.create, deadline=deadline, **completion_kwargs, **extra
+                )
+                decision.model_used = model
+                return response
+            except FALLBACK_ERRORS as e:
+                if index == len(decision.models) - 1:
+                    raise
+                decision.fallbacks.append(model)
+                self.logger.warning(f"{model} svarade inte ({type(e).__name__}), försöker med "
+                                    f"{decision.models[index + 1]}")
+    
+    async def _aflight(self, key: Hashable, run: Callable, remember: Callable[[Tuple], bool]):
+        """Asynkron motsvarighet till SingleFlight.do; väntan sker i en tråd (ger (resultat, delat))"""
+        while True:
+            flight, leader = self.flights.begin(key)
+            if not leader:
+                try:
+                    return await asyncio.to_thread(self.flights.wait, flight), True
+                except FlightAbandoned:
+                    continue
+            
+            try:
+                result = await run()
+            except BaseException:
+                self.flights.abandon(key, flight)
+                raise
+            self.flights.finish(key, flight, result, remember=remember(result))
+            return result, False
+    
+    async def aget_response(self, user_message: str, cacheable: bool = False,
+                            session_id: Optional[str] = None,
+                            idempotency_key: Optional[str] = None) -> Tuple[str, Dict]:
+        """Få svar för en given session utan att blockera event loopen, se AICoach.get_response"""
+        session = await asyncio.to_thread(self._resolve_session, session_id)
+        if idempotency_key is None:
+            return await self._aturn(session, user_message, cacheable)
+        
+        (response, metadata), shared = await self._aflight(
+            ("turn", session.session_id, idempotency_key),
+            lambda: self._aturn(session, user_message, cacheable),
+            remember=lambda result: "error" not in result[1]
+        )
+        if shared:
+            return response, {**metadata, "deduplicated": True}
+        return response, metadata
+    
+    async def _aturn(self, session: CoachingSession, user_message: str,
+                     cacheable: bool = False) -> Tuple[str, Dict]:
+        """En tur i en given session (se aget_response)"""
+        with self.spans.turn():
+            async with self._session_lock(session.session_id):
+                self._append_message(session, user_message, ConversationRole.USER)
+                decision = await asyncio.to_thread(self._route, session, user_message)
+                
+                try:
+                    messages_for_api = await asyncio.to_thread(self._prepare_api_messages, session, user_message)
+                    completion_kwargs = self._completion_kwargs(messages_for_api, decision.model)
+                    
+                    started = time.perf_counter()
+                    with self.spans.span("cache_lookup"):
+                        cache_key, cached_response, cache_source = await asyncio.to_thread(
+                            self._lookup_cached_response, session, completion_kwargs, user_message, cacheable
+                        )
+                    
+                    if cached_response is not None:
+                        latency_ms = (time.perf_counter() - started) * 1000
+                        result = await asyncio.to_thread(
+                            self._finalize_response, session, cached_response, user_message, None,
+                            latency_ms, cache_source=cache_source, decision=decision
+                        )
+                        await self._refresh_summary_async(session)
+                        return result
+                    
+                    with self.spans.span("api_call"):
+                        async with self._semaphore:
+                            self.in_flight += 1
+                            try:
+                                response = await self._acall_model(decision, completion_kwargs)
+                            finally:
+                                self.in_flight -= 1
+                    latency_ms = (time.perf_counter() - started) * 1000
+                    
+                    assistant_response = response.choices[0].message.content
+                    await asyncio.to_thread(self._store_cached_response, session, completion_kwargs,
+                                            user_message, assistant_response, cacheable)
+                    result = await asyncio.to_thread(
+                        self._finalize_response, session, assistant_response, user_message,
+                        response, latency_ms, decision=decision
+                    )
+                    await self._refresh_summary_async(session)
+                    
+                    return result
+                    
+                except Exception as e:
+                    self.logger.error(f"Error getting async response: {str(e)}")
+                    await asyncio.to_thread(self.router.record, decision, error=e)
+                    return self._error_reply(e), {"error": str(e)}
+    
+    async def astream_response(self, user_message: str, cacheable: bool = False,
+                               session_id: Optional[str] = None,
+                               idempotency_key: Optional[str] = None) -> AsyncIterator[str]:
+        """Strömma svaret för en given session, se AICoach.stream_response
+        
+        Turen körs i en egen task som lägger deltan i en kö: semaforen och
+        sessionslåset släpps när OpenAI svarat klart oavsett hur fort konsumenten
+        läser, och en konsument som slutar läsa avbryter inte turen.
+        """
+        session = await asyncio.to_thread(self._resolve_session, session_id)
+        key, flight = None, None
+        if idempotency_key is not None:
+            key = ("turn", session.session_id, idempotency_key)
+            while True:
+                flight, leader = self.flights.begin(key)
+                if leader:
+                    break
+                try:
+                    text, metadata = await asyncio.to_thread(self.flights.wait, flight)
+                except FlightAbandoned:
+                    continue
+                session.last_response_metadata = {**metadata, "deduplicated": True}
+                yield text
+                return
+        
+        deltas: asyncio.Queue = asyncio.Queue()
+        task = asyncio.ensure_future(self._astream_task(session, user_message, cacheable, deltas, key, flight))
+        self._turn_tasks.add(task)
+        task.add_done_callback(self._turn_tasks.discard)
+        
+        while True:
+            delta = await deltas.get()
+            if delta is None:
+                break
+            yield delta
+    
+    async def _astream_task(self, session: CoachingSession, user_message: str, cacheable: bool,
+                            deltas: asyncio.Queue, key: Optional[Hashable], flight):
+        """Kör den strömmade turen och publicera texten för idempotensnyckeln"""
+        parts = []
+        
+        def emit(delta: str):
+            parts.append(delta)
+            deltas.put_nowait(delta)
+        
+        try:
+            await self._astream_turn(session, user_message, cacheable, emit)
+            if flight is not None:
+                metadata = session.last_response_metadata
+                self.flights.finish(key, flight, ("".join(parts), metadata), remember="error" not in metadata)
+                flight = None
+        finally:
+            if flight is not None:
+                self.flights.abandon(key, flight)
+            deltas.put_nowait(None)
+    
+    async def _astream_turn(self, session: CoachingSession, user_message: str, cacheable: bool,
+                            emit: Callable[[str], None]):
+        """Själva strömmade turen; deltan lämnas till ``emit`` (mäts som spanen stream_turn)"""
+        with self.spans.turn("stream_turn"):
+            async with self._session_lock(session.session_id):
+                self._append_message(session, user_message, ConversationRole.USER)
+                session.last_response_metadata = {}
+                decision = await asyncio.to_thread(self._route, session, user_message)
+                
+                try:
+                    messages_for_api = await asyncio.to_thread(self._prepare_api_messages, session, user_message)
+                    completion_kwargs = self._completion_kwargs(messages_for_api, decision.model)
+                    
+                    started = time.perf_counter()
+                    with self.spans.span("cache_lookup"):
+                        cache_key, cached_response, cache_source = await asyncio.to_thread(
+                            self._lookup_cached_response, session, completion_kwargs, user_message, cacheable
+                        )
+                    
+                    parts = []
+                    usage_chunk = None
+                    time_to_first_token_ms = None
+                    if cached_response is not None:
+                        time_to_first_token_ms = (time.perf_counter() - started) * 1000
+                        parts.append(cached_response)
+                        emit(cached_response)
+                    else:
+                        async with self._semaphore:
+                            self.in_flight += 1
+                            try:
+                                stream = await self._acall_model(
+                                    decision, completion_kwargs,
+                                    stream=True,
+                                    stream_options={"include_usage": True}
+                                )
+                                async for chunk in stream:
+                                    if getattr(chunk, "usage", None):
+                                        usage_chunk = chunk
+                                    if not chunk.choices:
+                                        continue
+                                    delta = chunk.choices[0].delta.content
+                                    if delta:
+                                        if time_to_first_token_ms is None:
+                                            time_to_first_token_ms = (time.perf_counter() - started) * 1000
+                                        parts.append(delta)
+                                        emit(delta)
+                            finally:
+                                self.in_flight -= 1
+                    latency_ms = (time.perf_counter() - started) * 1000
+                    if cached_response is None:
+                        self.spans.observe("api_first_token", time_to_first_token_ms or latency_ms)
+                        self.spans.observe("api_stream", latency_ms)
+                    
+                    assistant_response = "".join(parts)
+                    if cached_response is None:
+                        await asyncio.to_thread(self._store_cached_response, session, completion_kwargs,
+                                                user_message, assistant_response, cacheable)
+                    enhanced_response, _ = await asyncio.to_thread(
+                        self._finalize_response, session, assistant_response, user_message, usage_chunk,
+                        latency_ms, time_to_first_token_ms=time_to_first_token_ms,
+                        cache_source=cache_source, decision=decision
+                    )
+                    if len(enhanced_response) > len(assistant_response):
+                        emit(enhanced_response[len(assistant_response):])
+                    
+                    await self._refresh_summary_async(session)
+                    
+                except Exception as e:
+                    self.logger.error(f"Error streaming async response: {str(e)}")
+                    await asyncio.to_thread(self.router.record, decision, error=e)
+                    session.last_response_metadata = {"error": str(e)}
+                    emit(self._error_reply(e))
+    
+    async def _refresh_summary_async(self, session: CoachingSession):
+        """Asynkron motsvarighet till AICoach._refresh_summary"""
+        pending = self._pending_summary(session)
+        if not pending:
+            return
+        
+        try:
+            model = self.router.summary_model(self.model)
+            async with self._semaphore:
+                with self.spans.span("summary_refresh"):
+                    response = await self.caller.acall(
+                        self.client.chat.completions.create,
+                        model=model,
+                        messages=ContextPacker.build_summary_messages(session.summary, pending),
+                        max_tokens=300,
+                        temperature=0.3
+                    )
+            await asyncio.to_thread(self._track_usage, session, response, model=model)
+            self._apply_summary(session, response.choices[0].message.content, len(pending))
+        except Exception as e:
+            self.logger.warning(f"Kunde inte uppdatera sammanfattning: {str(e)}")
+    
+    async def gather_responses(self, requests: List[Tuple[str, str]]) -> List[Tuple[str, Dict]]:
+        """Kör flera (session_id, meddelande)-par samtidigt och returnera svaren i ordning"""
+        return await asyncio.gather(
+            *(self.aget_response(message, session_id=session_id) for session_id, message in requests)
+        )
+    
+    async def wait_for_turns(self):
+        """Vänta in strömmade turer vars konsument slutat läsa (t.ex. före aclose)"""
+        if self._turn_tasks:
+            await asyncio.gather(*list(self._turn_tasks), return_exceptions=True)
+    
+    def get_session_summary(self, session_id: str) -> Dict:
+        """Få sammanfattning av en given session"""
+        return super().get_session_summary(session_id)
+    
+    def _extract_memories(self, session: CoachingSession) -> List[Tuple[str, str]]:
+        """end_session är synkron och klienten asynkron - spara sammanfattning och mål"""
+        return self._fallback_memories(session)
+    
+    def end_session(self, session_id: str) -> Dict:
+        """Avsluta en given session, spara den och få sammanfattning"""
+        self._session_locks.pop(session_id, None)
+        return super().end_session(session_id)
+    
+    async def aclose(self):
+        """Vänta in pågående turer och stäng den delade HTTP-klienten"""
+        await self.wait_for_turns()
+        await self.client.close()
+
+# Factory function för enkel instansiering
+def create_async_ai_coach(api_key: str = None, model: str = "gpt-3.5-turbo",
+                          max_concurrency: Optional[int] = None) -> AsyncAICoach:
+    """Skapa asynkron AI-coach instans"""
+    if not api_key:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OpenAI API key krävs")
+    
+    return AsyncAICoach(api_key=api_key, model=model, max_concurrency=max_concurrency)
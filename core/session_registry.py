@@ -0,0 +1,285 @@
+"""
+Session Registry - processgemensam hantering av coaching-sessioner
+Håller aktiva sessioner i minnet med LRU- och idle-timeout-utrensning till
+databasen och återställer utrensade sessioner vid behov. Alla skrivningar går
+via write-behind-kön (utils/write_behind.py)
+"""
+
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from utils.config import Config
+from utils.write_behind import WriteBehindQueue
+
+class Message:
+    """Kompakt meddelandepost i en coaching-session
+    
+    ``content`` är modelltexten som skickas till OpenAI och ``tokens`` gäller bara den.
+    ``annotations`` är sådant som bara visas i gränssnittet (t.ex. affiliate-förslag)
+    och aldrig skickas tillbaka som historik.
+    """
+    
+    __slots__ = ("role", "content", "tokens", "created_at", "annotations")
+    
+    def __init__(self, role: str, content: str, tokens: int = 0, created_at: float = None,
+                 annotations: str = ""):
+        self.role = role
+        self.content = content
+        self.tokens = tokens
+        self.created_at = created_at if created_at is not None else time.time()
+        self.annotations = annotations
+    
+    @property
+    def display_text(self) -> str:
+        """Text som visas för användaren (modelltext + annoteringar)"""
+        return self.content + self.annotations
+    
+    @property
+    def timestamp(self) -> str:
+        """ISO-tidsstämpel (beräknas vid behov istället för att lagras)"""
+        return datetime.fromtimestamp(self.created_at).isoformat()
+    
+    def to_dict(self) -> Dict:
+        return {
+            "role": self.role,
+            "content": self.content,
+            "tokens": self.tokens,
+            "annotations": self.annotations,
+            "timestamp": self.timestamp
+        }
+    
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, tokens={self.tokens}, content={self.content[:40]!r})"
+
+class SessionRegistry:
+    """LRU-register över aktiva sessioner som delas av alla coach-instanser i processen"""
+    
+    def __init__(self, max_active: int = None, idle_timeout_minutes: float = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_active = max_active or Config.SESSION_REGISTRY_MAX_ACTIVE
+        self.idle_timeout_seconds = (
+            idle_timeout_minutes if idle_timeout_minutes is not None 
+            else Config.SESSION_IDLE_TIMEOUT_MINUTES
+        ) * 60
+        
+        self._sessions: "OrderedDict[str, object]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._evicted: set = set()
+        self._lock = threading.RLock()
+        self._last_idle_sweep = time.time()
+        
+        self._data_manager = None
+        self.writer = WriteBehindQueue(self._get_data_manager)
+        # Sätts av coach-motorn: bygger en session från sessionsraden och läser själv
+        # de meddelanden som behövs via DataManager
+        self.restorer: Optional[Callable[[Dict, object], object]] = None
+        
+        self.evictions = 0
+        self.rehydrations = 0
+    
+    def _get_data_manager(self):
+        """Skapa DataManager först när något faktiskt ska skrivas eller läsas"""
+        if self._data_manager is None:
+            from utils.data_manager import DataManager
+            self._data_manager = DataManager()
+        return self._data_manager
+    
+    def set_data_manager(self, data_manager):
+        """Använd en specifik DataManager (t.ex. i tester)"""
+        self._data_manager = data_manager
+    
+    def add(self, session) -> str:
+        """Registrera en session och returnera dess (unika) id"""
+        with self._lock:
+            # Samma användare kan starta flera sessioner inom samma sekund
+            base_id = session.session_id
+            suffix = 1
+            while session.session_id in self._sessions or session.session_id in self._evicted:
+                session.session_id = f"{base_id}_{suffix}"
+                suffix += 1
+            
+            self._sessions[session.session_id] = session
+            self._last_access[session.session_id] = time.time()
+            overflow = self._collect_overflow()
+        
+        self._persist_evicted(overflow)
+        self._maybe_sweep_idle()
+        return session.session_id
+    
+    def get(self, session_id: str):
+        """Hämta session, återställ från databasen om den rensats ut"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                self._last_access[session_id] = time.time()
+                return session
+            was_evicted = session_id in self._evicted
+        
+        if was_evicted:
+            return self._rehydrate(session_id)
+        return None
+    
+    def resume(self, session_id: str):
+        """Hämta session från registret eller läs in en sparad session från databasen"""
+        return self.get(session_id) or self._rehydrate(session_id)
+    
+    def message_page(self, session_id: str, before_id: int = None, limit: int = 50) -> List[Dict]:
+        """En sida sparade meddelanden äldre än ``before_id`` (kronologisk ordning)"""
+        return self._get_data_manager().load_session_messages_page(session_id, before_id, limit)
+    
+    def remove(self, session_id: str, persist: bool = False):
+        """Ta bort en session från registret (t.ex. när den avslutas)"""
+        with self._lock:
+            self._last_access.pop(session_id, None)
+            self._evicted.discard(session_id)
+            session = self._sessions.pop(session_id, None)
+        
+        if persist and session is not None:
+            try:
+                self.persist(session)
+                if not self.writer.flush():
+                    self.logger.error(f"Session {session_id} kunde inte skrivas till databasen")
+            except Exception as e:
+                self.logger.error(f"Kunde inte spara session {session_id}: {str(e)}")
+        return session
+    
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions or session_id in self._evicted
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+    
+    def _collect_overflow(self) -> List:
+        """Plocka ut minst nyligen använda sessioner över kapaciteten (anropas under lås)"""
+        overflow = []
+        while len(self._sessions) > self.max_active:
+            session_id, session = self._sessions.popitem(last=False)
+            self._last_access.pop(session_id, None)
+            self._evicted.add(session_id)
+            overflow.append(session)
+        return overflow
+    
+    def _maybe_sweep_idle(self):
+        """Rensa inaktiva sessioner högst en gång per minut"""
+        now = time.time()
+        if now - self._last_idle_sweep < 60:
+            return
+        self._last_idle_sweep = now
+        self.evict_idle()
+    
+    def evict_idle(self) -> int:
+        """Rensa ut sessioner som varit inaktiva längre än idle-timeout"""
+        cutoff = time.time() - self.idle_timeout_seconds
+        with self._lock:
+            idle_ids = [sid for sid, last in self._last_access.items() if last < cutoff]
+            idle = []
+            for session_id in idle_ids:
+                idle.append(self._sessions.pop(session_id))
+                self._last_access.pop(session_id, None)
+                self._evicted.add(session_id)
+        
+        self._persist_evicted(idle)
+        return len(idle)
+    
+    def _persist_evicted(self, sessions: List):
+        """Skriv utrensade sessioner till databasen"""
+        for session in sessions:
+            try:
+                self.persist(session)
+                self.evictions += 1
+            except Exception as e:
+                self.logger.error(f"Kunde inte spara session {session.session_id} vid utrensning: {str(e)}")
+    
+    def persist(self, session):
+        """Köa session och ännu osparade meddelanden för skrivning i bakgrunden"""
+        self.writer.enqueue_session(session_to_row(session))
+        
+        for message in session.messages[session.persisted_count:]:
+            if message.role == "system":
+                continue
+            self.writer.enqueue_message({
+                "session_id": session.session_id,
+                "role": message.role,
+                "content": message.content,
+                "timestamp": message.timestamp,
+                "metadata": {"tokens": message.tokens, "annotations": message.annotations}
+            })
+        session.persisted_count = len(session.messages)
+    
+    def _rehydrate(self, session_id: str):
+        """Läs tillbaka en utrensad eller tidigare sparad session från databasen"""
+        if self.restorer is None:
+            return None
+        
+        # Sessionen kan fortfarande ligga i skrivkön
+        if not self.writer.flush():
+            self.logger.warning(f"Skrivkön kunde inte tömmas - session {session_id} kan sakna de senaste turerna")
+        data_manager = self._get_data_manager()
+        row = data_manager.load_session(session_id)
+        if not row:
+            return None
+        
+        session = self.restorer(row, data_manager)
+        with self._lock:
+            self._evicted.discard(session_id)
+            self._sessions[session_id] = session
+            self._last_access[session_id] = time.time()
+            overflow = self._collect_overflow()
+        
+        self._persist_evicted(overflow)
+        self.rehydrations += 1
+        self.logger.info(f"Återställde session {session_id} från databasen")
+        return session
+    
+    def memory_stats(self) -> Dict:
+        """Uppskattad minnesanvändning för sessioner i registret"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            evicted = len(self._evicted)
+        
+        total_bytes = sum(estimate_session_bytes(session) for session in sessions)
+        return {
+            'active_sessions': len(sessions),
+            'evicted_sessions': evicted,
+            'approx_bytes': total_bytes,
+            'approx_bytes_per_session': total_bytes / len(sessions) if sessions else 0,
+            'evictions': self.evictions,
+            'rehydrations': self.rehydrations
+        }
+
+def session_to_row(session) -> Dict:
+    """Konvertera session till formatet DataManager.save_session förväntar sig"""
+    return {
+        'session_id': session.session_id,
+        'user_id': session.user_id,
+        'mode': session.mode.value,
+        'start_time': session.start_time.isoformat(),
+        'message_count': session.history_offset + len(session.messages),
+        'context': session.context,
+        'goals': session.goals,
+        'progress_notes': session.progress_notes,
+        'summary': session.summary,
+        'summarized_count': session.history_offset + session.summarized_count
+    }
+
+def estimate_session_bytes(session) -> int:
+    """Grov uppskattning av en sessions minnesavtryck"""
+    size = sys.getsizeof(session) + sys.getsizeof(session.__dict__) + sys.getsizeof(session.messages)
+    for message in session.messages:
+        size += sys.getsizeof(message)
+        # Persona-texten och de renderade affiliate-blocken delas mellan alla sessioner
+        if message.role != "system":
+            size += sys.getsizeof(message.content)
+    size += sys.getsizeof(session.summary)
+    return size
+
+# Processgemensamt register
+session_registry = SessionRegistry()
@@ -8,9 +8,14 @@ Med säker användarautentisering
 import streamlit as st
 import os
 import json
+import time
+import uuid
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+# Start för mätning av importtid och tid till första rendering
+_SCRIPT_STARTED = time.perf_counter()
+
 # Ladda environment variables
 load_dotenv()
 
@@ -19,10 +24,23 @@ IS_CLOUD_DEPLOYMENT = os.getenv('RENDER') is not None or os.getenv('PORT') is no
 
 # Importera våra moduler
 from core.ai_coach import AICoach, CoachingMode, create_ai_coach
+from core.session_registry import session_registry
 from core.personal_coach import PersonalCoach, PersonalGoalType, GoalStatus
 from core.university_coach import UniversityAICoach, AIUseCase, StakeholderType, UniversityProfile, AIImplementationPhase
 from utils.data_manager import DataManager
 from utils.api_usage_tracker import usage_tracker
+from utils.response_cache import response_cache
+from utils.semantic_cache import semantic_cache
+from utils.resilient_client import resilient_caller
+from utils.model_router import model_router
+from utils.single_flight import request_flights
+from utils.long_term_memory import long_term_memory
+from utils.spans import span_registry
+from utils.batch_jobs import BLOG_EDITOR_SYSTEM_PROMPT, BatchJobRunner, build_blog_enhancement_prompt
+from utils.rag_system import rag_system
+from utils.config import Config
+
+_IMPORTS_FINISHED = time.perf_counter()
 
 # Importera auth-system
 try:
@@ -51,10 +69,47 @@ if 'current_user' not in st.session_state:
 if 'show_settings' not in st.session_state:
     st.session_state.show_settings = False
 
+@st.cache_resource
+def get_startup_metrics():
+    """Processens importtid och tid till första rendering; startar uppvärmningen av RAG-systemet"""
+    rag_system.warm_up()
+    return {"import_seconds": _IMPORTS_FINISHED - _SCRIPT_STARTED, "first_render_seconds": None}
+
+def record_first_render():
+    """Spara tiden till första färdiga rendering (bara processens första körning)"""
+    metrics = get_startup_metrics()
+    if metrics["first_render_seconds"] is None:
+        metrics["first_render_seconds"] = time.perf_counter() - _SCRIPT_STARTED
+
+get_startup_metrics()
+
+@st.cache_resource
+def get_coach_engine():
+    """En delad coach-motor för alla webbläsarsessioner (sessionerna hålls i registret)"""
+    return create_ai_coach()
+
+@st.cache_resource
+def get_batch_runner():
+    """Processgemensam batch-körare som tar emot och skickar in jobb i bakgrunden"""
+    runner = BatchJobRunner()
+    if runner.api_key:
+        runner.start()
+    return runner
+
+def coaching_user_id():
+    """Användar-id för coaching-sessioner och långtidsminne (utvecklingsanvändare utan inloggning)"""
+    user = st.session_state.get('current_user')
+    return str(user.id) if user else "user_1"
+
+def is_admin_user():
+    """Inloggad administratör (processgemensam driftdata visas bara för dem)"""
+    user = st.session_state.get('current_user')
+    return bool(user and user.is_admin)
+
 # Initialisera session state
 if 'ai_coach' not in st.session_state:
     try:
-        st.session_state.ai_coach = create_ai_coach()
+        st.session_state.ai_coach = get_coach_engine()
     except ValueError as e:
         st.error(f"Fel vid initialisering av AI-coach: {str(e)}")
         st.stop()
@@ -151,7 +206,7 @@ def main():
         st.subheader("Session")
         if not st.session_state.session_started:
             if st.button("Starta Coaching-Session"):
-                user_id = "user_1"  # I production, detta skulle komma från auth
+                user_id = coaching_user_id()
                 session_id = st.session_state.ai_coach.start_session(
                     user_id=user_id,
                     mode=st.session_state.current_mode
@@ -160,10 +215,22 @@ def main():
                 st.session_state.session_id = session_id
                 st.success(f"Session startad: {session_id}")
                 st.rerun()
+            
+            # Återuppta en sparad session (bara senaste fönstret laddas)
+            saved_sessions = st.session_state.data_manager.load_user_sessions(coaching_user_id())[:10]
+            if saved_sessions:
+                labels = {
+                    f"{str(row['start_time'])[:16].replace('T', ' ')} · {row['mode']} · "
+                    f"{row['message_count']} meddelanden": row['id']
+                    for row in saved_sessions
+                }
+                selected_session = st.selectbox("Tidigare sessioner:", options=list(labels.keys()))
+                if st.button("Återuppta Session"):
+                    resume_chat_session(labels[selected_session])
         else:
             st.success("✅ Session aktiv")
             if st.button("Avsluta Session"):
-                summary = st.session_state.ai_coach.end_session()
+                summary = st.session_state.ai_coach.end_session(st.session_state.session_id)
                 st.session_state.session_started = False
                 st.info("Session avslutad")
                 st.json(summary)
@@ -171,9 +238,13 @@ def main():
         # Quick stats
         if st.session_state.session_started:
             st.subheader("Session Info")
-            summary = st.session_state.ai_coach.get_session_summary()
+            summary = st.session_state.ai_coach.get_session_summary(st.session_state.session_id)
             st.metric("Meddelanden", summary.get('message_count', 0))
             st.metric("Läge", summary.get('mode', 'N/A'))
+            if summary.get('annotation_tokens_saved'):
+                st.metric("Tokens sparade (annoteringar)", f"{summary['annotation_tokens_saved']:,}")
+            if summary.get('template_tokens_saved'):
+                st.metric("Tokens sparade (mallar)", f"{summary['template_tokens_saved']:,}")
     
     # Main content area
     if not st.session_state.session_started:
@@ -241,7 +312,7 @@ def show_welcome_content():
         
         if st.button("Starta Personlig Coaching", type="primary"):
             st.session_state.current_mode = CoachingMode.PERSONAL
-            user_id = "user_1"
+            user_id = coaching_user_id()
             session_id = st.session_state.ai_coach.start_session(user_id, CoachingMode.PERSONAL)
             st.session_state.session_started = True
             st.session_state.session_id = session_id
@@ -260,7 +331,7 @@ def show_welcome_content():
         
         if st.button("Starta Universitets-Coaching", type="primary"):
             st.session_state.current_mode = CoachingMode.UNIVERSITY
-            user_id = "user_1"  
+            user_id = coaching_user_id()
             session_id = st.session_state.ai_coach.start_session(user_id, CoachingMode.UNIVERSITY)
             st.session_state.session_started = True
             st.session_state.session_id = session_id
@@ -278,7 +349,7 @@ def show_welcome_content():
     
     if st.button("Starta Hybrid Coaching", type="primary"):
         st.session_state.current_mode = CoachingMode.HYBRID
-        user_id = "user_1"
+        user_id = coaching_user_id()
         session_id = st.session_state.ai_coach.start_session(user_id, CoachingMode.HYBRID)
         st.session_state.session_started = True
         st.session_state.session_id = session_id
@@ -340,6 +411,16 @@ def show_chat_interface():
     if 'chat_messages' not in st.session_state:
         st.session_state.chat_messages = []
     
+    # Äldre meddelanden i en återupptagen session hämtas först när användaren bläddrar bakåt
+    if st.session_state.get('history_cursor') is not None:
+        if st.button("⬆️ Visa äldre meddelanden"):
+            older, st.session_state.history_cursor = st.session_state.ai_coach.get_message_page(
+                st.session_state.session_id, before_id=st.session_state.history_cursor
+            )
+            st.session_state.chat_messages[:0] = [
+                {**message, "timestamp": message["timestamp"][11:16]} for message in older
+            ]
+    
     # Display chat messages
     for message in st.session_state.chat_messages:
         with st.chat_message(message["role"]):
@@ -349,16 +430,22 @@ def show_chat_interface():
     
     # Chat input
     if prompt := st.chat_input("Skriv ditt meddelande här..."):
+        submission = register_submission(prompt)
+        
         # Add user message to chat history
-        st.session_state.chat_messages.append({
-            "role": "user", 
-            "content": prompt,
-            "timestamp": datetime.now().strftime("%H:%M")
-        })
+        if not submission["user_shown"]:
+            st.session_state.chat_messages.append({
+                "role": "user", 
+                "content": prompt,
+                "timestamp": datetime.now().strftime("%H:%M")
+            })
+            submission["user_shown"] = True
+            with st.chat_message("user"):
+                st.write(prompt)
         
         # Get AI response
         try:
-            response, metadata = st.session_state.ai_coach.get_response(prompt)
+            response = stream_assistant_reply(prompt, idempotency_key=submission["key"])
             
             # Add assistant response to chat history
             st.session_state.chat_messages.append({
@@ -366,8 +453,7 @@ def show_chat_interface():
                 "content": response, 
                 "timestamp": datetime.now().strftime("%H:%M")
             })
-            
-            st.rerun()
+            complete_submission(submission)
             
         except Exception as e:
             st.error(f"Fel vid kommunikation med AI-coach: {str(e)}")
@@ -385,24 +471,86 @@ def show_chat_interface():
     
     for i, prompt in enumerate(prompts[:4]):  # Visa max 4 förslag
         if st.button(prompt, key=f"prompt_{i}"):
-            # Simulera att användaren klickade på prompten
-            st.session_state.chat_messages.append({
-                "role": "user",
-                "content": prompt,
-                "timestamp": datetime.now().strftime("%H:%M")
-            })
+            # Simulera att användaren klickade på prompten (dubbelklick under svaret ger samma nyckel)
+            submission = register_submission(prompt)
+            if not submission["user_shown"]:
+                st.session_state.chat_messages.append({
+                    "role": "user",
+                    "content": prompt,
+                    "timestamp": datetime.now().strftime("%H:%M")
+                })
+                submission["user_shown"] = True
             
             try:
-                response, metadata = st.session_state.ai_coach.get_response(prompt)
+                response = stream_assistant_reply(prompt, cacheable=True,
+                                                  idempotency_key=submission["key"])
                 st.session_state.chat_messages.append({
                     "role": "assistant", 
                     "content": response,
                     "timestamp": datetime.now().strftime("%H:%M")
                 })
+                complete_submission(submission)
                 st.rerun()
             except Exception as e:
                 st.error(f"Fel: {str(e)}")
 
+def resume_chat_session(session_id):
+    """Återuppta en sparad session och visa det inladdade fönstret i chatten"""
+    coach = st.session_state.ai_coach
+    if not coach.resume_session(session_id):
+        st.error("Sessionen kunde inte återupptas")
+        return
+    
+    st.session_state.session_id = session_id
+    st.session_state.session_started = True
+    st.session_state.chat_messages = [
+        {**message, "timestamp": message["timestamp"][11:16]}
+        for message in coach.get_display_messages(session_id)
+    ]
+    # Cursor för bläddring bakåt: None när hela historiken redan är inladdad
+    st.session_state.history_cursor = coach.get_history_cursor(session_id)
+    st.rerun()
+
+def register_submission(prompt):
+    """Idempotensnyckel för ett inskickat meddelande
+    
+    Samma text medan föregående inlämning ännu inte besvarats (dubbelklick eller en
+    omkörning som avbröt strömmen) återanvänder nyckeln, så coachen svarar bara en
+    gång. När svaret visats rensas inlämningen (complete_submission) och samma text
+    blir en ny tur, hur snabbt den än skickas.
+    """
+    last = st.session_state.get("last_submission")
+    if last and last["prompt"] == prompt:
+        return last
+    
+    submission = {"prompt": prompt, "key": uuid.uuid4().hex, "user_shown": False}
+    st.session_state.last_submission = submission
+    return submission
+
+def complete_submission(submission):
+    """Svaret är visat - nästa inlämning räknas som en ny tur"""
+    if st.session_state.get("last_submission") is submission:
+        st.session_state.last_submission = None
+
+def stream_assistant_reply(prompt, cacheable=False, idempotency_key=None):
+    """Strömma coachens svar in i ett chat-meddelande och returnera hela texten"""
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        response = ""
+        for delta in st.session_state.ai_coach.stream_response(
+            prompt, cacheable=cacheable, session_id=st.session_state.session_id,
+            idempotency_key=idempotency_key
+        ):
+            response += delta
+            placeholder.markdown(response + "▌")
+        placeholder.markdown(response)
+        
+        metadata = st.session_state.ai_coach.get_last_response_metadata(st.session_state.session_id)
+        if metadata.get("time_to_first_token_ms") is not None:
+            st.caption(f"Första token efter {metadata['time_to_first_token_ms']:.0f} ms")
+    
+    return response
+
 def show_personal_goals_interface():
     """Visa personliga mål-gränssnitt"""
     st.header("🎯 Personliga Mål")
@@ -785,6 +933,31 @@ def show_api_usage_interface():
     with col4:
         st.metric("Kostnad (SEK)", f"{summary['today']['total_cost_sek']:.2f} kr")
     
+    if summary['today'].get('avg_time_to_first_token_ms') is not None:
+        st.metric("Snitt tid till första token", f"{summary['today']['avg_time_to_first_token_ms']:.0f} ms")
+    
+    # Leverantörens prompt-cache (stabilt prompt-prefix)
+    today = summary['today']
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Cachade prompt-tokens", f"{today['cached_tokens']:,}",
+                  f"{today['cached_token_share']:.0%} av prompt-tokens")
+    with col2:
+        st.metric("Besparing prompt-cache (USD)", f"${today['prompt_cache_savings_usd']:.4f}")
+    with col3:
+        if today['avg_latency_ms_cached'] is not None and today['avg_latency_ms_uncached'] is not None:
+            st.metric("Latens med cache", f"{today['avg_latency_ms_cached']:.0f} ms",
+                      f"{today['avg_latency_ms_cached'] - today['avg_latency_ms_uncached']:.0f} ms",
+                      delta_color="inverse")
+    
+    # Batch API (icke-interaktiva jobb till halva priset)
+    if today['batch_requests']:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Batch-anrop idag", today['batch_requests'])
+        with col2:
+            st.metric("Besparing batch (USD)", f"${today['batch_savings_usd']:.4f}")
+    
     # Månadens användning
     st.subheader("📊 Denna Månad")
     col1, col2, col3 = st.columns(3)
@@ -796,6 +969,140 @@ def show_api_usage_interface():
     with col3:
         st.metric("Snitt per Request", f"${summary['month']['average_cost_per_request']:.4f}")
     
+    # Svarscache
+    cache_stats = response_cache.get_stats()
+    st.subheader("🗄️ Svarscache")
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Träffar", cache_stats['hits'])
+    with col2:
+        st.metric("Missar", cache_stats['misses'])
+    with col3:
+        st.metric("Träffgrad", f"{cache_stats['hit_rate']:.0%}")
+    with col4:
+        st.metric("Poster", f"{cache_stats['entries']} / {cache_stats['max_entries']}")
+    
+    semantic_stats = semantic_cache.get_stats()
+    st.caption(
+        f"Semantisk cache: {semantic_stats['hits']} träffar, {semantic_stats['misses']} missar, "
+        f"{semantic_stats['entries']} frågor ({semantic_stats['embedding_model'] or 'ingen embedder än'})"
+    )
+    
+    # API-anropens hälsa (retries, hedging, circuit breaker)
+    call_stats = resilient_caller.get_stats()
+    st.subheader("🛡️ API-anrop")
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Circuit breaker", call_stats['circuit_state'])
+    with col2:
+        st.metric("p50", f"{call_stats['p50_ms']:.0f} ms" if call_stats['p50_ms'] is not None else "–")
+    with col3:
+        st.metric("p95", f"{call_stats['p95_ms']:.0f} ms" if call_stats['p95_ms'] is not None else "–")
+    with col4:
+        st.metric("Retries", call_stats['outcomes'].get('retry', 0))
+    
+    if call_stats['outcomes']:
+        st.caption(", ".join(f"{name}: {count}" for name, count in sorted(call_stats['outcomes'].items())))
+    
+    # Dubbletter (omkörningar, dubbelklick, samtidiga identiska frågor) som inte debiterades
+    flight_stats = request_flights.get_stats()
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Dubbletter undertryckta", flight_stats['suppressed'])
+    with col2:
+        st.metric("Samtidiga anrop delade", flight_stats['coalesced'])
+    
+    # Modellval per tur (routingbeslut och deras utfall)
+    router_stats = model_router.get_stats()
+    if router_stats['enabled']:
+        st.subheader("🧭 Modellval")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Budgetläge", router_stats['budget_state'])
+        with col2:
+            st.metric("Dagsbudget", f"${router_stats['daily_budget_usd']:.2f}")
+        st.caption(", ".join(f"{tier}: {count}" for tier, count in router_stats['by_tier'].items()))
+        for model, stats in router_stats['by_model'].items():
+            latency = f"{stats['avg_latency_ms']:.0f} ms" if stats['avg_latency_ms'] is not None else "–"
+            st.write(f"**{model}**: {stats['requests']} anrop, {latency}, ${stats['cost_usd']:.4f}, "
+                     f"{stats['fallbacks']} reservval, {stats['errors']} fel")
+    
+    # Sessionsregister
+    registry_stats = session_registry.memory_stats()
+    st.subheader("🧠 Aktiva Sessioner")
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Aktiva", registry_stats['active_sessions'])
+    with col2:
+        st.metric("Utrensade", registry_stats['evicted_sessions'])
+    with col3:
+        st.metric("Minne", f"{registry_stats['approx_bytes'] / 1024:.0f} KB")
+    with col4:
+        st.metric("Per session", f"{registry_stats['approx_bytes_per_session'] / 1024:.1f} KB")
+    
+    # Långtidsminne mellan sessioner
+    memory_stats = long_term_memory.get_stats()
+    if memory_stats['enabled']:
+        st.caption(
+            f"Långtidsminne: {memory_stats['recall_hits']} av {memory_stats['recalls']} turer fick minnen, "
+            f"i snitt {memory_stats['avg_tokens_injected']:.0f} tokens, "
+            f"{memory_stats['stored']} nya minnen sparade"
+        )
+    
+    # Write-behind-kön för sessioner och meddelanden
+    writer_stats = session_registry.writer.get_stats()
+    if writer_stats['enabled']:
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Skrivkö", f"{writer_stats['queue_depth']} / {writer_stats['max_queue']}")
+        with col2:
+            flush_p95 = writer_stats['flush_p95_ms']
+            st.metric("Flush p95", f"{flush_p95:.0f} ms" if flush_p95 is not None else "–")
+        with col3:
+            st.metric("Sparade meddelanden", writer_stats['messages_written'])
+        with col4:
+            st.metric("Köväntan", writer_stats['backpressure_waits'])
+        if writer_stats['dropped_batches']:
+            st.error(f"{writer_stats['dropped_items']} poster kunde inte sparas efter "
+                     f"{writer_stats['failed_batches']} misslyckade skrivförsök - se loggen")
+        elif writer_stats['failed_batches']:
+            st.warning(f"{writer_stats['failed_batches']} skrivförsök misslyckades och gjordes om - se loggen")
+    
+    # Uppstart: importtid, första rendering och RAG-uppvärmning
+    startup = get_startup_metrics()
+    rag_status = rag_system.get_status()
+    first_render = startup['first_render_seconds']
+    warmup = rag_status['warmup_seconds']
+    st.caption(
+        f"Uppstart: import {startup['import_seconds']:.2f} s, första rendering "
+        f"{f'{first_render:.2f} s' if first_render is not None else '–'} · "
+        f"RAG: {rag_status['backend'] or 'ej laddat'} "
+        f"({f'uppvärmt på {warmup:.1f} s' if rag_status['ready'] else 'värms upp i bakgrunden'})"
+    )
+    
+    # Tidsfördelning per steg i chatturerna (processgemensam - bara för administratörer)
+    span_stats = span_registry.snapshot()
+    if is_admin_user() and span_stats['enabled'] and span_stats['spans']:
+        st.subheader("⏱️ Tidsfördelning per steg")
+        st.caption(f"Mätt på {span_stats['sample_rate']:.0%} av turerna (SPAN_SAMPLE_RATE), inklusive nästlade steg")
+        st.table([
+            {
+                "Steg": name,
+                "Antal": histogram['count'],
+                "p50 (ms)": round(histogram['p50_ms'], 1),
+                "p95 (ms)": round(histogram['p95_ms'], 1),
+                "p99 (ms)": round(histogram['p99_ms'], 1),
+                "Snitt (ms)": round(histogram['mean_ms'], 1)
+            }
+            for name, histogram in sorted(span_stats['spans'].items(),
+                                          key=lambda item: item[1]['sum_ms'], reverse=True)
+        ])
+        st.download_button("📥 Ladda ner tidsmätningar (JSON)", span_registry.dump_json(),
+                           file_name="span_histograms.json", mime="application/json")
+    
     # Rekommendationer
     st.subheader("💡 Rekommendationer")
     for rec in summary['recommendations']:
@@ -853,7 +1160,7 @@ def show_coaching_start():
         
         if st.button("Starta Personlig Coaching", type="primary", key="personal_start"):
             st.session_state.current_mode = CoachingMode.PERSONAL
-            user_id = "user_1"
+            user_id = coaching_user_id()
             session_id = st.session_state.ai_coach.start_session(user_id, CoachingMode.PERSONAL)
             st.session_state.session_started = True
             st.session_state.session_id = session_id
@@ -871,7 +1178,7 @@ def show_coaching_start():
         
         if st.button("Starta Universitets-Coaching", type="primary", key="university_start"):
             st.session_state.current_mode = CoachingMode.UNIVERSITY
-            user_id = "user_1"  
+            user_id = coaching_user_id()
             session_id = st.session_state.ai_coach.start_session(user_id, CoachingMode.UNIVERSITY)
             st.session_state.session_started = True
             st.session_state.session_id = session_id
@@ -934,8 +1241,11 @@ def show_blog_admin():
             
             if st.form_submit_button("📝 Skapa Inlägg"):
                 if title and content:
+                    # Med batch-jobb skapas inlägget direkt och förbättras i bakgrunden
+                    queue_enhancement = ai_assist and Config.ENABLE_BATCH_JOBS
+                    
                     # AI-assistance för innehåll
-                    if ai_assist and content:
+                    if ai_assist and not queue_enhancement:
                         with st.spinner("🤖 Förbättrar innehåll med AI..."):
                             try:
                                 enhanced_content = enhance_blog_content_with_ai(content, title, category)
@@ -949,12 +1259,23 @@ def show_blog_admin():
                         content=content,
                         category=category,
                         tags=tags,
-                        published=published,
+                        published=published and not queue_enhancement,
                         featured=featured,
                         excerpt=excerpt
                     )
                     
-                    if post_id:
+                    if post_id and queue_enhancement:
+                        job_id = get_batch_runner().enqueue_blog_enhancement(
+                            post_id, content, title, category, publish=published
+                        )
+                        st.success(f"✅ Blogginlägg skapat! ID: {post_id}")
+                        if job_id:
+                            st.info("🕒 AI-förbättringen är köad som batch-jobb (halva priset). "
+                                    "Inlägget uppdateras" + (" och publiceras" if published else "")
+                                    + " när resultatet kommit.")
+                        else:
+                            st.warning("AI-förbättringen kunde inte köas - inlägget sparades som utkast")
+                    elif post_id:
                         st.success(f"✅ Blogginlägg skapat! ID: {post_id}")
                         if published:
                             st.info("📢 Inlägget är nu live på bloggen!")
@@ -966,6 +1287,31 @@ def show_blog_admin():
     with admin_tabs[1]:
         st.subheader("Hantera befintliga inlägg")
         
+        if Config.ENABLE_BATCH_JOBS:
+            batch_runner = get_batch_runner()
+            batch_stats = batch_runner.get_stats()
+            if batch_stats['queued'] or batch_stats['submitting'] or batch_stats['submitted']:
+                st.info(f"🕒 Batch-jobb: {batch_stats['queued']} i kö, "
+                        f"{batch_stats['submitting'] + batch_stats['submitted']} inskickade")
+
+            # Resultat för inlägg som redigerats medan jobbet väntade
+            for job in batch_runner.get_review_jobs():
+                with st.expander(f"🔍 AI-förbättring att granska (inlägg {job['post_id']})"):
+                    st.caption("Inlägget har ändrats sedan förbättringen köades och skrevs därför inte över.")
+                    st.markdown(job['result'] or "")
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        if st.button("✅ Applicera", key=f"apply_batch_{job['id']}"):
+                            if batch_runner.apply_review(job):
+                                st.success("Inlägget uppdaterat med AI-förbättringen")
+                                st.rerun()
+                            else:
+                                st.error("❌ Inlägget kunde inte uppdateras")
+                    with col2:
+                        if st.button("🗑️ Behåll nuvarande", key=f"discard_batch_{job['id']}"):
+                            batch_runner.discard_review(job)
+                            st.rerun()
+
         # Hämta alla inlägg (även opublicerade)
         all_posts = st.session_state.data_manager.get_blog_posts(published_only=False)
         
@@ -1160,31 +1506,14 @@ def show_blog_post_card(post, featured=False):
 def enhance_blog_content_with_ai(content, title, category):
     """Förbättra blogginlägg med AI"""
     try:
-        ai_coach = st.session_state.ai_coach
-        
-        prompt = f"""
-        Som en expert på AI-coaching och personlig utveckling, förbättra följande blogginlägg:
-        
-        Titel: {title}
-        Kategori: {category}
-        Ursprungligt innehåll: {content}
-        
-        Förbättra innehållet genom att:
-        1. Göra det mer engagerande och läsbart
-        2. Lägga till praktiska tips och exempel
-        3. Strukturera med rubriker och punktlistor
-        4. Använda emojis och coaching-språk
-        5. Lägga till en inspirerande avslutning
-        
-        Behåll den ursprungliga tonen men gör det mer professionellt och värdefullt för läsaren.
-        Skriv på svenska och använd markdown-formatering.
-        """
+        prompt = build_blog_enhancement_prompt(content, title, category)
         
-        response, _ = ai_coach.get_response(prompt)
-        return response
+        # Direkt anrop utan session: inget i registret, current_session eller skrivkön
+        return st.session_state.ai_coach.complete_once(BLOG_EDITOR_SYSTEM_PROMPT, prompt, usage_label="blog_admin")
         
     except Exception as e:
         raise Exception(f"AI-enhancement misslyckades: {str(e)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    record_first_render()
\ No newline at end of file
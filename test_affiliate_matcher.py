@@ -0,0 +1,120 @@
+"""
+Test script för AffiliateMatcher
+Verifierar ordgränser, prefix-nyckelord, prioritetsordning och att katalogen
+laddas om när filen ändras
+"""
+
+import sys
+import os
+import json
+import tempfile
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.affiliate_matcher import AffiliateMatcher, CompiledCatalog
+
+CATALOG = {
+    "max_suggestions": 2,
+    "header": "Resurser:",
+    "footer": "Tack!",
+    "categories": [
+        {"id": "education", "text": "Kurs-länk", "keywords": ["ai", "machine learning", "kurs*"]},
+        {"id": "productivity", "text": "Notion-länk", "keywords": ["mål*", "planering"]},
+        {"id": "ai_tools", "text": "ChatGPT-länk", "keywords": ["ai tool*", "chatgpt"]},
+    ]
+}
+
+def _write_catalog(path: str, data: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+def test_word_boundaries():
+    """Korta nyckelord som "ai" matchar inte inne i andra ord"""
+    print("🔤 Testing word boundaries...")
+
+    catalog = CompiledCatalog(CATALOG)
+    assert catalog.match("Skicka ett mail med detaljerna") == []
+    assert catalog.match("Hur använder jag AI i undervisningen?") == ["education"]
+    assert catalog.match("AI-strategi för universitetet") == ["education"]
+    assert catalog.match("Machine\nLearning är spännande") == ["education"]
+
+    print("✅ 'ai' no longer matches inside 'mail' or 'detaljerna'")
+
+def test_prefix_keywords():
+    """Nyckelord med * matchar böjningar men inte mitt i ord"""
+    print("🔤 Testing prefix keywords...")
+
+    catalog = CompiledCatalog(CATALOG)
+    assert catalog.match("Kursen börjar i maj") == ["education"]
+    assert catalog.match("Sätt tydliga målsättningar") == ["productivity"]
+    assert catalog.match("En intressant diskurs") == []
+    assert catalog.match("Prova några AI tools") == ["education", "ai_tools"]
+
+    print("✅ Prefix keywords match inflections only")
+
+def test_priority_and_limit():
+    """Kategorier returneras i katalogordning och max_suggestions respekteras"""
+    print("📋 Testing priority and limit...")
+
+    matcher = AffiliateMatcher(catalog_path=_temp_catalog(CATALOG), reload_interval_seconds=0)
+    assert matcher.match("chatgpt hjälper med mål", "lär dig ai") == ["education", "productivity", "ai_tools"]
+
+    text = matcher.suggestions_text("chatgpt hjälper med mål", "lär dig ai")
+    assert "Kurs-länk" in text and "Notion-länk" in text
+    assert "ChatGPT-länk" not in text
+    assert text.endswith("Tack!")
+    assert matcher.suggestions_text("Hej", "Hallå") == ""
+
+    print("✅ Max two suggestions in catalog order")
+
+def test_hot_reload():
+    """Ändrad katalogfil laddas om utan omstart; trasig fil behåller den gamla"""
+    print("♻️ Testing hot reload...")
+
+    path = _temp_catalog(CATALOG)
+    matcher = AffiliateMatcher(catalog_path=path, reload_interval_seconds=0)
+    assert matcher.match("Läs en bok") == []
+
+    updated = json.loads(json.dumps(CATALOG))
+    updated["categories"].append({"id": "books", "text": "Bok-länk", "keywords": ["bok"]})
+    _write_catalog(path, updated)
+    os.utime(path, (os.path.getmtime(path) + 10, os.path.getmtime(path) + 10))
+    assert matcher.match("Läs en bok") == ["books"]
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{ trasig json")
+    os.utime(path, (os.path.getmtime(path) + 20, os.path.getmtime(path) + 20))
+    assert matcher.match("Läs en bok") == ["books"]
+
+    print(f"✅ Reloaded {matcher.reloads - 1} time(s), kept last good catalog on error")
+
+def _temp_catalog(data: dict) -> str:
+    path = os.path.join(tempfile.mkdtemp(), "affiliate_catalog.json")
+    _write_catalog(path, data)
+    return path
+
+def test_shipped_catalog_compiles():
+    """Katalogen som följer med repot går att ladda"""
+    print("📦 Testing shipped catalog...")
+
+    matcher = AffiliateMatcher(reload_interval_seconds=3600)
+    assert matcher.catalog is not None
+    assert matcher.match("Vilken Python-kurs passar mig?") == ["education"]
+
+    print(f"✅ {len(matcher.catalog.categories)} categories loaded")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting AffiliateMatcher Tests\n")
+
+    test_word_boundaries()
+    test_prefix_keywords()
+    test_priority_and_limit()
+    test_hot_reload()
+    test_shipped_catalog_compiles()
+
+    print("\n🎉 All AffiliateMatcher tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -5,11 +5,17 @@ Testar alla huvudfunktioner för både personlig coaching och universitets AI-im
 
 import sys
 import os
+import tempfile
 from datetime import datetime, timedelta
 
 # Lägg till projektroot till Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# Svarscache och långtidsminne i en temporär katalog istället för data/
+_TEST_DIR = tempfile.mkdtemp()
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+
 from core.ai_coach import AICoach, CoachingMode, create_ai_coach
 from core.personal_coach import PersonalCoach, PersonalGoalType, GoalStatus
 from core.university_coach import UniversityAICoach, AIUseCase, StakeholderType, UniversityProfile, AIImplementationPhase
@@ -152,6 +158,12 @@ def test_ai_coach_core():
         print(f"✅ Got AI response ({len(response)} chars)")
         print(f"   Metadata: {metadata}")
         
+        # Test 4b: Strömmat svar (kostar också tokens)
+        print("🔄 Streaming AI response...")
+        deltas = list(coach.stream_response("Vilket är första steget mot det målet?"))
+        print(f"✅ Streamed {len(deltas)} deltas ({len(''.join(deltas))} chars)")
+        print(f"   Time to first token: {coach.last_response_metadata.get('time_to_first_token_ms')} ms")
+        
         # Test 5: Sätt mål för session
         coach.set_goals(["Lära mig AI grunderna", "Bygga mitt första projekt"])
         print("✅ Set session goals")
@@ -6,11 +6,17 @@ Testar att AI-expertis integration fungerar korrekt utan extra API-kostnader
 
 import os
 import sys
+import tempfile
 from dotenv import load_dotenv
 
 # Lägg till projektets root till path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# Svarscache och långtidsminne i en temporär katalog istället för data/
+_TEST_DIR = tempfile.mkdtemp()
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+
 # Ladda environment variables
 load_dotenv()
 
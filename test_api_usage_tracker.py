@@ -0,0 +1,40 @@
+"""
+Test script för APIUsageTracker
+Verifierar att leverantörens cachade prompt-tokens läses ur usage-fältet,
+sänker kostnaden och syns i dagens sammanställning
+"""
+
+import sys
+import os
+import tempfile
+from types import SimpleNamespace
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.api_usage_tracker import APIUsageTracker
+
+def test_cached_tokens_tracked():
+    """cached_tokens läses ur usage och sänker kostnaden"""
+    print("📦 Testing cached token tracking...")
+
+    tracker = APIUsageTracker(usage_file=os.path.join(tempfile.mkdtemp(), "usage.json"))
+    usage = SimpleNamespace(prompt_tokens=2000, completion_tokens=100, total_tokens=2100,
+                            prompt_tokens_details=SimpleNamespace(cached_tokens=1536))
+    tracked = tracker.track_usage(SimpleNamespace(usage=usage), "s1", "personal", latency_ms=300)
+
+    assert tracked.cached_tokens == 1536
+    assert tracked.cost_usd < tracker.calculate_cost("gpt-3.5-turbo", 2000, 100)
+    daily = tracker.get_daily_usage()
+    assert daily['cached_tokens'] == 1536
+    assert daily['prompt_cache_savings_usd'] > 0
+    print(f"✅ {daily['cached_token_share']:.0%} of prompt tokens cached")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting API Usage Tracker tests...\n")
+    test_cached_tokens_tracked()
+    print("\n🎉 API Usage Tracker tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
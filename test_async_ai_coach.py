@@ -0,0 +1,167 @@
+"""
+Test script för AsyncAICoach
+Kör samtidiga sessioner mot stub-servern och verifierar att antalet parallella
+API-anrop begränsas, att sessionerna inte blandas, att en långsam strömkonsument
+inte håller semaforen och att idempotensnycklar ger ett enda anrop
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+import time
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_TEST_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DIR, "async_sessions.db")
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+
+from core.ai_coach import CoachingMode
+from core.async_ai_coach import AsyncAICoach
+from utils.api_usage_tracker import usage_tracker
+from utils.openai_stub_server import StubServer
+
+usage_tracker.usage_file = os.path.join(_TEST_DIR, "api_usage.json")
+
+def _coach(stub: StubServer, max_concurrency: int) -> AsyncAICoach:
+    coach = AsyncAICoach(api_key="test-key", base_url=stub.base_url, max_concurrency=max_concurrency)
+    coach.response_cache = None
+    coach.semantic_cache = None
+    return coach
+
+async def _track_peak(coach: AsyncAICoach, samples: list):
+    """Läs in_flight var 5:e ms medan turerna körs (kräver att event loopen inte blockeras)"""
+    while True:
+        samples.append(coach.in_flight)
+        await asyncio.sleep(0.005)
+
+def test_concurrent_sessions():
+    """Sex sessioner samtidigt med högst tre parallella anrop och egna historiker"""
+    print("⚡ Testing concurrent sessions...")
+
+    async def scenario(stub: StubServer):
+        coach = _coach(stub, max_concurrency=3)
+        session_ids = [coach.start_session(f"async_user_{index}", CoachingMode.PERSONAL) for index in range(6)]
+        samples = []
+        tracker = asyncio.ensure_future(_track_peak(coach, samples))
+        started = time.perf_counter()
+        results = await coach.gather_responses(
+            [(session_id, f"Fråga {index} om planering") for index, session_id in enumerate(session_ids)]
+        )
+        elapsed = time.perf_counter() - started
+        tracker.cancel()
+
+        for index, (session_id, (response, metadata)) in enumerate(zip(session_ids, results)):
+            assert response.startswith(stub.reply) and "error" not in metadata
+            session = coach.sessions.get(session_id)
+            assert session.messages[1].content == f"Fråga {index} om planering"
+            assert len(session.messages) == 3
+            coach.end_session(session_id)
+        await coach.aclose()
+        return max(samples), elapsed
+
+    with StubServer(latency_ms=150) as stub:
+        peak, elapsed = asyncio.run(scenario(stub))
+        assert stub.requests == 6
+
+    assert 2 <= peak <= 3
+    assert 0.3 <= elapsed < 0.9  # två vågor à 150 ms, inte sex i följd
+
+    print(f"✅ 6 sessions in {elapsed:.2f}s with at most {peak} calls in flight")
+
+def test_slow_stream_consumer_releases_semaphore():
+    """En strömkonsument som läser långsamt blockerar inte andra sessioner"""
+    print("🌊 Testing streaming with a slow consumer...")
+
+    async def scenario(stub: StubServer):
+        coach = _coach(stub, max_concurrency=1)
+        streaming = coach.start_session("async_stream_user", CoachingMode.PERSONAL)
+        other = coach.start_session("async_other_user", CoachingMode.PERSONAL)
+
+        chunks = []
+        async for delta in coach.astream_response("Hur kommer jag igång?", session_id=streaming):
+            chunks.append(delta)
+            if len(chunks) == 1:
+                # Konsumenten dröjer; turen har redan släppt semaforen när stubben strömmat klart
+                await asyncio.sleep(0.2)
+                started = time.perf_counter()
+                response, _ = await asyncio.wait_for(
+                    coach.aget_response("En annan fråga", session_id=other), timeout=0.5
+                )
+                other_latency = time.perf_counter() - started
+                assert response.startswith(stub.reply)
+
+        session = coach.sessions.get(streaming)
+        assert "".join(chunks) == session.messages[-1].display_text
+        assert session.last_response_metadata["tokens_used"] > 0
+        for session_id in (streaming, other):
+            coach.end_session(session_id)
+        await coach.aclose()
+        return other_latency
+
+    with StubServer(reply="Börja med en timme i veckan och ett litet eget projekt.") as stub:
+        other_latency = asyncio.run(scenario(stub))
+
+    print(f"✅ Second session answered in {other_latency * 1000:.0f} ms while the stream was being read")
+
+def test_idempotent_turns():
+    """Samma idempotensnyckel två gånger samtidigt ger ett anrop och ett delat svar"""
+    print("🔑 Testing idempotency keys...")
+
+    async def scenario(stub: StubServer):
+        coach = _coach(stub, max_concurrency=4)
+        session_id = coach.start_session("async_idem_user", CoachingMode.PERSONAL)
+        first, second = await asyncio.gather(
+            coach.aget_response("Hej!", session_id=session_id, idempotency_key="submit-1"),
+            coach.aget_response("Hej!", session_id=session_id, idempotency_key="submit-1")
+        )
+        streamed = [delta async for delta in coach.astream_response(
+            "Hej!", session_id=session_id, idempotency_key="submit-1"
+        )]
+        session = coach.sessions.get(session_id)
+        message_count = len(session.messages)
+        coach.end_session(session_id)
+        await coach.aclose()
+        return first, second, streamed, message_count
+
+    with StubServer(latency_ms=100) as stub:
+        first, second, streamed, message_count = asyncio.run(scenario(stub))
+        assert stub.requests == 1
+
+    assert first[0] == second[0] == "".join(streamed)
+    assert sum(bool(metadata.get("deduplicated")) for _, metadata in (first, second)) == 1
+    assert message_count == 3
+
+    print("✅ One upstream call for three submissions")
+
+def test_sync_entry_points_refused():
+    """De synkrona metoderna pekar vidare till de asynkrona"""
+    print("🚫 Testing sync entry points...")
+
+    coach = AsyncAICoach(api_key="test-key", base_url="http://127.0.0.1:9/v1")
+    for method in (coach.get_response, coach.stream_response):
+        try:
+            method("Hej")
+        except TypeError as e:
+            assert "await" in str(e) or "async for" in str(e)
+        else:
+            raise AssertionError("Synkront anrop borde ge TypeError")
+
+    print("✅ get_response and stream_response point to the async variants")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting AsyncAICoach Tests\n")
+
+    test_concurrent_sessions()
+    test_slow_stream_consumer_releases_semaphore()
+    test_idempotent_turns()
+    test_sync_entry_points_refused()
+
+    print("\n🎉 All AsyncAICoach tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
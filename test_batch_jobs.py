@@ -0,0 +1,244 @@
+"""
+Test script för batch-jobb
+Köar AI-förbättring av blogginlägg, skickar in dem som JSONL-batch mot den lokala
+stub-servern och verifierar att resultaten skrivs tillbaka till blog_posts, att
+två körare aldrig skickar in samma jobb, att redigerade inlägg inte skrivs över
+och att jobb som fastnat i 'submitting' efter en krasch stäms av
+"""
+
+import sys
+import os
+import json
+import tempfile
+import threading
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_TEST_DIR = tempfile.mkdtemp(prefix="batch_jobs_test_")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DIR, "batch_test.db")
+
+from utils.api_usage_tracker import usage_tracker
+from utils.batch_jobs import BatchJobRunner, write_batch_file
+from utils.data_manager import DataManager
+from utils.openai_stub_server import StubServer
+
+usage_tracker.usage_file = os.path.join(_TEST_DIR, "api_usage.json")
+
+def _runner(stub: StubServer) -> BatchJobRunner:
+    return BatchJobRunner(data_manager=DataManager(), api_key="test-key", base_url=stub.base_url,
+                          batch_dir=os.path.join(_TEST_DIR, "batches"))
+
+def _post(runner: BatchJobRunner, title: str) -> int:
+    return runner.data_manager.create_blog_post(title=title, content="Kort utkast om AI", category="ai-tips")
+
+def test_batch_file_format():
+    """Varje jobb blir en rad med custom_id, method, url och body"""
+    print("📄 Testing batch file format...")
+
+    path = os.path.join(_TEST_DIR, "format.jsonl")
+    write_batch_file([{"id": 7, "request_body": {"model": "gpt-3.5-turbo", "messages": []}}], path)
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+
+    assert lines == [{"custom_id": "job-7", "method": "POST", "url": "/v1/chat/completions",
+                      "body": {"model": "gpt-3.5-turbo", "messages": []}}]
+
+    print("✅ JSONL matches the Batch API input format")
+
+def test_enqueue_submit_and_ingest():
+    """Köade jobb skickas in, resultat skrivs till inläggen och misslyckade rader markeras"""
+    print("📦 Testing submit and ingest...")
+
+    usage_tracker.usage_history = []
+    with StubServer(reply="## Förbättrat inlägg") as stub:
+        runner = _runner(stub)
+        first = _post(runner, "Batchtest ett")
+        second = _post(runner, "Batchtest två")
+        runner.enqueue_blog_enhancement(first, "Kort utkast om AI", "Batchtest ett", "ai-tips", publish=True)
+        runner.enqueue_blog_enhancement(second, "Kort utkast om AI", "Batchtest två", "ai-tips")
+
+        stub.batch_delay_s = 60
+        batch_id = runner.submit_pending()
+        assert batch_id and runner.submit_pending() is None
+        assert runner.poll()["pending"] == 2
+
+        stub.batch_delay_s = 0
+        stub.script = [("ok",), ("status", 500)]
+        counts = runner.poll()
+        assert counts["completed"] == 1 and counts["failed"] == 1
+
+        posts = {p["id"]: p for p in runner.data_manager.get_blog_posts(published_only=False)}
+        assert posts[first]["content"] == "## Förbättrat inlägg"
+        assert posts[first]["published"]
+        assert posts[second]["content"] == "Kort utkast om AI"
+
+        failed = runner.data_manager.get_batch_jobs(status="failed")
+        assert [job["post_id"] for job in failed] == [second]
+
+        usage = usage_tracker.usage_history[-1]
+        assert usage.batch
+        full_price = usage_tracker.calculate_cost(usage.model, usage.prompt_tokens, usage.completion_tokens)
+        assert abs(usage.cost_usd - full_price * usage_tracker.batch_price_factor) < 1e-12
+
+    print(f"✅ Batch {batch_id}: one post enhanced and published, one failure recorded")
+
+def test_expired_batch_is_requeued():
+    """Jobb utan svar i en utgången batch läggs tillbaka i kön"""
+    print("⏳ Testing expired batch...")
+
+    with StubServer() as stub:
+        runner = _runner(stub)
+        post_id = _post(runner, "Batchtest utgången")
+        job_id = runner.enqueue_blog_enhancement(post_id, "Kort utkast om AI", "Batchtest utgången", "ai-tips")
+
+        stub.batch_delay_s = 60
+        batch_id = runner.submit_pending()
+        stub.batches[batch_id]["status"] = "expired"
+
+        assert runner.poll()["requeued"] == 1
+        assert job_id in [job["id"] for job in runner.data_manager.get_batch_jobs(status="queued")]
+
+    print("✅ Expired job requeued")
+
+def test_concurrent_submit_claims_each_job_once():
+    """Två körare som läser samma kö skickar in varje jobb i exakt en batch"""
+    print("🔒 Testing concurrent submit...")
+
+    with StubServer() as stub:
+        runners = [_runner(stub), _runner(stub)]
+        job_ids = [runners[0].enqueue_blog_enhancement(_post(runners[0], f"Batchtest samtidig {index}"),
+                                                       "Kort utkast om AI", "Batchtest", "ai-tips")
+                   for index in range(4)]
+        stub.batch_delay_s = 60
+
+        # Båda läser kön innan någon hunnit ta raderna
+        barrier = threading.Barrier(2)
+        for runner in runners:
+            read_queue = runner.data_manager.get_batch_jobs
+
+            def synced_read(*args, _read=read_queue, **kwargs):
+                jobs = _read(*args, **kwargs)
+                if kwargs.get("status") == "queued":
+                    barrier.wait(timeout=5)
+                return jobs
+            runner.data_manager.get_batch_jobs = synced_read
+
+        batch_ids = []
+        threads = [threading.Thread(target=lambda r=runner: batch_ids.append(r.submit_pending()))
+                   for runner in runners]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+
+        submitted = DataManager().get_batch_jobs(status="submitted")
+        mine = [job for job in submitted if job["id"] in job_ids]
+        assert len(mine) == 4
+        assert len([batch_id for batch_id in batch_ids if batch_id]) == 1
+        assert len(stub.batches) == 1
+
+    print("✅ Each job submitted once")
+
+def test_edited_post_goes_to_review():
+    """Ett inlägg som ändrats efter köningen skrivs inte över; resultatet väntar på granskning"""
+    print("✏️ Testing edited post...")
+
+    with StubServer(reply="## Sent AI-resultat") as stub:
+        runner = _runner(stub)
+        post_id = _post(runner, "Batchtest redigerad")
+        job_id = runner.enqueue_blog_enhancement(post_id, "Kort utkast om AI", "Batchtest redigerad", "ai-tips",
+                                                 publish=True)
+        runner.submit_pending()
+        runner.data_manager.update_blog_post(post_id, content="Adminens egen version")
+
+        assert runner.poll()["completed"] == 1
+        post = {p["id"]: p for p in runner.data_manager.get_blog_posts(published_only=False)}[post_id]
+        assert post["content"] == "Adminens egen version" and not post["published"]
+
+        review = [job for job in runner.get_review_jobs() if job["id"] == job_id]
+        assert len(review) == 1 and review[0]["result"] == "## Sent AI-resultat"
+
+        assert runner.apply_review(review[0])
+        post = {p["id"]: p for p in runner.data_manager.get_blog_posts(published_only=False)}[post_id]
+        assert post["content"] == "## Sent AI-resultat" and post["published"]
+        assert job_id not in [job["id"] for job in runner.get_review_jobs()]
+
+    print("✅ Edit kept, result applied only after review")
+
+def _job(runner: BatchJobRunner, job_id: int) -> dict:
+    return {job["id"]: job for job in runner.data_manager.get_batch_jobs()}[job_id]
+
+def test_crash_after_batch_created_is_reconciled():
+    """Batchen skapades men statusuppdateringen kom aldrig fram; avstämningen hittar den"""
+    print("🧯 Testing crash after the batch was created...")
+
+    with StubServer(reply="## Avstämt inlägg") as stub:
+        runner = _runner(stub)
+        post_id = _post(runner, "Batchtest avstämd")
+        job_id = runner.enqueue_blog_enhancement(post_id, "Kort utkast om AI", "Batchtest avstämd", "ai-tips")
+
+        # Uppdateringen till 'submitted' når inte databasen
+        resolve = runner.data_manager.resolve_batch_claim
+        runner.data_manager.resolve_batch_claim = (
+            lambda claim_id, status, batch_id=None: 0 if status == "submitted" else resolve(claim_id, status, batch_id)
+        )
+        try:
+            runner.submit_pending()
+            assert False, "submit_pending borde ha rest ett fel"
+        except RuntimeError as e:
+            assert "batch_stub_1" in str(e)
+        del runner.data_manager.resolve_batch_claim
+
+        stuck = _job(runner, job_id)
+        assert stuck["status"] == "submitting" and stuck["batch_id"].startswith("claim-")
+        assert stub.batches["batch_stub_1"]["metadata"] == {"claim_id": stuck["batch_id"]}
+
+        # En färsk claim kan fortfarande vara mitt i en inskickning och lämnas orörd
+        assert runner.recover_stale_claims() == {"reconciled": 0, "requeued": 0}
+
+        runner.claim_timeout_seconds = 0
+        assert runner.recover_stale_claims() == {"reconciled": 1, "requeued": 0}
+        assert _job(runner, job_id)["batch_id"] == "batch_stub_1"
+
+        runner.poll()
+        assert _job(runner, job_id)["status"] == "completed"
+        post = {p["id"]: p for p in runner.data_manager.get_blog_posts(published_only=False)}[post_id]
+        assert post["content"] == "## Avstämt inlägg"
+        assert len(stub.batches) == 1
+
+    print("✅ Stuck job reconciled with its batch and ingested without resubmitting")
+
+def test_crash_before_batch_created_is_requeued():
+    """Claim utan batch hos OpenAI läggs tillbaka i kön efter timeouten"""
+    print("🧯 Testing crash before the batch was created...")
+
+    with StubServer() as stub:
+        runner = _runner(stub)
+        job_id = runner.enqueue_blog_enhancement(_post(runner, "Batchtest kraschad"), "Kort utkast om AI",
+                                                 "Batchtest kraschad", "ai-tips")
+        assert runner.data_manager.claim_batch_jobs([job_id], "claim-dead")
+
+        runner.claim_timeout_seconds = 0
+        assert runner.recover_stale_claims() == {"reconciled": 0, "requeued": 1}
+        job = _job(runner, job_id)
+        assert job["status"] == "queued" and job["batch_id"] is None
+
+    print("✅ Claim without a batch requeued")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting Batch Jobs Tests\n")
+
+    test_batch_file_format()
+    test_enqueue_submit_and_ingest()
+    test_expired_batch_is_requeued()
+    test_concurrent_submit_claims_each_job_once()
+    test_edited_post_goes_to_review()
+    test_crash_after_batch_created_is_reconciled()
+    test_crash_before_batch_created_is_requeued()
+
+    print("\n🎉 All Batch Jobs tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,100 @@
+"""
+Test script för ContextPacker
+Verifierar att prompten håller sig inom token-budgeten och att utfallen historik
+samlas upp för den rullande sammanfattningen
+"""
+
+import sys
+import os
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.session_registry import Message
+from utils.context_packer import ContextPacker, MESSAGE_OVERHEAD_TOKENS
+
+def _history(count: int, tokens: int):
+    """Skapa fejkad historik med givet token-antal per meddelande"""
+    roles = ["user", "assistant"]
+    return [
+        Message(roles[i % 2], f"meddelande {i}", tokens)
+        for i in range(count)
+    ]
+
+def test_pack_fits_budget():
+    """Packad prompt får aldrig överskrida budgeten"""
+    print("📦 Testing budget packing...")
+    
+    packer = ContextPacker(budget_tokens=1000)
+    history = _history(100, 90)
+    packed = packer.pack("system", 50, history)
+    
+    assert packed.prompt_tokens <= 1000
+    assert packed.messages[-1]["content"] == "meddelande 99"
+    assert packed.first_included == 100 - packed.included_count
+    print(f"✅ Packed {packed.included_count} of {len(history)} messages into {packed.prompt_tokens} tokens")
+
+def test_short_history_is_kept_whole():
+    """Kort historik tas med i sin helhet och utan sammanfattning"""
+    print("📦 Testing short history...")
+    
+    packer = ContextPacker(budget_tokens=4000)
+    packed = packer.pack("system", 50, _history(4, 20), summary="gammalt", summary_tokens=5)
+    
+    assert packed.first_included == 0
+    assert len(packed.messages) == 5
+    assert packed.prompt_tokens == 50 + 4 * 20 + 5 * MESSAGE_OVERHEAD_TOKENS
+    print("✅ Short history kept without summary message")
+
+def test_summary_included_when_history_dropped():
+    """Sammanfattningen läggs in direkt efter system-prompten när historik fallit bort"""
+    print("📦 Testing rolling summary placement...")
+    
+    packer = ContextPacker(budget_tokens=500)
+    packed = packer.pack("system", 50, _history(40, 50), summary="Användaren vill lära sig AI", summary_tokens=10)
+    
+    assert packed.first_included > 0
+    assert packed.messages[1]["role"] == "system"
+    assert "Användaren vill lära sig AI" in packed.messages[1]["content"]
+    assert packed.prompt_tokens <= 500
+    print("✅ Summary placed after system prompt")
+
+def test_pending_for_summary_threshold():
+    """Sammanfattning triggas först när tillräckligt mycket fallit ur fönstret"""
+    print("📦 Testing summary trigger...")
+    
+    packer = ContextPacker(budget_tokens=500, summary_trigger_tokens=300)
+    history = _history(40, 50)
+    
+    assert packer.pending_for_summary(history, summarized_count=0, first_included=4) == []
+    pending = packer.pending_for_summary(history, summarized_count=0, first_included=10)
+    assert len(pending) == 10
+    print("✅ Summary only regenerated after threshold")
+
+def test_turn_context_after_stable_prefix():
+    """Frågespecifik kontext hamnar före sista meddelandet och prefixet är oförändrat"""
+    print("📦 Testing prefix-stable layout...")
+    
+    packer = ContextPacker(budget_tokens=4000)
+    history = _history(6, 20)
+    plain = packer.pack("persona", 50, history)
+    packed = packer.pack("persona", 50, history, turn_context="RAG-kontext", turn_context_tokens=30)
+    
+    assert packed.messages[:-2] == plain.messages[:-1]
+    assert packed.messages[-2] == {"role": "system", "content": "RAG-kontext"}
+    assert packed.messages[-1]["content"] == "meddelande 5"
+    assert packed.prompt_tokens == plain.prompt_tokens + 30 + MESSAGE_OVERHEAD_TOKENS
+    print("✅ Turn context placed after the stable prefix")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting Context Packer tests...\n")
+    test_pack_fits_budget()
+    test_short_history_is_kept_whole()
+    test_summary_included_when_history_dropped()
+    test_pending_for_summary_threshold()
+    test_turn_context_after_stable_prefix()
+    print("\n🎉 Context Packer tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
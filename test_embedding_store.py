@@ -0,0 +1,96 @@
+"""
+Test script för embedding-cachen
+Verifierar att dokumentembeddings sparas som en mmappad .npy-matris, att en ny
+process läser dem utan att embedda om och att bara ändrade dokument embeddas
+"""
+
+import sys
+import os
+import json
+import tempfile
+
+import numpy as np
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.embedding_store import EmbeddingStore
+from utils.embeddings import HashingEmbedder
+from utils.rag_system import AdvancedRAGSystem
+
+class _CountingEmbedder(HashingEmbedder):
+    """Hashing-embeddern som räknar hur många dokument som embeddas"""
+
+    def __init__(self):
+        super().__init__()
+        self.documents_encoded = 0
+
+    def encode(self, text):
+        if isinstance(text, (list, tuple)):
+            self.documents_encoded += len(text)
+        return super().encode(text)
+
+def test_reuses_unchanged_rows():
+    """Andra laddningen mmappar filen; en ändrad text embeddas om, inget annat"""
+    print("💾 Testing persisted embeddings...")
+
+    directory = tempfile.mkdtemp(prefix="embeddings_test_")
+    texts = [f"Dokument {index} om coaching och AI" for index in range(10)]
+    embedder = _CountingEmbedder()
+
+    first = EmbeddingStore(directory).load(embedder.model_id, texts, embedder.encode)
+    assert embedder.documents_encoded == 10
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0, atol=1e-5)
+
+    store = EmbeddingStore(directory)
+    second = store.load(embedder.model_id, texts, embedder.encode)
+    assert isinstance(second, np.memmap) and embedder.documents_encoded == 10
+    assert store.last_load["reused"] == 10 and store.last_load["encoded"] == 0
+    assert np.array_equal(first, second)
+
+    texts[3] = "Ett helt nytt dokument om ledarskap"
+    texts.append("Ytterligare ett dokument om karriär")
+    third = store.load(embedder.model_id, texts, embedder.encode)
+    assert embedder.documents_encoded == 12
+    assert np.array_equal(third[0], first[0])
+    expected = embedder.encode(texts[3])
+    assert np.allclose(third[3], expected / np.linalg.norm(expected), atol=1e-6)
+
+    # Bara senaste matrisen ligger kvar och manifestet pekar på den
+    with open(store._manifest_path(embedder.model_id), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert [name for name in os.listdir(directory) if name.endswith(".npy")] == [manifest["file"]]
+
+    print("✅ Unchanged rows read from disk, 2 of 11 documents re-embedded")
+
+def test_rag_cold_start_uses_cache():
+    """En andra AdvancedRAGSystem (ny process) embeddar inga dokument"""
+    print("🚀 Testing RAG cold start...")
+
+    directory = tempfile.mkdtemp(prefix="embeddings_rag_")
+    first_embedder = _CountingEmbedder()
+    first = AdvancedRAGSystem(embedding_model=first_embedder, embedding_store=EmbeddingStore(directory))
+    assert first_embedder.documents_encoded == len(first.knowledge_docs)
+
+    second_embedder = _CountingEmbedder()
+    second = AdvancedRAGSystem(embedding_model=second_embedder, embedding_store=EmbeddingStore(directory))
+    assert second_embedder.documents_encoded == 0
+    assert isinstance(second.doc_matrix, np.memmap)
+
+    query = "Hur kommer jag igång med machine learning?"
+    assert ([ctx.title for ctx in second.retrieve_relevant_context(query)]
+            == [ctx.title for ctx in first.retrieve_relevant_context(query)])
+
+    print(f"✅ {len(second.knowledge_docs)} document embeddings loaded without encoding")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting Embedding Store Tests\n")
+
+    test_reuses_unchanged_rows()
+    test_rag_cold_start_uses_cache()
+
+    print("\n🎉 All Embedding Store tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
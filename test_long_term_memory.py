@@ -0,0 +1,146 @@
+"""
+Test script för långtidsminnet
+Verifierar lagring som float16-blobbar, hämtning inom token-budget och att fakta
+från en avslutad session finns med i nästa sessions prompt (mot stub-servern) och
+att svar på prompter med personliga minnen aldrig delas via den semantiska cachen
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_TEST_DIR = tempfile.mkdtemp(prefix="memory_test_")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DIR, "memory_sessions.db")
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+
+from utils.api_usage_tracker import usage_tracker
+from utils.long_term_memory import LongTermMemory, parse_extraction
+from utils.openai_stub_server import StubServer
+from utils.semantic_cache import SemanticResponseCache
+
+usage_tracker.usage_file = os.path.join(_TEST_DIR, "api_usage.json")
+
+def _memory(name: str, **kwargs) -> LongTermMemory:
+    return LongTermMemory(db_path=os.path.join(_TEST_DIR, f"{name}.db"), enabled=True, **kwargs)
+
+def test_parse_extraction():
+    """Sammanfattningsraden och punktlistan blir (typ, text)-par"""
+    print("📝 Testing extraction parsing...")
+
+    items = parse_extraction("SAMMANFATTNING: Vill byta karriär till data science.\n"
+                             "- Arbetar som lärare\n\n• Föredrar korta övningar\nÖvrigt")
+    assert items == [("summary", "Vill byta karriär till data science."),
+                     ("fact", "Arbetar som lärare"), ("fact", "Föredrar korta övningar")]
+
+    print("✅ Summary and facts parsed")
+
+def test_store_and_recall():
+    """Minnen lagras som float16, dubbletter hoppas över och hämtning håller budgeten"""
+    print("🧠 Testing store and recall...")
+
+    memory = _memory("store", budget_tokens=40, min_similarity=0.1)
+    added = memory.add("anna", "s1", [
+        ("fact", "Anna arbetar som gymnasielärare i matematik"),
+        ("fact", "Anna arbetar som gymnasielärare i matematik"),
+        ("fact", "Anna vill lära sig Python för dataanalys"),
+        ("summary", "Pratade om att planera studietid på kvällarna")
+    ])
+    assert added == 3
+
+    with sqlite3.connect(memory.db_path) as conn:
+        blob, = conn.execute("SELECT embedding FROM memories LIMIT 1").fetchone()
+    assert len(blob) == 512 * 2
+
+    text, tokens = memory.recall("anna", "Hur kommer jag igång med Python?")
+    assert "Python" in text.splitlines()[1]
+    assert 0 < tokens <= 40
+
+    assert memory.recall("bertil", "Hur kommer jag igång med Python?") == ("", 0)
+    assert memory.recall("anna", "Python", exclude_session_id="s1") == ("", 0)
+
+    print(f"✅ {added} memories stored, {tokens} tokens recalled")
+
+def test_memories_carry_over_between_sessions():
+    """Fakta från end_session hamnar i nästa sessions prompt för samma användare"""
+    print("🔗 Testing continuity across sessions...")
+
+    from core.ai_coach import AICoach, CoachingMode
+
+    extraction = ("SAMMANFATTNING: Användaren planerar en kurs i maskininlärning.\n"
+                  "- Användaren undervisar i biologi på universitetet")
+    with StubServer(reply=extraction) as stub:
+        coach = AICoach(api_key="test-key", base_url=stub.base_url)
+        coach.response_cache = None
+        coach.semantic_cache = None
+        coach.memory = _memory("coach", min_similarity=0.0)
+
+        first = coach.start_session("memory_user", CoachingMode.PERSONAL)
+        coach.get_response("Jag undervisar i biologi", session_id=first)
+        coach.get_response("Hur lägger jag upp en kurs i maskininlärning?", session_id=first)
+        summary = coach.end_session(first)
+        assert summary["memories_scheduled"]
+        assert coach.wait_for_memories(timeout=10)
+        assert coach.memory.get_stats()["stored"] == 2
+
+        second = coach.start_session("memory_user", CoachingMode.PERSONAL)
+        _, metadata = coach.get_response("Vilken kurs ska jag börja med?", session_id=second)
+        prompt = "\n".join(message["content"] for message in stub.last_request["messages"])
+        assert "undervisar i biologi på universitetet" in prompt
+        assert metadata["memory_tokens"] > 0
+
+        coach.sessions.remove(second)
+
+    print("✅ Facts from the first session reached the second session's prompt")
+
+def test_semantic_cache_not_shared_across_memories():
+    """Två användare med olika minnen får aldrig varandras svar från den semantiska cachen"""
+    print("🔒 Testing semantic cache with memories...")
+
+    from core.ai_coach import AICoach, CoachingMode
+
+    with StubServer(reply="Börja med tio minuter om dagen.") as stub:
+        coach = AICoach(api_key="test-key", base_url=stub.base_url)
+        coach.response_cache = None
+        coach.semantic_cache = SemanticResponseCache(threshold=0.9)
+        coach.memory = _memory("semantic", min_similarity=0.0)
+        coach.memory.add("semantic_anna", "old_anna", [("fact", "Anna är lärare och vill lära sig Python")])
+        coach.memory.add("semantic_bertil", "old_bertil", [("fact", "Bertil är pensionär och vill börja springa")])
+
+        def first_turn(user_id: str) -> dict:
+            session_id = coach.start_session(user_id, CoachingMode.PERSONAL)
+            _, metadata = coach.get_response("Hur kommer jag igång?", session_id=session_id)
+            coach.sessions.remove(session_id)
+            return metadata
+
+        for user_id in ("semantic_anna", "semantic_bertil"):
+            metadata = first_turn(user_id)
+            assert metadata["memory_tokens"] > 0
+            assert metadata["cache_source"] is None
+        assert stub.requests == 2
+        assert coach.semantic_cache.get_stats()["entries"] == 0
+
+        # Utan minnen delas svaret som tidigare
+        assert first_turn("semantic_cecilia")["cache_source"] is None
+        assert first_turn("semantic_david")["cache_source"] == "semantic"
+        assert stub.requests == 3
+
+    print("✅ Personalised answers stayed out of the shared semantic cache")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting Long-Term Memory Tests\n")
+
+    test_parse_extraction()
+    test_store_and_recall()
+    test_memories_carry_over_between_sessions()
+    test_semantic_cache_not_shared_across_memories()
+
+    print("\n🎉 All Long-Term Memory tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,202 @@
+"""
+Test script för ModelRouter
+Verifierar routingpolicyn (expertisnivå, läge, budget), prisuppslag per modell och
+reservkedjan mot den lokala stub-servern (delad deadline, ingen reserv vid öppen
+breaker och cache-nyckel för modellen som svarade)
+"""
+
+import sys
+import os
+import json
+import tempfile
+import time
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_TEST_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DIR, "router_sessions.db")
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+
+from utils.api_usage_tracker import usage_tracker
+from utils.model_router import ModelRouter
+from utils.openai_stub_server import StubServer
+
+TIERS = {"economy": "gpt-4o-mini", "standard": "gpt-4.1-mini", "premium": "gpt-4o"}
+
+def _router(log_path: str = "", budget: float = 0) -> ModelRouter:
+    return ModelRouter(enabled=True, tier_models=TIERS, daily_budget_usd=budget, log_path=log_path)
+
+def test_policy():
+    """Expertisnivå väljer nivå, universitetsläget har en lägsta nivå"""
+    print("🧭 Testing routing policy...")
+
+    router = _router()
+    assert router.route("basic", "personal", "gpt-3.5-turbo").models == ["gpt-4o-mini", "gpt-3.5-turbo"]
+    assert router.route("intermediate", "hybrid", "gpt-3.5-turbo").model == "gpt-4.1-mini"
+    assert router.route("expert", "personal", "gpt-3.5-turbo").models == [
+        "gpt-4o", "gpt-4.1-mini", "gpt-4o-mini", "gpt-3.5-turbo"
+    ]
+    assert router.route("basic", "university", "gpt-3.5-turbo").tier == "standard"
+
+    disabled = ModelRouter(enabled=False, tier_models=TIERS)
+    assert disabled.route("expert", "personal", "gpt-3.5-turbo").models == ["gpt-3.5-turbo"]
+
+    print("✅ Levels, modes and disabled router route as expected")
+
+def test_budget_downgrade():
+    """Nära budget sänks nivån ett steg, förbrukad budget ger ekonominivån"""
+    print("💰 Testing budget state...")
+
+    router = _router(budget=1.0)
+    router.budget_check_seconds = 3600
+    router._spent_checked_at = time.monotonic()
+
+    router._spent_today = 0.85
+    decision = router.route("expert", "personal", "gpt-3.5-turbo")
+    assert decision.budget_state == "tight" and decision.tier == "standard"
+
+    router._spent_today = 1.2
+    assert router.route("expert", "personal", "gpt-3.5-turbo").tier == "economy"
+
+    print("✅ Tier downgraded under budget pressure")
+
+def test_pricing_per_model():
+    """Versionsnamn prissätts som sin modellfamilj"""
+    print("🏷️ Testing per-model pricing...")
+
+    assert usage_tracker.prices_for("gpt-4o-mini-2024-07-18") == usage_tracker.pricing["gpt-4o-mini"]
+    assert usage_tracker.prices_for("gpt-4o-2024-08-06") == usage_tracker.pricing["gpt-4o"]
+    assert usage_tracker.prices_for("okänd-modell") == usage_tracker.pricing["gpt-3.5-turbo"]
+    assert usage_tracker.calculate_cost("gpt-4o", 1000, 1000) > usage_tracker.calculate_cost("gpt-4o-mini", 1000, 1000)
+
+    print("✅ Prices resolved by longest model prefix")
+
+def test_fallback_against_stub():
+    """En modell som saknas (404) ger nästa modell i kedjan och loggas"""
+    print("🔁 Testing fallback chain...")
+
+    from core.ai_coach import AICoach, CoachingMode
+
+    usage_tracker.usage_file = os.path.join(tempfile.mkdtemp(), "api_usage.json")
+    usage_tracker.usage_history = []
+    log_path = os.path.join(tempfile.mkdtemp(), "model_routing.jsonl")
+
+    with StubServer(reply="Hej från stubben") as stub:
+        coach = AICoach(api_key="test-key", base_url=stub.base_url)
+        coach.response_cache = None
+        coach.semantic_cache = None
+        coach.router = _router(log_path)
+        session_id = coach.start_session("router_user", CoachingMode.PERSONAL)
+
+        stub.script = [("status", 404)]
+        response, metadata = coach.get_response("Vad är AI?", session_id=session_id)
+        assert response.startswith("Hej från stubben")
+        assert metadata["model"] == "gpt-3.5-turbo"
+        assert metadata["model_tier"] == "economy"
+        assert usage_tracker.usage_history[-1].model == "gpt-3.5-turbo"
+
+        coach.sessions.remove(session_id)
+
+    with open(log_path, encoding="utf-8") as f:
+        entry = json.loads(f.readline())
+    assert entry["model_requested"] == "gpt-4o-mini"
+    assert entry["fallbacks"] == ["gpt-4o-mini"]
+    assert entry["cost_usd"] > 0
+    assert coach.router.get_stats()["by_model"]["gpt-3.5-turbo"]["fallbacks"] == 1
+
+    print("✅ Fell back from gpt-4o-mini to gpt-3.5-turbo and logged the outcome")
+
+class _RecordingCaller:
+    """Släpper igenom anropen och sparar deadline per anrop"""
+
+    def __init__(self, caller):
+        self.caller = caller
+        self.deadlines = []
+
+    def call(self, fn, deadline=None, **kwargs):
+        self.deadlines.append(deadline)
+        return self.caller.call(fn, deadline=deadline, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.caller, name)
+
+def test_fallback_shares_deadline_and_caches_answering_model():
+    """Reservmodellen får turens återstående tid och svaret cachas under dess nyckel"""
+    print("⏱️ Testing fallback deadline and cache key...")
+
+    from core.ai_coach import AICoach, CoachingMode
+    from utils.resilient_client import ResilientCaller
+
+    with StubServer(reply="Hej från reserven") as stub:
+        coach = AICoach(api_key="test-key", base_url=stub.base_url)
+        coach.semantic_cache = None
+        coach.router = _router()
+        coach.caller = _RecordingCaller(ResilientCaller(deadline_seconds=5, max_retries=0, hedge=False))
+        stored = []
+        put = coach.response_cache.put
+        coach.response_cache.put = lambda key, response, mode=None, model=None: (
+            stored.append((key, model)), put(key, response, mode, model)
+        )
+        session_id = coach.start_session("router_cache_user", CoachingMode.PERSONAL)
+
+        stub.script = [("status", 404)]
+        _, metadata = coach.get_response("Vad är AI?", session_id=session_id)
+        assert metadata["model"] == "gpt-3.5-turbo"
+
+        assert len(coach.caller.deadlines) == 2
+        assert coach.caller.deadlines[0] is not None
+        assert coach.caller.deadlines[0] == coach.caller.deadlines[1]
+
+        sent = stub.last_request
+        assert stored == [(coach.response_cache.make_key("personal", sent["messages"], "gpt-3.5-turbo",
+                                                         sent["temperature"]), "gpt-3.5-turbo")]
+        assert coach.response_cache.get(coach.response_cache.make_key(
+            "personal", sent["messages"], "gpt-4o-mini", sent["temperature"]
+        )) is None
+        coach.sessions.remove(session_id)
+
+    print("✅ One deadline for the chain, cache entry keyed on gpt-3.5-turbo")
+
+def test_open_breaker_does_not_fall_back():
+    """En öppen breaker gäller hela upstream - ingen modell i kedjan prövas"""
+    print("🚧 Testing open breaker...")
+
+    from core.ai_coach import AICoach, CoachingMode
+    from utils.resilient_client import CircuitBreaker, ResilientCaller
+
+    with StubServer() as stub:
+        coach = AICoach(api_key="test-key", base_url=stub.base_url)
+        coach.response_cache = None
+        coach.semantic_cache = None
+        coach.router = _router()
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+        breaker.record_failure()
+        coach.caller = _RecordingCaller(ResilientCaller(deadline_seconds=5, max_retries=0, hedge=False,
+                                                        breaker=breaker))
+        session_id = coach.start_session("router_breaker_user", CoachingMode.PERSONAL)
+
+        _, metadata = coach.get_response("Vad är AI?", session_id=session_id)
+        assert "error" in metadata
+        assert len(coach.caller.deadlines) == 1
+        assert stub.requests == 0
+        coach.sessions.remove(session_id)
+
+    print("✅ Breaker open: one attempt, no fallback")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting ModelRouter Tests\n")
+
+    test_policy()
+    test_budget_downgrade()
+    test_pricing_per_model()
+    test_fallback_against_stub()
+    test_fallback_shares_deadline_and_caches_answering_model()
+    test_open_breaker_does_not_fall_back()
+
+    print("\n🎉 All ModelRouter tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
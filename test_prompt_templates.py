@@ -0,0 +1,88 @@
+"""
+Test script för förkompilerade expertismallar
+Verifierar att alla (nivå × mode)-mallar byggs en gång utan indentering, att
+token-antalet stämmer och att besparingen rapporteras per tur
+"""
+
+import sys
+import os
+import tempfile
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_TEST_DIR = tempfile.mkdtemp(prefix="templates_test_")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DIR, "templates_sessions.db")
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+
+from utils.ai_expert_integration import (
+    AIExpertIntegration, AIExpertiseLevel, LEVEL_ADDONS, MODE_ADDONS, compile_expertise_templates
+)
+from utils.api_usage_tracker import usage_tracker
+from utils.openai_stub_server import StubServer
+from utils.token_counter import count_tokens
+
+usage_tracker.usage_file = os.path.join(_TEST_DIR, "api_usage.json")
+
+def test_templates_compiled_once():
+    """Alla kombinationer finns, saknar indentering och bär sitt token-antal"""
+    print("🧩 Testing template compilation...")
+
+    templates = compile_expertise_templates()
+    assert len(templates) == len(LEVEL_ADDONS) * (len(MODE_ADDONS) + 1)
+
+    for template in templates.values():
+        assert not any(line != line.strip() for line in template.turn_block.splitlines())
+        assert template.tokens == count_tokens(template.turn_block)
+        assert template.tokens_saved > 0
+
+    integration = AIExpertIntegration()
+    first = integration.get_template(AIExpertiseLevel.BASIC, "personal")
+    assert integration.get_template(AIExpertiseLevel.BASIC, "personal") is first
+    # Lägen utan eget tillägg delar mallen utan mode-del
+    assert (integration.get_template(AIExpertiseLevel.BASIC, "hybrid")
+            is integration.get_template(AIExpertiseLevel.BASIC, "other"))
+
+    print(f"✅ {len(templates)} templates, {first.tokens_saved} tokens saved for basic/personal")
+
+def test_turn_context_reports_savings():
+    """Turkontexten får mallens token-antal och besparingen hamnar i metadata"""
+    print("💸 Testing per-turn savings...")
+
+    integration = AIExpertIntegration()
+    built = integration.build_turn_context("Vad är machine learning?", "personal")
+    assert built.text.startswith("## AI-Expertis för denna fråga")
+    assert abs(built.tokens - count_tokens(built.text)) <= 2
+    assert built.template_tokens_saved > 0
+    assert integration.get_template_stats()["template_turns"] == 1
+
+    assert integration.build_turn_context("Hej, hur mår du?", "personal").template_tokens_saved == 0
+
+    from core.ai_coach import AICoach, CoachingMode
+
+    with StubServer(reply="Börja med grunderna i Python.") as stub:
+        coach = AICoach(api_key="test-key", base_url=stub.base_url)
+        coach.response_cache = None
+        coach.semantic_cache = None
+        coach.memory = None
+
+        session_id = coach.start_session("templates_user", CoachingMode.PERSONAL)
+        _, metadata = coach.get_response("Vad är machine learning?", session_id=session_id)
+        assert metadata["template_tokens_saved"] > 0
+        assert coach.get_session_summary(session_id)["template_tokens_saved"] == metadata["template_tokens_saved"]
+        coach.sessions.remove(session_id)
+
+    print(f"✅ {metadata['template_tokens_saved']} tokens saved on an AI question")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting Prompt Template Tests\n")
+
+    test_templates_compiled_once()
+    test_turn_context_reports_savings()
+
+    print("\n🎉 All Prompt Template tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,143 @@
+"""
+Test script för RAG-systemets inverterade index
+Verifierar att indexerad hämtning ger samma resultat som genomgång av alla
+dokument och att bara dokument som delar termer med frågan poängsätts, samt
+att den semantiska sökningen embeddar frågan en gång och poängsätter med en
+matris-vektorprodukt
+"""
+
+import sys
+import os
+import tempfile
+import time
+
+import numpy as np
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.embedding_store import EmbeddingStore
+from utils.embeddings import HashingEmbedder
+from utils.rag_system import AdvancedRAGSystem, SimpleRAGSystem
+
+QUERIES = [
+    "Vad är machine learning och hur kommer jag igång?",
+    "Hur bygger vi en business case för AI transformation?",
+    "transformer attention mechanism",
+    "GDPR och bias i AI-modeller",
+    "Hur använder universitet learning analytics?",
+    "Hej, vad heter du?"
+]
+
+def _brute_force(rag: SimpleRAGSystem, query: str, top_k: int = 3):
+    """Den tidigare genomgången av alla dokument, som referens"""
+    if not rag.is_ai_related_query(query):
+        return []
+    scored = []
+    for doc in rag.knowledge_docs:
+        score = (rag.simple_text_similarity(query, doc['content'])
+                 + rag.simple_text_similarity(query, doc['title']) * 2
+                 + sum(0.3 for keyword in doc['keywords'] if keyword.lower() in query.lower()))
+        if score > 0.1:
+            scored.append((doc['title'], score))
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored[:top_k]
+
+def _synthetic_docs(count: int):
+    return [
+        {
+            "title": f"Dokument {index}: ämne{index % 500}",
+            "content": f"Text ämne{index % 500} område{index % 97} detalj{index}",
+            "keywords": [f"nyckel{index % 1000}"],
+            "category": "syntet",
+            "coaching_context": ""
+        }
+        for index in range(count)
+    ]
+
+def test_index_matches_brute_force():
+    """Indexet ger samma dokument och score som att gå igenom alla dokument"""
+    print("🔍 Testing index against brute force...")
+
+    rag = SimpleRAGSystem(scorer="jaccard")
+    for query in QUERIES:
+        indexed = [(ctx.title, ctx.relevance_score) for ctx in rag.retrieve_relevant_context(query)]
+        expected = _brute_force(rag, query)
+        assert [title for title, _ in indexed] == [title for title, _ in expected], query
+        assert all(abs(a[1] - b[1]) < 1e-9 for a, b in zip(indexed, expected))
+
+    print(f"✅ {len(QUERIES)} queries identical over {len(rag.knowledge_docs)} documents")
+
+def test_scoring_touches_only_matching_docs():
+    """Med tiotusentals dokument poängsätts bara de som delar termer med frågan"""
+    print("📈 Testing scaling...")
+
+    rag = SimpleRAGSystem(_synthetic_docs(20000), scorer="jaccard")
+    query = "Hur fungerar AI för ämne7 enligt nyckel42?"
+
+    scored = rag._score_documents(query, 0.3)
+    assert 0 < len(scored) <= 100
+    assert "nyckel42" in rag._matching_keywords(query.lower())
+
+    started = time.perf_counter()
+    results = rag.retrieve_relevant_context(query)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    assert results
+    assert [ctx.title for ctx in results] == [title for title, _ in _brute_force(rag, query)]
+
+    print(f"✅ {len(scored)} of {len(rag.knowledge_docs)} documents scored in {elapsed_ms:.1f} ms")
+
+class _CountingEmbedder(HashingEmbedder):
+    """Hashing-embeddern som räknar anrop för enstaka frågor"""
+
+    def __init__(self):
+        super().__init__()
+        self.query_calls = 0
+
+    def encode(self, text):
+        if isinstance(text, str):
+            self.query_calls += 1
+        return super().encode(text)
+
+def test_semantic_search_is_one_matrix_product():
+    """Frågan embeddas en gång och resultatet matchar den tidigare loopen per dokument"""
+    print("🧮 Testing vectorized semantic search...")
+
+    embedder = _CountingEmbedder()
+    rag = AdvancedRAGSystem(embedding_model=embedder, embedding_store=EmbeddingStore(tempfile.mkdtemp()))
+    assert rag.doc_matrix.flags["C_CONTIGUOUS"] and rag.doc_matrix.dtype == np.float32
+    assert np.allclose(np.linalg.norm(rag.doc_matrix, axis=1), 1.0, atol=1e-5)
+
+    for query in QUERIES[:5]:
+        embedder.query_calls = 0
+        results = rag.retrieve_relevant_context(query)
+        assert embedder.query_calls == 1
+
+        # Den tidigare metoden: cosinus och keyword-bonus per dokument
+        query_vector = embedder.encode(query)
+        expected = []
+        for doc in rag.knowledge_docs:
+            doc_vector = embedder.encode(f"{doc['title']}: {doc['content']}")
+            score = float(np.dot(query_vector, doc_vector) / (np.linalg.norm(query_vector) * np.linalg.norm(doc_vector)))
+            score += sum(0.2 for keyword in doc['keywords'] if keyword.lower() in query.lower())
+            if score > 0.3:
+                expected.append((doc['title'], score))
+        expected.sort(key=lambda x: x[1], reverse=True)
+
+        assert [ctx.title for ctx in results] == [title for title, _ in expected[:3]], query
+        assert all(abs(ctx.relevance_score - score) < 1e-4 for ctx, (_, score) in zip(results, expected))
+
+    print(f"✅ {len(rag.knowledge_docs)} documents scored with one query embedding per question")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting RAG Index Tests\n")
+
+    test_index_matches_brute_force()
+    test_scoring_touches_only_matching_docs()
+    test_semantic_search_is_one_matrix_product()
+
+    print("\n🎉 All RAG Index tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
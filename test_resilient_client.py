@@ -0,0 +1,243 @@
+"""
+Test script för ResilientCaller
+Kör riktiga OpenAI-klientanrop mot den lokala stub-servern som injicerar 429/500,
+långsamma svar och avbrott
+"""
+
+import sys
+import os
+import tempfile
+import time
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Sätts före projektimporterna - Config läses när modulerna importeras
+_TEST_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DIR, "resilient_sessions.db")
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+
+import openai
+
+from utils.openai_stub_server import StubServer
+from utils.resilient_client import (CircuitBreaker, DeadlineExceededError, ResilientCaller,
+                                    UpstreamUnavailableError)
+
+def _client(stub: StubServer) -> openai.OpenAI:
+    return openai.OpenAI(api_key="test-key", base_url=stub.base_url, max_retries=0)
+
+def _create(client):
+    return lambda **kwargs: client.chat.completions.create(
+        model="gpt-3.5-turbo", messages=[{"role": "user", "content": "Hej"}], **kwargs
+    )
+
+def test_retries_on_429_and_500():
+    """429 och 5xx försöks igen med backoff tills anropet lyckas"""
+    print("🔁 Testing retries...")
+
+    upstream = StubServer(reply="Hej från stubben").start()
+    try:
+        upstream.script = [("status", 429), ("status", 500)]
+        caller = ResilientCaller(deadline_seconds=5, max_retries=3, backoff_base_seconds=0.01,
+                                 backoff_max_seconds=0.05, hedge=False)
+        response = caller.call(_create(_client(upstream)))
+
+        assert response.choices[0].message.content == "Hej från stubben"
+        assert upstream.requests == 3
+        stats = caller.get_stats()
+        assert stats['outcomes']['rate_limited'] == 1
+        assert stats['outcomes']['server_error'] == 1
+        assert stats['outcomes']['retry'] == 2
+        assert stats['outcomes']['success'] == 1
+    finally:
+        upstream.stop()
+
+    print("✅ Recovered after 429 and 500")
+
+def test_client_errors_are_not_retried():
+    """400 kastas direkt utan nya försök"""
+    print("🚫 Testing client errors...")
+
+    upstream = StubServer(reply="Hej från stubben").start()
+    try:
+        upstream.script = [("status", 400)]
+        caller = ResilientCaller(deadline_seconds=5, max_retries=3, hedge=False)
+        try:
+            caller.call(_create(_client(upstream)))
+            assert False, "BadRequestError förväntades"
+        except openai.BadRequestError:
+            pass
+        assert upstream.requests == 1
+    finally:
+        upstream.stop()
+
+    print("✅ 400 raised without retry")
+
+def test_deadline():
+    """Ett långsamt upstream ger fel inom deadline istället för klientens standard-timeout"""
+    print("⏱️ Testing deadline...")
+
+    upstream = StubServer(reply="Hej från stubben").start()
+    try:
+        upstream.script = [("delay", 2), ("delay", 2), ("delay", 2)]
+        caller = ResilientCaller(deadline_seconds=0.5, max_retries=2, backoff_base_seconds=0.01,
+                                 backoff_max_seconds=0.01, hedge=False)
+        started = time.monotonic()
+        try:
+            caller.call(_create(_client(upstream)))
+            assert False, "Timeout förväntades"
+        except (openai.APITimeoutError, DeadlineExceededError):
+            pass
+        elapsed = time.monotonic() - started
+        assert elapsed < 1.5, f"Deadline respekterades inte ({elapsed:.2f}s)"
+    finally:
+        upstream.stop()
+
+    print(f"✅ Gave up after {elapsed:.2f}s")
+
+def test_circuit_breaker_fails_fast():
+    """Efter N fel i rad svarar breakern direkt och släpper sedan igenom ett provanrop"""
+    print("🔌 Testing circuit breaker...")
+
+    upstream = StubServer(reply="Hej från stubben").start()
+    try:
+        upstream.script = [("status", 503)] * 3
+        breaker = CircuitBreaker(failure_threshold=3, reset_seconds=0.2)
+        caller = ResilientCaller(deadline_seconds=5, max_retries=0, hedge=False, breaker=breaker)
+        client = _client(upstream)
+
+        for _ in range(3):
+            try:
+                caller.call(_create(client))
+            except openai.InternalServerError:
+                pass
+        assert breaker.state == CircuitBreaker.OPEN
+
+        try:
+            caller.call(_create(client))
+            assert False, "UpstreamUnavailableError förväntades"
+        except UpstreamUnavailableError:
+            pass
+        assert upstream.requests == 3
+
+        time.sleep(0.25)
+        caller.call(_create(client))
+        assert breaker.state == CircuitBreaker.CLOSED
+    finally:
+        upstream.stop()
+
+    print("✅ Breaker opened, failed fast and recovered")
+
+def test_local_errors_leave_breaker_alone():
+    """Lokala fel räknas varken som lyckade eller misslyckade anrop; 4xx stänger breakern"""
+    print("🧯 Testing local errors and the breaker...")
+
+    upstream = StubServer(reply="Hej från stubben").start()
+    try:
+        upstream.script = [("status", 503), ("status", 503), ("status", 400)]
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.1)
+        caller = ResilientCaller(deadline_seconds=5, max_retries=0, hedge=False, breaker=breaker)
+        client = _client(upstream)
+
+        for _ in range(2):
+            try:
+                caller.call(_create(client))
+            except openai.InternalServerError:
+                pass
+        assert breaker.state == CircuitBreaker.OPEN
+
+        def broken(**kwargs):
+            raise TypeError("programmeringsfel före anropet")
+
+        time.sleep(0.15)
+        try:
+            caller.call(broken)
+            assert False, "TypeError förväntades"
+        except TypeError:
+            pass
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.consecutive_failures == 2
+
+        # Provanropet släpptes - nästa anrop får pröva upstream, och ett 400 visar att det svarar
+        try:
+            caller.call(_create(client))
+            assert False, "BadRequestError förväntades"
+        except openai.BadRequestError:
+            pass
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert upstream.requests == 3
+    finally:
+        upstream.stop()
+
+    print("✅ TypeError kept the breaker half-open, 400 closed it")
+
+def test_hedged_request_wins():
+    """Ett dubblettanrop skickas efter p95 och det snabbaste svaret vinner"""
+    print("🏁 Testing hedging...")
+
+    upstream = StubServer(reply="Hej från stubben").start()
+    try:
+        caller = ResilientCaller(deadline_seconds=5, max_retries=0, hedge=True, hedge_min_samples=5)
+        client = _client(upstream)
+        for _ in range(5):
+            caller.call(_create(client))
+
+        upstream.script = [("delay", 1.5), ("ok",)]
+        started = time.monotonic()
+        response = caller.call(_create(client))
+        elapsed = time.monotonic() - started
+
+        assert response.choices[0].message.content == "Hej från stubben"
+        assert caller.get_stats()['outcomes']['hedge_won'] == 1
+        assert elapsed < 1.0
+    finally:
+        upstream.stop()
+
+    print(f"✅ Hedge answered in {elapsed:.2f}s")
+
+def test_coach_end_to_end_against_stub():
+    """AICoach svarar och strömmar via stubben utan API-nyckel"""
+    print("🧪 Testing AICoach against the stub server...")
+
+    from core.ai_coach import AICoach, CoachingMode
+    from utils.api_usage_tracker import usage_tracker
+
+    usage_tracker.usage_file = os.path.join(tempfile.mkdtemp(), "api_usage.json")
+    usage_tracker.usage_history = []
+
+    with StubServer(reply="Hej från stubben", latency_ms=5) as stub:
+        coach = AICoach(api_key="test-key", base_url=stub.base_url)
+        coach.response_cache = None
+        coach.semantic_cache = None
+        session_id = coach.start_session("stub_user", CoachingMode.PERSONAL)
+
+        response, metadata = coach.get_response("Jag vill bli bättre på att planera", session_id=session_id)
+        assert response.startswith("Hej från stubben")
+        assert metadata["tokens_used"] > 0
+
+        streamed = "".join(coach.stream_response("Och sen då?", session_id=session_id))
+        assert streamed.startswith("Hej från stubben")
+        assert coach.get_last_response_metadata(session_id)["tokens_used"] > 0
+        assert len(usage_tracker.usage_history) == 2
+
+        coach.sessions.remove(session_id)
+
+    print("✅ get_response and stream_response work against the stub")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting ResilientCaller Tests\n")
+
+    test_retries_on_429_and_500()
+    test_client_errors_are_not_retried()
+    test_deadline()
+    test_circuit_breaker_fails_fast()
+    test_local_errors_leave_breaker_alone()
+    test_hedged_request_wins()
+    test_coach_end_to_end_against_stub()
+
+    print("\n🎉 All ResilientCaller tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,120 @@
+"""
+Test script för svarscachen
+Testar nyckelbygge, TTL och LRU-utrensning mot en temporär SQLite-fil
+"""
+
+import sys
+import os
+import tempfile
+import time
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.response_cache import ResponseCache
+from utils.semantic_cache import SemanticResponseCache
+
+def _make_cache(**kwargs) -> ResponseCache:
+    """Skapa cache i en temporär katalog"""
+    db_path = os.path.join(tempfile.mkdtemp(), "cache.db")
+    return ResponseCache(db_path=db_path, **kwargs)
+
+def test_key_normalization():
+    """Nyckeln ska ignorera skillnader i blanksteg men inte i läge eller modell"""
+    print("🔑 Testing cache keys...")
+    
+    messages = [{"role": "system", "content": "Du är coach"}, {"role": "user", "content": "Hej  där "}]
+    same = [{"role": "system", "content": "Du är coach"}, {"role": "user", "content": "Hej där"}]
+    
+    key = ResponseCache.make_key("personal", messages, "gpt-3.5-turbo", 0.7)
+    assert key == ResponseCache.make_key("personal", same, "gpt-3.5-turbo", 0.72)
+    assert key != ResponseCache.make_key("university", same, "gpt-3.5-turbo", 0.7)
+    assert key != ResponseCache.make_key("personal", same, "gpt-4", 0.7)
+    print("✅ Keys normalized correctly")
+
+def test_hit_and_miss():
+    """Sparat svar hämtas och räknarna uppdateras"""
+    print("🗄️ Testing hit/miss...")
+    
+    cache = _make_cache()
+    assert cache.get("a") is None
+    cache.put("a", "svar", "personal", "gpt-3.5-turbo")
+    assert cache.get("a") == "svar"
+    
+    stats = cache.get_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1 and stats['entries'] == 1
+    print(f"✅ Stats: {stats}")
+
+def test_ttl_expiry():
+    """Utgångna poster räknas som missar och tas bort"""
+    print("⏰ Testing TTL...")
+    
+    cache = _make_cache(ttl_hours=0.0001)
+    cache.put("a", "svar")
+    time.sleep(0.5)
+    assert cache.get("a") is None
+    assert cache.get_stats()['entries'] == 0
+    print("✅ Expired entry evicted")
+
+def test_lru_eviction():
+    """Minst nyligen använda poster rensas över storleksgränsen"""
+    print("🧹 Testing LRU eviction...")
+    
+    cache = _make_cache(max_entries=2)
+    cache.put("a", "1")
+    time.sleep(0.01)
+    cache.put("b", "2")
+    time.sleep(0.01)
+    cache.get("a")  # a blir nyligen använd
+    time.sleep(0.01)
+    cache.put("c", "3")
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    print("✅ Least recently used entry evicted")
+
+def test_semantic_lookup():
+    """Nästan identiska frågor i samma läge ger träff, andra lägen och frågor inte"""
+    print("🧠 Testing semantic cache...")
+    
+    cache = SemanticResponseCache(threshold=0.9, max_entries=10)
+    cache.add("personal", "Vad är machine learning?", "ML är...")
+    
+    match = cache.lookup("personal", "vad är Machine Learning")
+    assert match is not None and match[0] == "ML är..."
+    assert cache.lookup("university", "Vad är machine learning?") is None
+    assert cache.lookup("personal", "Hur planerar jag min vecka?") is None
+    print(f"✅ Semantic hit with similarity {match[1]:.2f}")
+
+def test_semantic_eviction():
+    """Full semantisk cache ersätter minst nyligen använda fråga"""
+    print("🧹 Testing semantic eviction...")
+    
+    cache = SemanticResponseCache(threshold=0.9, max_entries=2)
+    cache.add("personal", "första frågan om mål", "1")
+    time.sleep(0.01)
+    cache.add("personal", "andra frågan om stress", "2")
+    time.sleep(0.01)
+    cache.lookup("personal", "första frågan om mål")
+    time.sleep(0.01)
+    cache.add("personal", "tredje frågan om karriär", "3")
+    
+    assert cache.get_stats()['entries'] == 2
+    assert cache.lookup("personal", "andra frågan om stress") is None
+    assert cache.lookup("personal", "första frågan om mål")[0] == "1"
+    print("✅ Least recently used question evicted")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting Response Cache tests...\n")
+    test_key_normalization()
+    test_hit_and_miss()
+    test_ttl_expiry()
+    test_lru_eviction()
+    test_semantic_lookup()
+    test_semantic_eviction()
+    print("\n🎉 Response Cache tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,262 @@
+"""
+Test script för SessionRegistry
+Verifierar LRU-utrensning till databasen, återställning vid nästa tur och
+minnesuppskattningen för aktiva sessioner, att visningsannoteringar hålls
+utanför modellens kontext och att långa sessioner återupptas med bara det
+senaste fönstret inladdat
+"""
+
+import sys
+import os
+import tempfile
+from datetime import datetime
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_TEST_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DIR, "registry_test.db")
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+
+from core.ai_coach import AICoach, CoachingMode, ConversationRole
+from core.session_registry import Message, SessionRegistry
+from utils.data_manager import DataManager
+
+class _ConnectionOnlyDataManager(DataManager):
+    """DataManager där db_path inte är en SQLite-fil (som med Postgres)
+
+    Läsningar som öppnar sqlite3.connect(self.db_path) direkt misslyckas; bara
+    vägen via _get_connection når databasen
+    """
+
+    @property
+    def db_path(self):
+        return "postgresql://coach@db.invalid/ai-coachen"
+
+class _PostgresRowsDataManager(DataManager):
+    """DataManager vars rader har datetime-värden, som psycopg2 returnerar TIMESTAMP-kolumner"""
+
+    def load_session_messages_page(self, session_id, before_id=None, limit=50):
+        rows = super().load_session_messages_page(session_id, before_id, limit)
+        return [{**row, "timestamp": datetime.fromisoformat(row["timestamp"])} for row in rows]
+
+def _coach_with_registry(max_active: int, data_manager: DataManager = None) -> AICoach:
+    """Coach-motor med ett eget register och en temporär databas"""
+    coach = AICoach(api_key="test-key")
+    registry = SessionRegistry(max_active=max_active, idle_timeout_minutes=30)
+    registry.set_data_manager(data_manager or DataManager())
+    registry.restorer = coach._restore_session
+    coach.sessions = registry
+    coach.memory = None
+    return coach
+
+def test_message_slots():
+    """Meddelanden har inget __dict__ och ger korrekt dict-format"""
+    print("🧱 Testing Message slots...")
+
+    message = Message("user", "Hej coach", 3)
+    assert not hasattr(message, "__dict__")
+    assert message.to_dict()["tokens"] == 3
+    assert message.to_dict()["role"] == "user"
+
+    print("✅ Message uses __slots__")
+
+def test_lru_eviction_and_rehydration():
+    """Minst nyligen använda session rensas ut och återställs med historik"""
+    print("♻️ Testing eviction and rehydration...")
+
+    coach = _coach_with_registry(max_active=2)
+    first = coach.start_session("user_a", CoachingMode.PERSONAL)
+    coach.add_message("Jag vill lära mig Python", session_id=first)
+    coach.add_message("Bra mål!", ConversationRole.ASSISTANT, session_id=first)
+
+    coach.start_session("user_b", CoachingMode.UNIVERSITY)
+    coach.start_session("user_c", CoachingMode.HYBRID)
+
+    stats = coach.sessions.memory_stats()
+    assert stats['active_sessions'] == 2
+    assert stats['evicted_sessions'] == 1
+    assert stats['evictions'] == 1
+
+    restored = coach.sessions.get(first)
+    assert restored is not None
+    assert restored.mode == CoachingMode.PERSONAL
+    assert [m.content for m in restored.messages[1:]] == ["Jag vill lära mig Python", "Bra mål!"]
+    assert restored.total_tokens == sum(m.tokens for m in restored.messages)
+    assert coach.sessions.rehydrations == 1
+
+    print(f"✅ Session restored with {len(restored.messages) - 1} messages")
+
+def test_rehydration_through_backend_connection():
+    """Utrensning och återställning läser sessionen via _get_connection, inte db_path"""
+    print("🔌 Testing rehydration without a SQLite db_path...")
+
+    coach = _coach_with_registry(max_active=1, data_manager=_ConnectionOnlyDataManager())
+    first = coach.start_session("backend_user_a", CoachingMode.UNIVERSITY)
+    coach.add_message("Hur börjar vi med AI på institutionen?", session_id=first)
+    coach.add_message("Börja med ett pilotprojekt.", ConversationRole.ASSISTANT, session_id=first)
+
+    coach.start_session("backend_user_b", CoachingMode.PERSONAL)
+    assert coach.sessions.memory_stats()['evicted_sessions'] == 1
+
+    restored = coach.sessions.get(first)
+    assert restored is not None and restored.mode == CoachingMode.UNIVERSITY
+    assert [m.content for m in restored.messages[1:]] == [
+        "Hur börjar vi med AI på institutionen?", "Börja med ett pilotprojekt."
+    ]
+    assert coach.sessions.rehydrations == 1
+    coach.sessions.writer.stop()
+
+    print("✅ Evicted session restored through the backend connection")
+
+def test_one_off_completion_leaves_no_session():
+    """complete_once (bloggredigering) skapar ingen session och köar inget att spara"""
+    print("📝 Testing one-off completion...")
+
+    from utils.api_usage_tracker import usage_tracker
+    from utils.openai_stub_server import StubServer
+
+    usage_tracker.usage_file = os.path.join(_TEST_DIR, "api_usage.json")
+    with StubServer(reply="## Förbättrat inlägg") as stub:
+        coach = _coach_with_registry(max_active=5)
+        coach.client = coach._create_client("test-key", stub.base_url)
+        user_session = coach.start_session("one_off_user", CoachingMode.PERSONAL)
+        current = coach.current_session
+        enqueued = coach.sessions.writer.get_stats()["enqueued"]
+
+        text = coach.complete_once("Du är redaktör.", "Förbättra: Kort utkast", usage_label="blog_admin")
+
+        assert text == "## Förbättrat inlägg" and stub.requests == 1
+        assert stub.last_request["messages"][0]["content"] == "Du är redaktör."
+        assert coach.current_session is current and current.session_id == user_session
+        assert len(coach.sessions) == 1
+        assert coach.sessions.writer.get_stats()["enqueued"] == enqueued
+        coach.sessions.writer.stop()
+
+    print("✅ No session created, current session and write queue untouched")
+
+def test_memory_stats():
+    """Minnesuppskattningen växer med historiken"""
+    print("📏 Testing memory stats...")
+
+    coach = _coach_with_registry(max_active=10)
+    session_id = coach.start_session("user_a", CoachingMode.PERSONAL)
+    before = coach.sessions.memory_stats()['approx_bytes']
+
+    for i in range(20):
+        coach.add_message(f"Meddelande nummer {i}", session_id=session_id)
+
+    after = coach.sessions.memory_stats()['approx_bytes']
+    assert after > before
+
+    print(f"✅ {before} bytes → {after} bytes after 20 messages")
+
+def test_annotations_stay_out_of_context():
+    """Affiliate-blocket visas men skickas aldrig som historik och överlever utrensning"""
+    print("🏷️ Testing display-only annotations...")
+
+    coach = _coach_with_registry(max_active=1)
+    session_id = coach.start_session("user_annotations", CoachingMode.PERSONAL)
+    session = coach.sessions.get(session_id)
+    coach._append_message(session, "Hur lär jag mig AI?", ConversationRole.USER)
+
+    shown, _ = coach._finalize_response(session, "Börja med en kurs i Python.",
+                                        "Hur lär jag mig AI?", None, 1.0)
+    stored = session.messages[-1]
+    assert stored.content == "Börja med en kurs i Python."
+    assert stored.annotations and shown == stored.content + stored.annotations
+
+    coach._append_message(session, "Och sen då?", ConversationRole.USER)
+    api_messages = coach._prepare_api_messages(session, "Och sen då?")
+    assert all(stored.annotations not in m["content"] for m in api_messages)
+    assert session.annotation_tokens_saved > 0
+
+    # Utrensning och återställning behåller uppdelningen
+    coach.start_session("user_b", CoachingMode.PERSONAL)
+    restored = coach.sessions.get(session_id)
+    assert restored.messages[2].content == stored.content
+    assert restored.messages[2].annotations == stored.annotations
+
+    print(f"✅ {session.annotation_tokens_saved} annotation tokens kept out of the prompt")
+
+def test_lazy_resume():
+    """Återupptagning laddar fönstret och osammanfattade meddelanden, äldre sidor vid behov"""
+    print("📜 Testing lazy resume...")
+
+    coach = _coach_with_registry(max_active=10)
+    session_id = coach.start_session("user_resume", CoachingMode.PERSONAL)
+    session = coach.sessions.get(session_id)
+    for i in range(300):
+        role = ConversationRole.USER if i % 2 == 0 else ConversationRole.ASSISTANT
+        coach._append_message(session, f"Meddelande nummer {i}", role)
+    session.summary = "Användaren vill lära sig Python."
+    session.summarized_count = 250
+    coach.end_session(session_id)
+
+    resumed_coach = _coach_with_registry(max_active=10)
+    resumed_coach.context_packer.budget_tokens = 100
+    assert resumed_coach.resume_session(session_id) == session_id
+    resumed = resumed_coach.sessions.get(session_id)
+
+    loaded = [m.content for m in resumed.messages[1:]]
+    assert loaded[-1] == "Meddelande nummer 299"
+    assert 50 <= len(loaded) < 300
+    assert resumed.history_offset + len(loaded) == 300
+    assert resumed.history_offset + resumed.summarized_count == 250
+    assert resumed.summary == "Användaren vill lära sig Python."
+    assert resumed_coach.get_session_summary(session_id)["message_count"] == 301
+
+    # Bläddra bakåt sida för sida tills hela historiken är visad
+    older = []
+    cursor = resumed_coach.get_history_cursor(session_id)
+    while cursor is not None:
+        page, cursor = resumed_coach.get_message_page(session_id, before_id=cursor, limit=40)
+        older[:0] = [m["content"] for m in page]
+    assert older + loaded == [f"Meddelande nummer {i}" for i in range(300)]
+    assert len(resumed.messages) - 1 == len(loaded)
+
+    print(f"✅ Resumed with {len(loaded)} of 300 messages loaded, the rest paged on demand")
+
+def test_resume_from_postgres_timestamps():
+    """Sessions- och meddelanderader med datetime (Postgres) återställs som ISO-strängar (SQLite)"""
+    print("🕰️ Testing resume from datetime columns...")
+
+    data_manager = _PostgresRowsDataManager()
+    coach = _coach_with_registry(max_active=10, data_manager=data_manager)
+    session_id = coach.start_session("user_pg_rows", CoachingMode.PERSONAL)
+    coach.add_message("Vad ska jag fokusera på i veckan?", session_id=session_id)
+    coach.add_message("Välj ett mål och boka tid för det.", ConversationRole.ASSISTANT, session_id=session_id)
+    expected = [m.timestamp[:19] for m in coach.sessions.get(session_id).messages[1:]]
+    coach.end_session(session_id)
+    assert coach.sessions.writer.flush(timeout=5)
+
+    row = data_manager.load_session(session_id)
+    row["start_time"] = datetime.fromisoformat(row["start_time"])
+    restored = coach._restore_session(row, data_manager)
+
+    assert restored.start_time == row["start_time"]
+    assert [m.content for m in restored.messages[1:]] == [
+        "Vad ska jag fokusera på i veckan?", "Välj ett mål och boka tid för det."
+    ]
+    assert [m.timestamp[:19] for m in restored.messages[1:]] == expected
+
+    print("✅ datetime and ISO string columns both restore")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting SessionRegistry Tests\n")
+
+    test_message_slots()
+    test_lru_eviction_and_rehydration()
+    test_rehydration_through_backend_connection()
+    test_one_off_completion_leaves_no_session()
+    test_memory_stats()
+    test_annotations_stay_out_of_context()
+    test_lazy_resume()
+    test_resume_from_postgres_timestamps()
+
+    print("\n🎉 All SessionRegistry tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,152 @@
+"""
+Test script för SingleFlight och idempotensnycklar
+Verifierar att samtidiga identiska anrop delar ett anrop, att färdiga resultat spelas
+upp inom ttl och att coachen bara svarar en gång per inlämning mot stub-servern
+"""
+
+import sys
+import os
+import tempfile
+import threading
+import time
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_TEST_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DIR, "single_flight_sessions.db")
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+
+from utils.api_usage_tracker import usage_tracker
+from utils.openai_stub_server import StubServer
+from utils.single_flight import SingleFlight
+
+def _run_concurrently(fn, count: int):
+    """Kör ``fn`` i ``count`` trådar samtidigt och returnera resultaten"""
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def worker(index):
+        barrier.wait()
+        results[index] = fn()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_calls_share_one_execution():
+    """Samtidiga anrop med samma nyckel kör funktionen en gång"""
+    print("🛫 Testing coalescing...")
+
+    flights = SingleFlight(ttl_seconds=60)
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "svar"
+
+    results = _run_concurrently(lambda: flights.do("nyckel", slow), 5)
+
+    assert len(calls) == 1
+    assert [result for result, _ in results] == ["svar"] * 5
+    assert sum(shared for _, shared in results) == 4
+    assert flights.get_stats()["coalesced"] == 4
+
+    print("✅ Five concurrent calls, one execution")
+
+def test_replay_within_ttl():
+    """Ett färdigt resultat spelas upp tills ttl löpt ut; remember=False glöms direkt"""
+    print("🔁 Testing replay...")
+
+    flights = SingleFlight(ttl_seconds=0.2)
+    calls = []
+    call = lambda: calls.append(1) or len(calls)
+
+    assert flights.do("a", call) == (1, False)
+    assert flights.do("a", call) == (1, True)
+    time.sleep(0.3)
+    assert flights.do("a", call) == (2, False)
+
+    flights.do("b", call, remember=lambda result: False)
+    assert flights.do("b", call) == (4, False)
+    assert flights.get_stats()["replayed"] == 1
+
+    print("✅ Replayed within ttl, executed again after expiry")
+
+def test_abandoned_leader_releases_waiters():
+    """Om ledaren misslyckas gör väntande anrop om anropet själva"""
+    print("💥 Testing abandon...")
+
+    flights = SingleFlight(ttl_seconds=60)
+    flight, leader = flights.begin("k")
+    assert leader
+
+    outcome = {}
+    waiter = threading.Thread(target=lambda: outcome.update(
+        result=flights.do("k", lambda: "från väntaren")
+    ))
+    waiter.start()
+    time.sleep(0.05)
+    flights.abandon("k", flight)
+    waiter.join(timeout=5)
+
+    assert outcome["result"] == ("från väntaren", False)
+
+    print("✅ Waiter retried after the leader gave up")
+
+def test_coach_answers_once_per_submission():
+    """Samma idempotensnyckel ger ett upstream-anrop, ett meddelandepar och en markerad dubblett"""
+    print("🤖 Testing coach idempotency...")
+
+    from core.ai_coach import AICoach, CoachingMode
+
+    usage_tracker.usage_file = os.path.join(tempfile.mkdtemp(), "api_usage.json")
+
+    with StubServer(reply="Hej från stubben", latency_ms=200) as stub:
+        coach = AICoach(api_key="test-key", base_url=stub.base_url)
+        coach.response_cache = None
+        coach.semantic_cache = None
+        coach.flights = SingleFlight(ttl_seconds=60)
+        session_id = coach.start_session("single_flight_user", CoachingMode.PERSONAL)
+
+        results = _run_concurrently(
+            lambda: coach.get_response("Vad är AI?", session_id=session_id, idempotency_key="k1"), 2
+        )
+        response, metadata = coach.get_response("Vad är AI?", session_id=session_id,
+                                                idempotency_key="k1")
+
+        assert stub.requests == 1
+        assert results[0][0] == results[1][0] == response
+        assert metadata["deduplicated"]
+        roles = [message.role for message in coach.sessions.get(session_id).messages]
+        assert roles.count("user") == 1 and roles.count("assistant") == 1
+
+        streamed = "".join(coach.stream_response("Vad är AI?", session_id=session_id,
+                                                 idempotency_key="k1"))
+        assert streamed == response and stub.requests == 1
+
+        coach.get_response("Vad är AI?", session_id=session_id, idempotency_key="k2")
+        assert stub.requests == 2
+
+        coach.sessions.remove(session_id)
+
+    print("✅ One upstream call per idempotency key")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting SingleFlight Tests\n")
+
+    test_concurrent_calls_share_one_execution()
+    test_replay_within_ttl()
+    test_abandoned_leader_releases_waiters()
+    test_coach_answers_once_per_submission()
+
+    print("\n🎉 All SingleFlight tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
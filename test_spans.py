@@ -0,0 +1,112 @@
+"""
+Test script för tidsmätningen per steg
+Verifierar histogrammens percentiler, urvalet per tur och att en chattur mot
+stub-servern delas upp i namngivna steg
+"""
+
+import sys
+import os
+import json
+import tempfile
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_TEST_DIR = tempfile.mkdtemp(prefix="spans_test_")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DIR, "spans_sessions.db")
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+
+from utils.api_usage_tracker import usage_tracker
+from utils.openai_stub_server import StubServer
+from utils.spans import Histogram, SpanRegistry, span_registry
+
+usage_tracker.usage_file = os.path.join(_TEST_DIR, "api_usage.json")
+
+def test_histogram_percentiles():
+    """Percentilerna hamnar i rätt hink och överskrider aldrig max"""
+    print("📊 Testing histogram percentiles...")
+
+    histogram = Histogram()
+    for _ in range(90):
+        histogram.observe(3)
+    for _ in range(10):
+        histogram.observe(400)
+
+    assert 2.5 <= histogram.percentile(50) <= 5
+    assert 250 <= histogram.percentile(95) <= 400
+    assert histogram.percentile(99) <= histogram.max_ms == 400
+    assert Histogram().percentile(50) is None
+
+    print("✅ p50 and p95 land in the expected buckets")
+
+def test_sampling_per_turn():
+    """Hela turen mäts eller ingenting alls"""
+    print("🎲 Testing sampling...")
+
+    never = SpanRegistry(enabled=True, sample_rate=0.0)
+    with never.turn():
+        with never.span("inner"):
+            pass
+        never.observe("measured", 5)
+    assert never.snapshot()["spans"] == {}
+
+    always = SpanRegistry(enabled=True, sample_rate=1.0)
+    for _ in range(3):
+        with always.turn():
+            with always.span("inner"):
+                pass
+    spans = always.snapshot()["spans"]
+    assert spans["turn"]["count"] == 3 and spans["inner"]["count"] == 3
+
+    disabled = SpanRegistry(enabled=False, sample_rate=1.0)
+    with disabled.turn():
+        with disabled.span("inner"):
+            pass
+    assert disabled.snapshot()["spans"] == {}
+
+    print("✅ Sample rate 0 records nothing, 1 records every span")
+
+def test_coach_turn_breakdown():
+    """En tur mot stub-servern ger spans för varje steg och en JSON-dump"""
+    print("⏱️ Testing coach turn breakdown...")
+
+    from core.ai_coach import AICoach, CoachingMode
+
+    enabled, sample_rate = span_registry.enabled, span_registry.sample_rate
+    span_registry.enabled, span_registry.sample_rate = True, 1.0
+    span_registry.reset()
+    try:
+        with StubServer(reply="Börja med en tydlig målbild.") as stub:
+            coach = AICoach(api_key="test-key", base_url=stub.base_url)
+            coach.response_cache = None
+            coach.semantic_cache = None
+            coach.memory = None
+
+            session_id = coach.start_session("spans_user", CoachingMode.PERSONAL)
+            coach.get_response("Hur sätter jag upp mål för nästa år?", session_id=session_id)
+            coach.sessions.remove(session_id)
+
+        spans = json.loads(span_registry.dump_json())["spans"]
+        for name in ("turn", "history_prep", "token_counting", "api_call", "affiliate",
+                     "usage_tracking", "usage_file_write"):
+            assert spans.get(name, {}).get("count", 0) >= 1, name
+        assert spans["turn"]["max_ms"] >= spans["api_call"]["max_ms"]
+    finally:
+        span_registry.enabled, span_registry.sample_rate = enabled, sample_rate
+        span_registry.reset()
+
+    print(f"✅ {len(spans)} stages timed within one turn")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting Span Tests\n")
+
+    test_histogram_percentiles()
+    test_sampling_per_turn()
+    test_coach_turn_breakdown()
+
+    print("\n🎉 All Span tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,93 @@
+"""
+Test script för strömmade svar
+Verifierar mot stub-servern att deltan från stream_response tillsammans blir det
+visade svaret och att turen sparas en gång (en användar- och en assistentrad)
+"""
+
+import sys
+import os
+import tempfile
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_TEST_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DIR, "streaming_sessions.db")
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+
+from core.ai_coach import AICoach, CoachingMode, ConversationRole
+from core.session_registry import SessionRegistry
+from utils.api_usage_tracker import usage_tracker
+from utils.data_manager import DataManager
+from utils.openai_stub_server import StubServer
+
+def _coach(stub: StubServer) -> AICoach:
+    coach = AICoach(api_key="test-key", base_url=stub.base_url)
+    coach.response_cache = None
+    coach.semantic_cache = None
+    registry = SessionRegistry()
+    registry.set_data_manager(DataManager())
+    registry.restorer = coach._restore_session
+    coach.sessions = registry
+    return coach
+
+def test_stream_joins_into_final_response():
+    """Deltan bildar svaret; affiliate-blocket kommer sist och hålls utanför modelltexten"""
+    print("🌊 Testing streamed deltas...")
+
+    usage_tracker.usage_file = os.path.join(_TEST_DIR, "api_usage.json")
+    usage_tracker.usage_history = []
+    reply = "Ett första steg är att sätta av en timme i veckan för Python och machine learning."
+
+    with StubServer(reply=reply, token_interval_ms=1) as stub:
+        coach = _coach(stub)
+        session_id = coach.start_session("stream_user", CoachingMode.PERSONAL)
+
+        chunks = list(coach.stream_response("Hur kommer jag igång med AI?", session_id=session_id))
+        session = coach.sessions.get(session_id)
+        assistant = session.messages[-1]
+
+        assert len(chunks) > 1
+        assert "".join(chunks) == assistant.display_text
+        assert assistant.content == reply
+        assert "".join(chunks).startswith(reply)
+
+        metadata = coach.get_last_response_metadata(session_id)
+        assert metadata["tokens_used"] > 0 and "time_to_first_token_ms" in metadata
+        assert len(usage_tracker.usage_history) == 1
+        coach.sessions.writer.stop()
+
+    print(f"✅ {len(chunks)} deltas joined into the displayed response")
+
+def test_streamed_turn_saved_once():
+    """En strömmad tur köas och skrivs som exakt en användar- och en assistentrad"""
+    print("💾 Testing streamed turn persistence...")
+
+    with StubServer(reply="Börja smått och följ upp varje vecka.") as stub:
+        coach = _coach(stub)
+        session_id = coach.start_session("stream_persist_user", CoachingMode.PERSONAL)
+
+        streamed = "".join(coach.stream_response("Hur håller jag motivationen uppe?", session_id=session_id))
+        assert coach.sessions.writer.flush(timeout=5)
+        assert coach.sessions.writer.get_stats()["enqueued"] == 3  # sessionsrad + två meddelanden
+
+        rows = DataManager().load_session_messages(session_id)
+        assert [row["role"] for row in rows] == [ConversationRole.USER.value, ConversationRole.ASSISTANT.value]
+        assert streamed.startswith(rows[1]["content"])
+        assert stub.requests == 1
+        coach.sessions.writer.stop()
+
+    print("✅ Turn written once after the stream closed")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting Streaming Tests\n")
+
+    test_stream_joins_into_final_response()
+    test_streamed_turn_saved_once()
+
+    print("\n🎉 All Streaming tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,112 @@
+"""
+Test script för token-räkningen
+Verifierar att sessionens löpande token-summa alltid är summan av meddelandenas
+antal (efter nya meddelanden, rullande sammanfattning och utrensning ur
+sessionsregistret) och att uppskattningen används när tiktoken saknar encoding
+"""
+
+import sys
+import os
+import tempfile
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_TEST_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DIR, "token_sessions.db")
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+
+import tiktoken
+
+from core.ai_coach import AICoach, CoachingMode
+from core.session_registry import SessionRegistry
+from utils.api_usage_tracker import usage_tracker
+from utils.context_packer import ContextPacker
+from utils.data_manager import DataManager
+from utils.openai_stub_server import StubServer
+from utils.token_counter import ApproximateEncoding, count_tokens, get_encoding
+
+def _assert_running_total(session):
+    """Löpande summa = summan av meddelandenas antal, och varje antal stämmer med texten"""
+    assert session.total_tokens == sum(message.tokens for message in session.messages)
+    for message in session.messages[1:]:
+        assert message.tokens == count_tokens(message.content)
+
+def test_running_total_through_summary_and_eviction():
+    """Summan håller efter nya turer, sammanfattning och återställning från databasen"""
+    print("🧮 Testing running token total...")
+
+    usage_tracker.usage_file = os.path.join(_TEST_DIR, "api_usage.json")
+    usage_tracker.usage_history = []
+
+    with StubServer(reply="Fortsätt med små steg och följ upp dina mål varje vecka.") as stub:
+        coach = AICoach(api_key="test-key", base_url=stub.base_url)
+        coach.response_cache = None
+        coach.semantic_cache = None
+        coach.memory = None
+        registry = SessionRegistry(max_active=1, idle_timeout_minutes=30)
+        registry.set_data_manager(DataManager())
+        registry.restorer = coach._restore_session
+        coach.sessions = registry
+        # Liten budget så att historik faller ur fönstret och sammanfattas
+        coach.context_packer = ContextPacker(
+            budget_tokens=coach.persona_tokens[CoachingMode.PERSONAL] + 250, summary_trigger_tokens=20
+        )
+
+        session_id = coach.start_session("token_user", CoachingMode.PERSONAL)
+        session = coach.sessions.get(session_id)
+        _assert_running_total(session)
+
+        for index in range(6):
+            coach.get_response(f"Tur {index}: jag vill planera min vecka bättre och hinna med träningen",
+                               session_id=session_id)
+            _assert_running_total(session)
+        assert session.summarized_count > 0 and session.summary
+
+        # Utrensning ur registret och återställning från databasen
+        coach.start_session("token_other_user", CoachingMode.PERSONAL)
+        assert coach.sessions.memory_stats()["evicted_sessions"] == 1
+        restored = coach.sessions.get(session_id)
+        assert restored is not session
+        _assert_running_total(restored)
+
+        coach.get_response("En sista fråga efter återställningen", session_id=session_id)
+        _assert_running_total(restored)
+        registry.writer.stop()
+
+    print(f"✅ Total matched the messages after {session.summarized_count} summarized and a rehydration")
+
+def test_approximate_encoding_fallback():
+    """Utan tiktoken-encoding räknas ca 4 tecken per token"""
+    print("📏 Testing approximate encoding...")
+
+    original = tiktoken.encoding_for_model, tiktoken.get_encoding
+
+    def unavailable(*args, **kwargs):
+        raise OSError("BPE-filen kunde inte hämtas")
+
+    tiktoken.encoding_for_model = tiktoken.get_encoding = unavailable
+    try:
+        encoding = get_encoding("offline-testmodell")
+    finally:
+        tiktoken.encoding_for_model, tiktoken.get_encoding = original
+
+    assert isinstance(encoding, ApproximateEncoding)
+    assert get_encoding("offline-testmodell") is encoding  # cachad per modell
+    assert count_tokens("a" * 10, "offline-testmodell") == 3
+    assert count_tokens("", "offline-testmodell") == 0
+
+    print("✅ ApproximateEncoding used when tiktoken is unavailable")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting Token Counter Tests\n")
+
+    test_running_total_through_summary_and_eviction()
+    test_approximate_encoding_fallback()
+
+    print("\n🎉 All Token Counter tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
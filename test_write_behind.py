@@ -0,0 +1,231 @@
+"""
+Test script för write-behind-kön
+Verifierar att sessioner och meddelanden skrivs i batchar i bakgrunden, att kön
+töms när sessionen avslutas, att en full kö bromsar anroparen istället för att
+tappa data och att misslyckade skrivningar görs om och rapporteras av flush()
+"""
+
+import sys
+import os
+import tempfile
+import threading
+import time
+
+# Lägg till projektroot till Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_TEST_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DIR, "write_behind_test.db")
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(_TEST_DIR, "response_cache.db")
+os.environ["MEMORY_DB_PATH"] = os.path.join(_TEST_DIR, "memory.db")
+
+from core.ai_coach import AICoach, CoachingMode, ConversationRole
+from core.session_registry import SessionRegistry
+from utils.data_manager import DataManager
+from utils.write_behind import WriteBehindQueue
+
+class _CountingDataManager(DataManager):
+    """DataManager som räknar batchar och kan hållas kvar i en skrivning"""
+
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def save_sessions_batch(self, sessions, messages):
+        self.gate.wait()
+        self.batch_sizes.append((len(sessions), len(messages)))
+        return super().save_sessions_batch(sessions, messages)
+
+class _FailingDataManager(DataManager):
+    """DataManager vars batchskrivning misslyckas de första ``failures`` gångerna"""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+        self.attempts = 0
+
+    def save_sessions_batch(self, sessions, messages):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            return False
+        return super().save_sessions_batch(sessions, messages)
+
+class _ConnectionOnlyDataManager(DataManager):
+    """DataManager där db_path inte är en SQLite-fil (som med Postgres)
+
+    Läsare och skrivare som öppnar sqlite3.connect(self.db_path) direkt
+    misslyckas; bara vägen via _get_connection når databasen
+    """
+
+    @property
+    def db_path(self):
+        return "postgresql://coach@db.invalid/ai-coachen"
+
+def _message(session_id: str, index: int) -> dict:
+    return {"session_id": session_id, "role": "user", "content": f"Meddelande {index}",
+            "timestamp": f"2026-01-01T00:00:{index:02d}", "metadata": {"tokens": 2}}
+
+def _row(session_id: str) -> dict:
+    return {"session_id": session_id, "user_id": "wb_user", "mode": "personal",
+            "start_time": "2026-01-01T00:00:00"}
+
+def test_batches_in_one_transaction():
+    """Poster som köas tätt skrivs som en batch; senaste sessionsraden vinner"""
+    print("📦 Testing batching...")
+
+    data_manager = _CountingDataManager()
+    writer = WriteBehindQueue(lambda: data_manager, enabled=True, max_queue=100,
+                              batch_size=50, flush_interval_seconds=0.2)
+    writer.enqueue_session(_row("wb_batch"))
+    for index in range(10):
+        writer.enqueue_message(_message("wb_batch", index))
+    writer.enqueue_session({**_row("wb_batch"), "message_count": 10})
+
+    assert writer.flush(timeout=5)
+    assert data_manager.batch_sizes == [(1, 10)]
+    assert data_manager.load_session("wb_batch")["message_count"] == 10
+    assert len(data_manager.load_session_messages("wb_batch")) == 10
+
+    stats = writer.get_stats()
+    assert stats["batches"] == 1 and stats["queue_depth"] == 0
+    assert stats["flush_p95_ms"] is not None
+    writer.stop()
+
+    print("✅ Eleven rows written in one transaction")
+
+def test_backpressure_when_full():
+    """En full kö låter anroparen vänta tills bakgrundstråden hunnit skriva"""
+    print("🧱 Testing back-pressure...")
+
+    data_manager = _CountingDataManager()
+    data_manager.gate.clear()
+    writer = WriteBehindQueue(lambda: data_manager, enabled=True, max_queue=2,
+                              batch_size=1, flush_interval_seconds=0.01, put_timeout_seconds=0.05)
+    writer.enqueue_session(_row("wb_full"))
+
+    producer = threading.Thread(target=lambda: [
+        writer.enqueue_message(_message("wb_full", index)) for index in range(5)
+    ])
+    producer.start()
+    time.sleep(0.3)
+    assert producer.is_alive()
+    assert writer.get_stats()["queue_depth"] == 2
+
+    data_manager.gate.set()
+    producer.join(timeout=5)
+    assert writer.flush(timeout=5)
+    assert writer.get_stats()["backpressure_waits"] >= 1
+    assert len(data_manager.load_session_messages("wb_full")) == 5
+    writer.stop()
+
+    print("✅ Producer blocked on a full queue and nothing was dropped")
+
+def test_coach_turns_survive_restart():
+    """Meddelanden köas per tur och finns i databasen efter end_session"""
+    print("💾 Testing coach persistence...")
+
+    coach = AICoach(api_key="test-key")
+    registry = SessionRegistry()
+    registry.set_data_manager(DataManager())
+    registry.restorer = coach._restore_session
+    coach.sessions = registry
+
+    session_id = coach.start_session("wb_coach_user", CoachingMode.PERSONAL)
+    coach.add_message("Jag vill lära mig Python", session_id=session_id)
+    coach._finalize_response(coach.sessions.get(session_id), "Bra mål!", "Jag vill lära mig Python",
+                             None, 1.0)
+    assert registry.writer.get_stats()["enqueued"] == 3
+
+    coach.end_session(session_id)
+    assert registry.writer.get_stats()["queue_depth"] == 0
+
+    restarted = SessionRegistry()
+    restarted.set_data_manager(DataManager())
+    roles = [row["role"] for row in restarted._get_data_manager().load_session_messages(session_id)]
+    assert roles == [ConversationRole.USER.value, ConversationRole.ASSISTANT.value]
+    registry.writer.stop()
+
+    print("✅ Conversation persisted through the write-behind queue")
+
+def test_failed_write_is_retried():
+    """En skrivning som misslyckas görs om med backoff och flush väntar in den"""
+    print("🔁 Testing retry after a failed write...")
+
+    data_manager = _FailingDataManager(failures=2)
+    writer = WriteBehindQueue(lambda: data_manager, enabled=True, max_queue=100, batch_size=50,
+                              flush_interval_seconds=0.05, max_retries=3, retry_backoff_seconds=0.01)
+    writer.enqueue_session(_row("wb_retry"))
+    writer.enqueue_message(_message("wb_retry", 0))
+
+    assert writer.flush(timeout=5)
+    assert data_manager.attempts == 3
+    assert len(data_manager.load_session_messages("wb_retry")) == 1
+    stats = writer.get_stats()
+    assert stats["failed_batches"] == 2 and stats["retries"] == 2 and stats["dropped_batches"] == 0
+    writer.stop()
+
+    print("✅ Written on the third attempt")
+
+def test_flush_reports_dropped_batch():
+    """När alla försök misslyckats släpps batchen och flush returnerar False"""
+    print("🚨 Testing flush after a dropped batch...")
+
+    data_manager = _FailingDataManager(failures=100)
+    writer = WriteBehindQueue(lambda: data_manager, enabled=True, max_queue=100, batch_size=50,
+                              flush_interval_seconds=0.05, max_retries=2, retry_backoff_seconds=0.01)
+    writer.enqueue_session(_row("wb_dropped"))
+    writer.enqueue_message(_message("wb_dropped", 0))
+
+    assert not writer.flush(timeout=5)
+    assert data_manager.attempts == 3
+    stats = writer.get_stats()
+    assert stats["dropped_batches"] == 1 and stats["dropped_items"] == 2
+    assert data_manager.load_session("wb_dropped") is None
+
+    # Nästa flush utan nya fel är lyckad igen
+    assert writer.flush(timeout=5)
+    writer.stop()
+
+    print("✅ Dropped batch reported by flush()")
+
+def test_readers_use_writer_backend():
+    """Det köade skrivs och läses tillbaka via samma anslutning"""
+    print("🔌 Testing readers on the writer's backend...")
+
+    data_manager = _ConnectionOnlyDataManager()
+    writer = WriteBehindQueue(lambda: data_manager, enabled=True, max_queue=100,
+                              batch_size=50, flush_interval_seconds=0.05)
+    writer.enqueue_session({**_row("wb_backend"), "user_id": "wb_backend_user", "message_count": 2})
+    writer.enqueue_message(_message("wb_backend", 0))
+    writer.enqueue_message(_message("wb_backend", 1))
+    assert writer.flush(timeout=5)
+    writer.stop()
+
+    sessions = data_manager.load_user_sessions("wb_backend_user")
+    assert [row["id"] for row in sessions] == ["wb_backend"]
+    messages = data_manager.load_session_messages("wb_backend")
+    assert [message["content"] for message in messages] == ["Meddelande 0", "Meddelande 1"]
+    assert messages[0]["metadata"] == {"tokens": 2}
+
+    assert data_manager.save_message("wb_backend", "assistant", "Svar", "2026-01-01T00:01:00")
+    assert len(data_manager.load_session_messages("wb_backend")) == 3
+
+    print("✅ Sessions and messages read back through _get_connection")
+
+def run_all_tests():
+    """Kör alla tester"""
+    print("🚀 Starting Write-Behind Tests\n")
+
+    test_batches_in_one_transaction()
+    test_backpressure_when_full()
+    test_coach_turns_survive_restart()
+    test_failed_write_is_retried()
+    test_flush_reports_dropped_batch()
+    test_readers_use_writer_backend()
+
+    print("\n🎉 All Write-Behind tests passed!")
+
+if __name__ == "__main__":
+    run_all_tests()
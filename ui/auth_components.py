@@ -7,6 +7,7 @@ Hanterar inloggning och registrering i Streamlit
 import streamlit as st
 from typing import Optional, Tuple
 from utils.auth_manager import AuthManager, User
+from utils.long_term_memory import long_term_memory
 import os
 import psycopg2
 
@@ -342,6 +343,17 @@ def render_user_settings(user: User):
     with st.expander("Integritetsinställningar"):
         st.info("GDPR-kompatibla integritetsinställningar kommer snart!")
         
+        # Långtidsminnet är knutet till användarens id (samma som coaching-sessionerna)
+        st.write("**Coachens minne:** fakta och sammanfattningar från dina avslutade sessioner "
+                 "som coachen använder i kommande samtal.")
+        if st.button("Radera Coachens Minne om Mig"):
+            # Minnen från en nyss avslutad session kan fortfarande extraheras i bakgrunden
+            coach = st.session_state.get('ai_coach')
+            if coach is not None:
+                coach.wait_for_memories(timeout=30)
+            deleted = long_term_memory.forget_user(str(user.id))
+            st.success(f"{deleted} sparade minnen raderade")
+        
         if st.button("Exportera Mina Data"):
             st.info("Dataexport är inte implementerad ännu")
         
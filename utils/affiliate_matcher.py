@@ -0,0 +1,218 @@
+"""
+Affiliate Matcher för AI-Coachen
+Datadriven affiliate-katalog som kompileras till ett enda trie-format reguljärt
+uttryck med ordgränser. Alla kategorier hittas i ett svep över texten och katalogen
+laddas om automatiskt när filen ändras, utan omstart
+
+Nyckelord matchas som hela ord; ett avslutande ``*`` gör nyckelordet till ett
+ordprefix (``kurs*`` matchar "kurs", "kursen" och "kurser" men inte "diskurs")
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional
+
+from .config import Config
+
+@dataclass
+class AffiliateCategory:
+    """En kategori i katalogen (ordningen i katalogen är prioriteten)"""
+    id: str
+    text: str
+    keywords: List[str]
+
+class CompiledCatalog:
+    """Katalog kompilerad till ett trie-format regex plus uppslagstabeller per nyckelord
+    
+    Regexet hittar kandidatord (nyckelord + resten av ordet) i ett svep; vilket
+    nyckelord och vilka kategorier det gäller avgörs sedan med dict-uppslag.
+    """
+
+    def __init__(self, data: Dict):
+        self.max_suggestions = int(data.get("max_suggestions", 2))
+        self.header = data.get("header", "")
+        self.footer = data.get("footer", "")
+        self.categories = [
+            AffiliateCategory(id=item["id"], text=item["text"], keywords=list(item["keywords"]))
+            for item in data["categories"]
+        ]
+        self.order = {category.id: index for index, category in enumerate(self.categories)}
+        self.separator = f"\n\n---\n\n{self.header}\n\n"
+        # Renderade block per kategorikombination - samma sträng delas av alla meddelanden
+        self._rendered: Dict[tuple, str] = {}
+
+        # Samma nyckelord kan finnas i flera kategorier
+        self.exact: Dict[str, FrozenSet[str]] = {}
+        self.prefixes: Dict[str, FrozenSet[str]] = {}
+        for category in self.categories:
+            for keyword in category.keywords:
+                normalized = " ".join(keyword.strip().lower().rstrip("*").split())
+                if not normalized:
+                    continue
+                table = self.prefixes if keyword.strip().endswith("*") else self.exact
+                table[normalized] = table.get(normalized, frozenset()) | {category.id}
+        self.prefix_lengths = sorted({len(prefix) for prefix in self.prefixes}, reverse=True)
+
+        keywords = set(self.exact) | set(self.prefixes)
+        self.pattern = (
+            re.compile(r"(?<!\w)" + _trie_pattern(keywords) + r"\w*") if keywords else None
+        )
+
+    def _lookup(self, word: str) -> FrozenSet[str]:
+        """Kategorier för ett normaliserat kandidatord (helt ord eller ordprefix)"""
+        found = self.exact.get(word, frozenset())
+        for length in self.prefix_lengths:
+            if length <= len(word):
+                found = found | self.prefixes.get(word[:length], frozenset())
+        return found
+
+    def _categories_for(self, candidate: str) -> FrozenSet[str]:
+        """Kategorier för en regex-träff; flerordsträffar prövas även ord för ord"""
+        words = candidate.split()
+        if len(words) == 1:
+            return self._lookup(candidate)
+        found = self._lookup(" ".join(words))
+        for word in words:
+            found = found | self._lookup(word)
+        return found
+
+    def match(self, *texts: str) -> List[str]:
+        """Kategorier som träffas i texterna, i katalogens prioritetsordning"""
+        if self.pattern is None:
+            return []
+
+        found = set()
+        for text in texts:
+            for word in self.pattern.findall(text.lower()):
+                found |= self._categories_for(word)
+        return sorted(found, key=self.order.__getitem__)
+
+    def render(self, category_ids: List[str]) -> str:
+        """Affiliate-blocket för givna kategorier (cachat per kombination)"""
+        key = tuple(category_ids)
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            texts = {category.id: category.text for category in self.categories}
+            rendered = self.separator
+            for category_id in category_ids:
+                rendered += texts[category_id] + "\n\n"
+            rendered += self.footer
+            self._rendered[key] = rendered
+        return rendered
+
+def _trie_pattern(keywords) -> str:
+    """Bygg ett regex där alternativen delar prefix (snabbare än en platt alternation)"""
+    trie: Dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: Dict) -> str:
+        alternatives = []
+        optional = False
+        for char, child in sorted(node.items()):
+            if char == "":
+                optional = True
+                continue
+            # Mellanslag i flerordsnyckelord matchar valfritt blanktecken
+            head = r"\s+" if char == " " else re.escape(char)
+            alternatives.append(head + build(child))
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        return f"(?:{body})?" if optional else body
+
+    return build(trie)
+
+class AffiliateMatcher:
+    """Laddar katalogen, kompilerar den en gång och laddar om när filen ändras"""
+
+    def __init__(self, catalog_path: str = None, reload_interval_seconds: float = None):
+        self.logger = logging.getLogger(__name__)
+        self.catalog_path = catalog_path or Config.AFFILIATE_CATALOG_PATH
+        self.reload_interval_seconds = (
+            reload_interval_seconds if reload_interval_seconds is not None
+            else Config.AFFILIATE_CATALOG_RELOAD_SECONDS
+        )
+
+        self._catalog: Optional[CompiledCatalog] = None
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+        self.reload()
+
+    def reload(self) -> bool:
+        """Läs och kompilera katalogen; en trasig katalog behåller den förra"""
+        try:
+            mtime = os.path.getmtime(self.catalog_path)
+            with open(self.catalog_path, "r", encoding="utf-8") as f:
+                catalog = CompiledCatalog(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.error(f"Kunde inte ladda affiliate-katalog {self.catalog_path}: {str(e)}")
+            return False
+
+        # Referensbytet är atomärt - pågående anrop använder den gamla katalogen klart
+        self._catalog = catalog
+        self._mtime = mtime
+        self.reloads += 1
+        self.logger.info(f"Laddade affiliate-katalog med {len(catalog.categories)} kategorier")
+        return True
+
+    def _maybe_reload(self):
+        """Kontrollera filens mtime högst en gång per intervall"""
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval_seconds:
+            return
+        with self._lock:
+            if now - self._last_check < self.reload_interval_seconds:
+                return
+            self._last_check = now
+            try:
+                mtime = os.path.getmtime(self.catalog_path)
+            except OSError:
+                return
+            if mtime != self._mtime:
+                self.reload()
+
+    @property
+    def catalog(self) -> Optional[CompiledCatalog]:
+        self._maybe_reload()
+        return self._catalog
+
+    def match(self, *texts: str) -> List[str]:
+        """Kategori-id:n som träffas i texterna"""
+        catalog = self.catalog
+        return catalog.match(*texts) if catalog else []
+
+    def suggestions_text(self, ai_response: str, user_message: str) -> str:
+        """Affiliate-avsnitt att lägga efter svaret (tom sträng om inget matchar)"""
+        catalog = self.catalog
+        if not catalog:
+            return ""
+
+        category_ids = catalog.match(ai_response, user_message)[:catalog.max_suggestions]
+        if not category_ids:
+            return ""
+        return catalog.render(category_ids)
+
+    def split_annotations(self, text: str) -> tuple:
+        """Dela en äldre sparad text (med inbakat affiliate-block) i (modelltext, annoteringar)"""
+        catalog = self.catalog
+        if not catalog:
+            return text, ""
+        index = text.find(catalog.separator)
+        if index == -1:
+            return text, ""
+        return text[:index], text[index:]
+
+# Processgemensam matcher
+affiliate_matcher = AffiliateMatcher()
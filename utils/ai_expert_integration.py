@@ -5,10 +5,14 @@ Använder RAG-system för att berika coaching med relevant AI-kunskap
 """
 
 import logging
-from typing import Dict, Optional
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
 from enum import Enum
 
 from .rag_system import rag_system
+from .spans import span_registry
+from .token_counter import count_tokens
 
 class AIExpertiseLevel(Enum):
     """Nivåer av AI-expertis baserat på användarfråga"""
@@ -17,11 +21,138 @@ class AIExpertiseLevel(Enum):
     ADVANCED = "advanced"     # Strategisk/teknisk djup
     EXPERT = "expert"        # Cutting-edge och forskning
 
+# Statiska riktlinjer som ligger i det stabila prompt-prefixet (identiskt varje tur)
+# så att leverantörens prompt-cache kan återanvända det
+STATIC_AI_GUIDELINES = """
+## AI-relaterade frågor
+När användaren frågar om AI får du ett avsnitt med AI-expertis och kontext i slutet
+av samtalet. Kombinera då din coaching-expertis med AI-kunskap genom att:
+- Ställa reflekterande frågor som hjälper användaren tänka igenom AI-beslut
+- Ge praktisk vägledning baserad på användarens kontext och mognadsnivå
+- Balansera teknisk information med personlig utveckling och coaching
+- Hjälpa användaren utveckla AI-kompetens steg för steg
+- Fokusera på användbar, actionable rådgivning snarare än bara teoretisk kunskap
+- Behålla din roll som coach och uppmuntra reflektion kring implementation och utmaningar
+
+Svara på svenska med professionell men varm coaching-ton.
+"""
+
+BASE_AI_KNOWLEDGE = """
+        Du har djup expertis inom AI och machine learning, inklusive:
+        - Moderna AI-modeller (LLMs, Transformers, Generativ AI)
+        - Praktisk AI-implementation och MLOps
+        - AI-strategi och business transformation
+        - Ethical AI och responsible deployment
+        """
+
+LEVEL_ADDONS = {
+    AIExpertiseLevel.BASIC: """
+            **Fokus för grundläggande frågor**:
+            - Förklara komplexa AI-koncept med enkla, relatable exempel
+            - Hjälp användaren bygga AI-förståelse steg för steg
+            - Koppla AI-teorier till praktiska tillämpningar
+            - Uppmuntra nyfikenhet och fortsatt lärande
+            - Ge rekommendationer för nästa steg i AI-journey
+            """,
+    
+    AIExpertiseLevel.INTERMEDIATE: """
+            **Fokus för praktisk implementation**:
+            - Ge konkret vägledning för AI-projekt och implementation
+            - Hjälp med verktygsval och tekniska beslut
+            - Diskutera best practices och vanliga fallgropar
+            - Stötta projekt-planning och risk-bedömning
+            - Balansera tekniska och affärsmässiga överväganden
+            """,
+    
+    AIExpertiseLevel.ADVANCED: """
+            **Fokus för strategisk och teknisk djup**:
+            - Fördjupa diskussioner om AI-arkitektur och design decisions
+            - Ge strategisk vägledning för AI-transformation
+            - Diskutera industry trends och emerging technologies
+            - Hjälpa med complex technical challenges
+            - Stötta ledarskap i AI-relaterade beslut
+            """,
+    
+    AIExpertiseLevel.EXPERT: """
+            **Fokus för cutting-edge expertis**:
+            - Diskutera latest research och state-of-the-art techniques  
+            - Ge insikter om emerging AI paradigms
+            - Stötta innovation och experimentation
+            - Hjälpa med forskningsfrågor och advanced implementations
+            - Balansera teoretisk fördjupning med praktisk applicering
+            """
+}
+
+# Övriga lägen får inget mode-specifikt tillägg
+MODE_ADDONS = {
+    "university": """
+            **Universitets-specifik AI-expertis**:
+            - Academic research applications av AI
+            - Learning analytics och educational technology
+            - AI governance och policy development för universitet
+            - Forskningsintegritet och ethical considerations
+            - Faculty training och capacity building för AI
+            """,
+    "personal": """
+            **Personlig AI-utveckling**:
+            - Individuell AI-kompetensbyggande
+            - Career development inom AI-området
+            - Personliga AI-projekt och portfolioutveckling
+            - Networking och community building inom AI
+            - Balans mellan teknisk och business-orienterad AI-kunskap
+            """
+}
+
+TURN_HEADER = "## AI-Expertis för denna fråga"
+
+def normalize_template(text: str) -> str:
+    """Ta bort indentering och tomma rader (kostar tokens utan att tillföra något)"""
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+@dataclass(frozen=True)
+class ExpertiseTemplate:
+    """Förkompilerad expertismall för en (nivå, mode)-kombination"""
+    addon: str  # Normaliserat tillägg (används av enhance_coaching_persona)
+    turn_block: str  # Rubrik + tillägg som läggs i turkontexten
+    tokens: int  # Token-antal för turn_block
+    tokens_saved: int  # Tokens som normaliseringen sparar jämfört med rå mall
+
+def compile_expertise_templates() -> Dict[Tuple[AIExpertiseLevel, str], ExpertiseTemplate]:
+    """Bygg alla (nivå × mode)-mallar en gång; mode "" gäller lägen utan eget tillägg"""
+    templates = {}
+    for level, level_addon in LEVEL_ADDONS.items():
+        for mode in list(MODE_ADDONS) + [""]:
+            mode_addon = MODE_ADDONS.get(mode, "")
+            raw = f"{TURN_HEADER}\n{BASE_AI_KNOWLEDGE}\n{level_addon}\n{mode_addon}"
+            addon = "\n\n".join(
+                normalize_template(part) for part in (BASE_AI_KNOWLEDGE, level_addon, mode_addon) if part
+            )
+            turn_block = f"{TURN_HEADER}\n{addon}"
+            tokens = count_tokens(turn_block)
+            templates[(level, mode)] = ExpertiseTemplate(
+                addon=addon,
+                turn_block=turn_block,
+                tokens=tokens,
+                tokens_saved=count_tokens(raw) - tokens
+            )
+    return templates
+
+@dataclass
+class TurnContext:
+    """Frågespecifik kontext för en tur"""
+    text: str
+    tokens: int
+    template_tokens_saved: int = 0  # Tokens som den förkompilerade mallen sparade denna tur
+
 class AIExpertIntegration:
     """Integration layer för AI-expertis i coaching"""
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        self._templates: Dict[Tuple[AIExpertiseLevel, str], ExpertiseTemplate] = {}
+        self._templates_lock = threading.Lock()
+        self.template_turns = 0
+        self.template_tokens_saved = 0
         
     def detect_expertise_level(self, user_query: str) -> AIExpertiseLevel:
         """Identifiera lämplig expertisnivå baserat på användarfråga"""
@@ -92,75 +223,16 @@ class AIExpertIntegration:
         return enhanced_persona
     
     def _get_ai_expertise_addon(self, level: AIExpertiseLevel, mode: str) -> str:
-        """Skapa AI-expertis tillägg baserat på nivå och mode"""
-        
-        base_ai_knowledge = """
-        Du har djup expertis inom AI och machine learning, inklusive:
-        - Moderna AI-modeller (LLMs, Transformers, Generativ AI)
-        - Praktisk AI-implementation och MLOps
-        - AI-strategi och business transformation
-        - Ethical AI och responsible deployment
-        """
-        
-        level_specific = {
-            AIExpertiseLevel.BASIC: """
-            **Fokus för grundläggande frågor**:
-            - Förklara komplexa AI-koncept med enkla, relatable exempel
-            - Hjälp användaren bygga AI-förståelse steg för steg
-            - Koppla AI-teorier till praktiska tillämpningar
-            - Uppmuntra nyfikenhet och fortsatt lärande
-            - Ge rekommendationer för nästa steg i AI-journey
-            """,
-            
-            AIExpertiseLevel.INTERMEDIATE: """
-            **Fokus för praktisk implementation**:
-            - Ge konkret vägledning för AI-projekt och implementation
-            - Hjälp med verktygsval och tekniska beslut
-            - Diskutera best practices och vanliga fallgropar
-            - Stötta projekt-planning och risk-bedömning
-            - Balansera tekniska och affärsmässiga överväganden
-            """,
-            
-            AIExpertiseLevel.ADVANCED: """
-            **Fokus för strategisk och teknisk djup**:
-            - Fördjupa diskussioner om AI-arkitektur och design decisions
-            - Ge strategisk vägledning för AI-transformation
-            - Diskutera industry trends och emerging technologies
-            - Hjälpa med complex technical challenges
-            - Stötta ledarskap i AI-relaterade beslut
-            """,
-            
-            AIExpertiseLevel.EXPERT: """
-            **Fokus för cutting-edge expertis**:
-            - Diskutera latest research och state-of-the-art techniques  
-            - Ge insikter om emerging AI paradigms
-            - Stötta innovation och experimentation
-            - Hjälpa med forskningsfrågor och advanced implementations
-            - Balansera teoretisk fördjupning med praktisk applicering
-            """
-        }
-        
-        mode_specific = ""
-        if mode == "university":
-            mode_specific = """
-            **Universitets-specifik AI-expertis**:
-            - Academic research applications av AI
-            - Learning analytics och educational technology
-            - AI governance och policy development för universitet
-            - Forskningsintegritet och ethical considerations
-            - Faculty training och capacity building för AI
-            """
-        elif mode == "personal":
-            mode_specific = """
-            **Personlig AI-utveckling**:
-            - Individuell AI-kompetensbyggande
-            - Career development inom AI-området
-            - Personliga AI-projekt och portfolioutveckling
-            - Networking och community building inom AI
-            - Balans mellan teknisk och business-orienterad AI-kunskap
-            """
-        
-        return f"{base_ai_knowledge}\n{level_specific[level]}\n{mode_specific}"
+        """AI-expertis tillägg för nivå och mode (förkompilerad mall)"""
+        return self.get_template(level, mode).addon
+    
+    def get_template(self, level: AIExpertiseLevel, mode: str) -> "ExpertiseTemplate":
+        """Förkompilerad mall för (nivå, mode) - alla kombinationer byggs vid första anropet"""
+        if not self._templates:
+            with self._templates_lock:
+                if not self._templates:
+                    self._templates = compile_expertise_templates()
+        return self._templates[(level, mode if mode in MODE_ADDONS else "")]
     
     def create_enhanced_prompt(self, base_persona: str, user_query: str, mode: str = "personal") -> str:
         """Skapa fullt förbättrat prompt med AI-expertis och RAG-kontext"""
@@ -173,6 +245,56 @@ class AIExpertIntegration:
         
         return final_prompt
     
+    def get_static_guidelines(self) -> str:
+        """Riktlinjer som hör till det stabila prefixet (persona + riktlinjer)"""
+        return STATIC_AI_GUIDELINES
+    
+    def create_turn_context(self, user_query: str, mode: str = "personal") -> str:
+        """Frågespecifik expertis och RAG-kontext som placeras efter samtalsprefixet
+        
+        Returnerar tom sträng när frågan inte kräver något tillägg.
+        """
+        return self.build_turn_context(user_query, mode).text
+    
+    def build_turn_context(self, user_query: str, mode: str = "personal") -> TurnContext:
+        """Som create_turn_context men med token-antal
+        
+        Expertismallen är förkompilerad med känt token-antal, så per tur räknas bara
+        RAG-kontexten (skarven mellan delarna kan skilja någon enstaka token).
+        """
+        text = ""
+        tokens = 0
+        tokens_saved = 0
+        
+        with span_registry.span("is_ai_related_query"):
+            ai_related = rag_system.is_ai_related_query(user_query)
+        if ai_related:
+            expertise_level = self.detect_expertise_level(user_query)
+            template = self.get_template(expertise_level, mode)
+            text, tokens, tokens_saved = template.turn_block, template.tokens, template.tokens_saved
+            self.template_turns += 1
+            self.template_tokens_saved += tokens_saved
+            self.logger.info(f"Lade till AI-expertis på {expertise_level.value} nivå för aktuell tur")
+        
+        with span_registry.span("rag_retrieval"):
+            rag_context = rag_system.build_context_block(user_query)
+        if rag_context:
+            if text:
+                rag_context = f"\n\n{rag_context}"
+            text += rag_context
+            tokens += count_tokens(rag_context)
+        
+        return TurnContext(text=text, tokens=tokens, template_tokens_saved=tokens_saved)
+    
+    def get_template_stats(self) -> Dict:
+        """Hur många turer som använt en expertismall och vad normaliseringen sparat"""
+        return {
+            'templates_compiled': len(self._templates),
+            'template_turns': self.template_turns,
+            'template_tokens_saved': self.template_tokens_saved,
+            'avg_tokens_saved': self.template_tokens_saved / self.template_turns if self.template_turns else 0.0
+        }
+    
     def get_ai_coaching_guidelines(self, expertise_level: AIExpertiseLevel) -> Dict[str, str]:
         """Hämta coaching-riktlinjer baserat på AI-expertisnivå"""
         
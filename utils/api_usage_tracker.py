@@ -10,6 +10,8 @@ from typing import Dict, List, Optional
 import openai
 from dataclasses import dataclass
 
+from .spans import span_registry
+
 @dataclass
 class APIUsage:
     timestamp: datetime
@@ -20,6 +22,10 @@ class APIUsage:
     cost_usd: float
     session_id: str
     mode: str
+    latency_ms: Optional[float] = None
+    time_to_first_token_ms: Optional[float] = None
+    cached_tokens: int = 0  # Prompt-tokens som leverantören läste från sin prompt-cache
+    batch: bool = False  # Kördes via Batch API (rabatterat pris)
 
 class APIUsageTracker:
     """Spårar API-användning och kostnader"""
@@ -33,8 +39,18 @@ class APIUsageTracker:
         self.pricing = {
             "gpt-4": {"input": 0.03, "output": 0.06},
             "gpt-4-turbo": {"input": 0.01, "output": 0.03},
-            "gpt-3.5-turbo": {"input": 0.0015, "output": 0.002}
+            "gpt-3.5-turbo": {"input": 0.0015, "output": 0.002},
+            "gpt-4o": {"input": 0.0025, "output": 0.01},
+            "gpt-4o-mini": {"input": 0.00015, "output": 0.0006},
+            "gpt-4.1": {"input": 0.002, "output": 0.008},
+            "gpt-4.1-mini": {"input": 0.0004, "output": 0.0016}
         }
+        
+        # Cachade prompt-tokens debiteras med rabatt (andel av ordinarie input-pris)
+        self.cached_input_price_factor = 0.5
+        
+        # Batch API debiteras med rabatt på både input och output
+        self.batch_price_factor = 0.5
     
     def load_usage_history(self):
         """Ladda användningshistorik från fil"""
@@ -51,7 +67,11 @@ class APIUsageTracker:
                             total_tokens=item['total_tokens'],
                             cost_usd=item['cost_usd'],
                             session_id=item['session_id'],
-                            mode=item['mode']
+                            mode=item['mode'],
+                            latency_ms=item.get('latency_ms'),
+                            time_to_first_token_ms=item.get('time_to_first_token_ms'),
+                            cached_tokens=item.get('cached_tokens', 0),
+                            batch=item.get('batch', False)
                         ) for item in data
                     ]
             except Exception as e:
@@ -71,34 +91,64 @@ class APIUsageTracker:
                 'total_tokens': usage.total_tokens,
                 'cost_usd': usage.cost_usd,
                 'session_id': usage.session_id,
-                'mode': usage.mode
+                'mode': usage.mode,
+                'latency_ms': usage.latency_ms,
+                'time_to_first_token_ms': usage.time_to_first_token_ms,
+                'cached_tokens': usage.cached_tokens,
+                'batch': usage.batch
             } for usage in self.usage_history
         ]
         
-        with open(self.usage_file, 'w', encoding='utf-8') as f:
+        with span_registry.span("usage_file_write"), open(self.usage_file, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
     
-    def calculate_cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    def prices_for(self, model: str) -> Dict[str, float]:
+        """Priser för en modell; versionsnamn (t.ex. gpt-4o-2024-08-06) matchas på längsta prefix"""
+        if model in self.pricing:
+            return self.pricing[model]
+        matches = [name for name in self.pricing if model.startswith(name)]
+        if matches:
+            return self.pricing[max(matches, key=len)]
+        return self.pricing["gpt-3.5-turbo"]  # Default fallback
+    
+    def calculate_cost(self, model: str, prompt_tokens: int, completion_tokens: int,
+                       cached_tokens: int = 0, batch: bool = False) -> float:
         """Beräkna kostnad för API-anrop"""
-        if model not in self.pricing:
-            model = "gpt-3.5-turbo"  # Default fallback
+        prices = self.prices_for(model)
         
-        prices = self.pricing[model]
-        
-        input_cost = (prompt_tokens / 1000) * prices["input"]
+        uncached_tokens = prompt_tokens - cached_tokens
+        input_cost = (uncached_tokens / 1000) * prices["input"]
+        input_cost += (cached_tokens / 1000) * prices["input"] * self.cached_input_price_factor
         output_cost = (completion_tokens / 1000) * prices["output"]
         
+        if batch:
+            return (input_cost + output_cost) * self.batch_price_factor
         return input_cost + output_cost
     
-    def track_usage(self, response, session_id: str, mode: str, model: str = "gpt-3.5-turbo"):
-        """Spåra en API-användning"""
+    @staticmethod
+    def _cached_tokens(usage) -> int:
+        """Läs cached_tokens ur usage.prompt_tokens_details (saknas hos äldre modeller)"""
+        details = getattr(usage, 'prompt_tokens_details', None)
+        if details is None:
+            return 0
+        if isinstance(details, dict):
+            return details.get('cached_tokens') or 0
+        return getattr(details, 'cached_tokens', None) or 0
+    
+    def track_usage(self, response, session_id: str, mode: str, model: str = "gpt-3.5-turbo",
+                    latency_ms: Optional[float] = None,
+                    time_to_first_token_ms: Optional[float] = None, batch: bool = False):
+        """Spåra en API-användning (``batch`` för svar som kommit via Batch API)"""
         if hasattr(response, 'usage') and response.usage:
             usage = response.usage
+            cached_tokens = self._cached_tokens(usage)
             
             cost = self.calculate_cost(
                 model=model,
                 prompt_tokens=usage.prompt_tokens,
-                completion_tokens=usage.completion_tokens
+                completion_tokens=usage.completion_tokens,
+                cached_tokens=cached_tokens,
+                batch=batch
             )
             
             api_usage = APIUsage(
@@ -109,7 +159,11 @@ class APIUsageTracker:
                 total_tokens=usage.total_tokens,
                 cost_usd=cost,
                 session_id=session_id,
-                mode=mode
+                mode=mode,
+                latency_ms=latency_ms,
+                time_to_first_token_ms=time_to_first_token_ms,
+                cached_tokens=cached_tokens,
+                batch=batch
             )
             
             self.usage_history.append(api_usage)
@@ -132,17 +186,47 @@ class APIUsageTracker:
             if start_of_day <= u.timestamp < end_of_day
         ]
         
+        ttft_values = [u.time_to_first_token_ms for u in daily_usage 
+                       if u.time_to_first_token_ms is not None]
+        
         return {
+            **self._prompt_cache_stats(daily_usage),
             'total_requests': len(daily_usage),
             'total_tokens': sum(u.total_tokens for u in daily_usage),
             'total_cost_usd': sum(u.cost_usd for u in daily_usage),
             'total_cost_sek': sum(u.cost_usd for u in daily_usage) * 10.5,  # Ungefär växelkurs
+            'avg_time_to_first_token_ms': sum(ttft_values) / len(ttft_values) if ttft_values else None,
+            'batch_requests': len([u for u in daily_usage if u.batch]),
+            'batch_savings_usd': sum(u.cost_usd for u in daily_usage if u.batch)
+                                 * (1 / self.batch_price_factor - 1),
             'by_mode': {
                 mode: len([u for u in daily_usage if u.mode == mode])
                 for mode in set(u.mode for u in daily_usage)
             }
         }
     
+    def _prompt_cache_stats(self, usages: List[APIUsage]) -> Dict:
+        """Andel cachade prompt-tokens, kostnadsbesparing och latens med/utan cacheträff"""
+        prompt_tokens = sum(u.prompt_tokens for u in usages)
+        cached_tokens = sum(u.cached_tokens for u in usages)
+        
+        savings = 0.0
+        for u in usages:
+            if u.cached_tokens:
+                prices = self.prices_for(u.model)
+                savings += (u.cached_tokens / 1000) * prices["input"] * (1 - self.cached_input_price_factor)
+        
+        cached_latency = [u.latency_ms for u in usages if u.cached_tokens and u.latency_ms is not None]
+        uncached_latency = [u.latency_ms for u in usages if not u.cached_tokens and u.latency_ms is not None]
+        
+        return {
+            'cached_tokens': cached_tokens,
+            'cached_token_share': cached_tokens / prompt_tokens if prompt_tokens else 0,
+            'prompt_cache_savings_usd': savings,
+            'avg_latency_ms_cached': sum(cached_latency) / len(cached_latency) if cached_latency else None,
+            'avg_latency_ms_uncached': sum(uncached_latency) / len(uncached_latency) if uncached_latency else None
+        }
+    
     def get_monthly_usage(self) -> Dict:
         """Få månadens användning"""
         now = datetime.now()
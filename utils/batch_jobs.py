@@ -0,0 +1,411 @@
+"""
+Batch Jobs för AI-Coachen
+Icke-brådskande generering (t.ex. AI-förbättring av blogginlägg) köas i tabellen
+batch_jobs, skrivs ut som JSONL i OpenAI Batch API-format och skickas in som en batch.
+Resultaten hämtas asynkront och skrivs tillbaka till blog_posts. Batch API kostar
+halva priset och tar jobben ur UI:ts anropsväg. Har inlägget redigerats medan
+jobbet väntade sparas resultatet på jobbet för granskning i stället
+
+Kör en gång eller bevaka kön från kommandoraden:
+    python -m utils.batch_jobs --once
+    python -m utils.batch_jobs --watch --interval 60
+    python -m utils.batch_jobs --enqueue-post 1
+
+Lokalt utan API-nyckel: starta utils.openai_stub_server och sätt OPENAI_BASE_URL
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import openai
+from openai.types.chat import ChatCompletion
+
+from .api_usage_tracker import usage_tracker
+from .config import Config
+from .data_manager import DataManager
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+JOB_BLOG_ENHANCE = "blog_enhance"
+
+# Slutstatusar för en batch hos OpenAI
+TERMINAL_BATCH_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+BLOG_EDITOR_SYSTEM_PROMPT = (
+    "Du är redaktör för AI-Coachens blogg och expert på AI-coaching och personlig utveckling. "
+    "Du skriver engagerande, praktiskt och professionellt på svenska med markdown-formatering."
+)
+
+def build_blog_enhancement_prompt(content: str, title: str, category: str) -> str:
+    """Prompt för att förbättra ett blogginlägg (samma för interaktiv väg och batch)"""
+    return f"""
+        Som en expert på AI-coaching och personlig utveckling, förbättra följande blogginlägg:
+
+        Titel: {title}
+        Kategori: {category}
+        Ursprungligt innehåll: {content}
+
+        Förbättra innehållet genom att:
+        1. Göra det mer engagerande och läsbart
+        2. Lägga till praktiska tips och exempel
+        3. Strukturera med rubriker och punktlistor
+        4. Använda emojis och coaching-språk
+        5. Lägga till en inspirerande avslutning
+
+        Behåll den ursprungliga tonen men gör det mer professionellt och värdefullt för läsaren.
+        Skriv på svenska och använd markdown-formatering.
+        """
+
+def custom_id_for(job_id: int) -> str:
+    return f"job-{job_id}"
+
+def job_id_from(custom_id: str) -> Optional[int]:
+    try:
+        return int(custom_id.rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+def write_batch_file(jobs: List[Dict], path: str) -> int:
+    """Skriv jobben som JSONL, en begäran per rad i Batch API-format"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for job in jobs:
+            f.write(json.dumps({
+                "custom_id": custom_id_for(job["id"]),
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": job["request_body"]
+            }, ensure_ascii=False) + "\n")
+    return len(jobs)
+
+class BatchJobRunner:
+    """Köar, skickar in och tar emot batch-jobb
+
+    Jobbens livscykel: queued → submitting → submitted → completed/review/failed.
+    Jobb i en batch som gått ut eller avbrutits utan svar läggs tillbaka i kön.
+    Claim-id:t skickas med som metadata på batchen, så jobb som fastnat i
+    ``submitting`` (processen dog mellan claim och statusuppdatering) kan stämmas
+    av mot OpenAI: finns batchen flyttas de till den, annars tillbaka till kön.
+    ``review`` betyder att inlägget ändrats sedan jobbet köades; resultatet ligger
+    kvar på jobbet tills en admin applicerar eller kastar det.
+    """
+
+    def __init__(self, data_manager: DataManager = None, client=None, api_key: str = None,
+                 base_url: str = None, model: str = None, batch_dir: str = None,
+                 max_requests_per_file: int = None, completion_window: str = None,
+                 claim_timeout_seconds: float = None):
+        self.logger = logging.getLogger(__name__)
+        self.data_manager = data_manager or DataManager()
+        self._client = client
+        self.api_key = api_key or Config.OPENAI_API_KEY
+        self.base_url = base_url or Config.OPENAI_BASE_URL
+        self.model = model or Config.AI_MODEL
+        self.batch_dir = batch_dir or Config.BATCH_DIR
+        self.max_requests_per_file = max_requests_per_file or Config.BATCH_MAX_REQUESTS_PER_FILE
+        self.completion_window = completion_window or Config.BATCH_COMPLETION_WINDOW
+        self.claim_timeout_seconds = (claim_timeout_seconds if claim_timeout_seconds is not None
+                                      else Config.BATCH_CLAIM_TIMEOUT_SECONDS)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {"submitted_batches": 0, "submitted_jobs": 0,
+                      "completed_jobs": 0, "failed_jobs": 0, "requeued_jobs": 0,
+                      "reconciled_jobs": 0}
+
+    @property
+    def client(self):
+        """OpenAI-klienten skapas först när något ska skickas in"""
+        if self._client is None:
+            self._client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._client
+
+    def enqueue_blog_enhancement(self, post_id: int, content: str, title: str, category: str,
+                                 publish: bool = False) -> Optional[int]:
+        """Köa AI-förbättring av ett blogginlägg; ``publish`` publicerar när resultatet kommit"""
+        request_body = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": BLOG_EDITOR_SYSTEM_PROMPT},
+                {"role": "user", "content": build_blog_enhancement_prompt(content, title, category)}
+            ],
+            "max_tokens": Config.MAX_TOKENS,
+            "temperature": Config.TEMPERATURE
+        }
+        job_id = self.data_manager.queue_batch_job(
+            JOB_BLOG_ENHANCE, request_body, post_id=post_id,
+            options={"publish": publish, "base_content": content}
+        )
+        if job_id:
+            self.logger.info(f"Köade batch-jobb {job_id} för blogginlägg {post_id}")
+        return job_id
+
+    def submit_pending(self) -> Optional[str]:
+        """Skicka in köade jobb som en batch; returnerar batch-id (None om kön är tom)"""
+        queued = self.data_manager.get_batch_jobs(status="queued", limit=self.max_requests_per_file)
+        if not queued:
+            return None
+
+        # Ta raderna innan något skickas - en annan process kan ha läst samma kö
+        claim_id = f"claim-{uuid.uuid4().hex}"
+        jobs = self.data_manager.claim_batch_jobs([job["id"] for job in queued], claim_id)
+        if not jobs:
+            return None
+
+        path = os.path.join(self.batch_dir, f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl")
+        try:
+            write_batch_file(jobs, path)
+            with open(path, "rb") as f:
+                input_file = self.client.files.create(file=f, purpose="batch")
+            batch = self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=self.completion_window,
+                metadata={"claim_id": claim_id}
+            )
+        except Exception:
+            # Ingen batch skapades - släpp jobben tillbaka till kön
+            self.data_manager.resolve_batch_claim(claim_id, "queued")
+            raise
+
+        if self.data_manager.resolve_batch_claim(claim_id, "submitted", batch.id) != len(jobs):
+            # Batchen finns hos OpenAI men raderna pekar inte (alla) på den;
+            # recover_stale_claims hittar den via claim-id:t i metadata
+            self.logger.error(f"Batch {batch.id} skapades men jobben {[job['id'] for job in jobs]} "
+                              f"kunde inte markeras som inskickade ({claim_id})")
+            raise RuntimeError(f"Batch {batch.id} skapades men jobben kunde inte markeras som inskickade")
+
+        self.stats["submitted_batches"] += 1
+        self.stats["submitted_jobs"] += len(jobs)
+        self.logger.info(f"Skickade in batch {batch.id} med {len(jobs)} jobb ({path})")
+        return batch.id
+
+    def recover_stale_claims(self) -> Dict[str, int]:
+        """Stäm av jobb som legat i 'submitting' längre än ``claim_timeout_seconds``
+
+        Skapades en batch för claimen (metadata.claim_id) flyttas jobben till den och
+        tas emot av ``poll``; annars skickades inget och de läggs tillbaka i kön.
+        """
+        counts = {"reconciled": 0, "requeued": 0}
+        stale = self.data_manager.get_batch_jobs(status="submitting", stale_seconds=self.claim_timeout_seconds)
+        claim_ids = {job["batch_id"] for job in stale}
+        if not claim_ids:
+            return counts
+
+        batches = self._batches_for_claims(claim_ids)
+        for claim_id in sorted(claim_ids):
+            batch_id = batches.get(claim_id)
+            if batch_id:
+                moved = self.data_manager.resolve_batch_claim(claim_id, "submitted", batch_id)
+                counts["reconciled"] += max(moved, 0)
+                self.logger.warning(f"Stämde av {moved} jobb i {claim_id} mot batch {batch_id}")
+            else:
+                moved = self.data_manager.resolve_batch_claim(claim_id, "queued")
+                counts["requeued"] += max(moved, 0)
+                self.logger.warning(f"Ingen batch för {claim_id} - {moved} jobb tillbaka i kön")
+
+        self.stats["reconciled_jobs"] += counts["reconciled"]
+        self.stats["requeued_jobs"] += counts["requeued"]
+        return counts
+
+    def _batches_for_claims(self, claim_ids: set) -> Dict[str, str]:
+        """Batch-id per claim-id, från metadata på batcharna hos OpenAI (nyast först)"""
+        found = {}
+        for batch in self.client.batches.list(limit=100):
+            claim_id = (batch.metadata or {}).get("claim_id")
+            if claim_id in claim_ids:
+                found[claim_id] = batch.id
+                if len(found) == len(claim_ids):
+                    break
+        return found
+
+    def poll(self) -> Dict[str, int]:
+        """Hämta status för inskickade batchar och ta emot färdiga resultat"""
+        counts = {"completed": 0, "failed": 0, "requeued": 0, "pending": 0}
+        submitted = self.data_manager.get_batch_jobs(status="submitted")
+
+        jobs_by_batch: Dict[str, List[Dict]] = {}
+        for job in submitted:
+            jobs_by_batch.setdefault(job["batch_id"], []).append(job)
+
+        for batch_id, jobs in jobs_by_batch.items():
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status not in TERMINAL_BATCH_STATUSES:
+                counts["pending"] += len(jobs)
+                continue
+
+            for key, value in self._ingest(batch, jobs).items():
+                counts[key] += value
+
+        for key in ("completed", "failed", "requeued"):
+            self.stats[f"{key}_jobs"] += counts[key]
+        return counts
+
+    def _ingest(self, batch, jobs: List[Dict]) -> Dict[str, int]:
+        """Skriv tillbaka en avslutad batchs resultat och hantera jobb utan svar"""
+        counts = {"completed": 0, "failed": 0, "requeued": 0}
+        jobs_by_id = {job["id"]: job for job in jobs}
+
+        for record in self._read_results(batch.output_file_id) + self._read_results(batch.error_file_id):
+            job = jobs_by_id.pop(job_id_from(record.get("custom_id", "")), None)
+            if job is None:
+                continue
+
+            response = record.get("response") or {}
+            if response.get("status_code") == 200 and not record.get("error"):
+                self._complete_job(job, response["body"], batch.id)
+                counts["completed"] += 1
+            else:
+                error = record.get("error") or (response.get("body") or {}).get("error") or {}
+                message = error.get("message", f"HTTP {response.get('status_code')}")
+                self.data_manager.update_batch_jobs([job["id"]], status="failed", error=message)
+                self.logger.warning(f"Batch-jobb {job['id']} misslyckades: {message}")
+                counts["failed"] += 1
+
+        if jobs_by_id:
+            if batch.status in ("expired", "cancelled"):
+                # Ej körda inom completion window - försök igen i nästa batch
+                self.data_manager.update_batch_jobs(list(jobs_by_id), status="queued", batch_id=None)
+                counts["requeued"] += len(jobs_by_id)
+            else:
+                self.data_manager.update_batch_jobs(
+                    list(jobs_by_id), status="failed", error=f"Inget svar i batch {batch.id} ({batch.status})"
+                )
+                counts["failed"] += len(jobs_by_id)
+
+        self.logger.info(f"Batch {batch.id} ({batch.status}): {counts}")
+        return counts
+
+    def _read_results(self, file_id: Optional[str]) -> List[Dict]:
+        if not file_id:
+            return []
+        text = self.client.files.content(file_id).text
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    def _complete_job(self, job: Dict, body: Dict, batch_id: str):
+        """Spara resultatet på jobbet och skriv det till blogginlägget om det är orört"""
+        completion = ChatCompletion.model_validate(body)
+        content = completion.choices[0].message.content or ""
+
+        usage_tracker.track_usage(completion, session_id=f"batch_{batch_id}", mode="batch",
+                                  model=job["request_body"].get("model", self.model), batch=True)
+
+        status = "completed"
+        if job["job_type"] == JOB_BLOG_ENHANCE and job.get("post_id"):
+            base_content = job["options"].get("base_content")
+            # Villkorlig skrivning: bara om innehållet är detsamma som när jobbet köades
+            if base_content is None or not self.data_manager.update_blog_post(
+                job["post_id"], expected_content=base_content, **self._post_updates(job, content)
+            ):
+                status = "review"
+                self.logger.info(f"Blogginlägg {job['post_id']} har ändrats sedan jobb {job['id']} "
+                                 f"köades - resultatet väntar på granskning")
+
+        self.data_manager.update_batch_jobs([job["id"]], status=status, result=content)
+
+    @staticmethod
+    def _post_updates(job: Dict, content: str) -> Dict:
+        updates = {"content": content}
+        if job["options"].get("publish"):
+            updates["published"] = True
+        return updates
+
+    def get_review_jobs(self) -> List[Dict]:
+        """Färdiga resultat som inte skrevs till inlägget eftersom det redigerats"""
+        return self.data_manager.get_batch_jobs(status="review")
+
+    def apply_review(self, job: Dict) -> bool:
+        """Skriv ett granskat resultat till inlägget (ersätter det nuvarande innehållet)"""
+        if not self.data_manager.update_blog_post(job["post_id"], **self._post_updates(job, job["result"])):
+            return False
+        return self.data_manager.update_batch_jobs([job["id"]], status="completed")
+
+    def discard_review(self, job: Dict) -> bool:
+        """Behåll inläggets nuvarande innehåll och kasta resultatet"""
+        return self.data_manager.update_batch_jobs([job["id"]], status="discarded")
+
+    def run_once(self) -> Dict:
+        """Stäm av hängande claims, ta emot färdiga batchar och skicka in nya köade jobb"""
+        with self._lock:
+            recovered = self.recover_stale_claims()
+            counts = self.poll()
+            counts["reconciled"] = recovered["reconciled"]
+            counts["requeued"] += recovered["requeued"]
+            counts["submitted_batch"] = self.submit_pending()
+            return counts
+
+    def start(self, interval_seconds: float = None) -> "BatchJobRunner":
+        """Kör ``run_once`` i en bakgrundstråd tills ``stop`` anropas"""
+        if self._thread and self._thread.is_alive():
+            return self
+        interval = interval_seconds if interval_seconds is not None else Config.BATCH_POLL_INTERVAL_SECONDS
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    # Nätverksfel m.m. - jobben ligger kvar och tas i nästa varv
+                    self.logger.warning(f"Batch-körning misslyckades: {str(e)}")
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=loop, name="batch-jobs", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def get_stats(self) -> Dict:
+        """Räknare för denna process plus köns aktuella storlek"""
+        return {
+            **self.stats,
+            "queued": len(self.data_manager.get_batch_jobs(status="queued")),
+            "submitting": len(self.data_manager.get_batch_jobs(status="submitting")),
+            "submitted": len(self.data_manager.get_batch_jobs(status="submitted")),
+            "review": len(self.data_manager.get_batch_jobs(status="review"))
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-jobb för AI-Coachen")
+    parser.add_argument("--once", action="store_true", help="Ta emot och skicka in en gång")
+    parser.add_argument("--watch", action="store_true", help="Bevaka kön tills Ctrl+C")
+    parser.add_argument("--interval", type=float, default=Config.BATCH_POLL_INTERVAL_SECONDS)
+    parser.add_argument("--enqueue-post", type=int, metavar="POST_ID",
+                        help="Köa AI-förbättring av ett befintligt blogginlägg")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=Config.LOG_LEVEL)
+    runner = BatchJobRunner()
+
+    if args.enqueue_post:
+        posts = [p for p in runner.data_manager.get_blog_posts(published_only=False) if p["id"] == args.enqueue_post]
+        if not posts:
+            print(f"❌ Blogginlägg {args.enqueue_post} finns inte")
+            return
+        post = posts[0]
+        job_id = runner.enqueue_blog_enhancement(post["id"], post["content"], post["title"], post["category"])
+        print(f"📥 Köade jobb {job_id} för '{post['title']}'")
+
+    if args.watch:
+        print(f"👀 Bevakar batch-kön var {args.interval:.0f}:e sekund (Ctrl+C avslutar)")
+        runner.start(args.interval)
+        try:
+            runner._thread.join()
+        except KeyboardInterrupt:
+            runner.stop()
+    elif args.once or not args.enqueue_post:
+        print(f"📦 {runner.run_once()}")
+    print(f"📊 {runner.get_stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,8 @@ class Config:
     # API Keys
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+    # OpenAI-kompatibel endpoint (t.ex. lokal stub-server för benchmarks), None = OpenAI
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
     
     # Database
     DATABASE_PATH = os.getenv("DATABASE_PATH", "data/coach_data.db")
@@ -37,6 +39,90 @@ class Config:
     MAX_TOKENS = int(os.getenv("MAX_TOKENS", "4000"))
     TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
     
+    # Async coach - max antal samtidiga OpenAI-anrop per process
+    ASYNC_MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", "20"))
+    
+    # Svarscache för första turer och föreslagna frågor
+    ENABLE_RESPONSE_CACHE = os.getenv("ENABLE_RESPONSE_CACHE", "true").lower() == "true"
+    RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "data/response_cache.db")
+    RESPONSE_CACHE_TTL_HOURS = float(os.getenv("RESPONSE_CACHE_TTL_HOURS", "24"))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    
+    # Semantisk cache för nästan identiska förstafrågor
+    ENABLE_SEMANTIC_CACHE = os.getenv("ENABLE_SEMANTIC_CACHE", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "500"))
+    
+    # Kunskapsbasens sökning: "bm25" (BM25F med svensk/engelsk tokenisering) eller "jaccard"
+    RAG_SCORER = os.getenv("RAG_SCORER", "bm25")
+    RAG_BM25_MIN_SCORE = float(os.getenv("RAG_BM25_MIN_SCORE", "1.0"))
+    # Dokumentembeddings för AdvancedRAGSystem (mmappade .npy-filer per modell)
+    RAG_EMBEDDING_CACHE_DIR = os.getenv("RAG_EMBEDDING_CACHE_DIR", "data/embeddings")
+    
+    # Sessionsregister (delad coach-motor för alla användare)
+    SESSION_REGISTRY_MAX_ACTIVE = int(os.getenv("SESSION_REGISTRY_MAX_ACTIVE", "500"))
+    SESSION_IDLE_TIMEOUT_MINUTES = float(os.getenv("SESSION_IDLE_TIMEOUT_MINUTES", "30"))
+    
+    # Write-behind: sessioner och meddelanden sparas i bakgrunden i batchar
+    ENABLE_WRITE_BEHIND = os.getenv("ENABLE_WRITE_BEHIND", "true").lower() == "true"
+    WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "1000"))
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+    WRITE_BEHIND_FLUSH_INTERVAL_SECONDS = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_SECONDS", "0.5"))
+    WRITE_BEHIND_PUT_TIMEOUT_SECONDS = float(os.getenv("WRITE_BEHIND_PUT_TIMEOUT_SECONDS", "2"))
+    WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "5"))
+    WRITE_BEHIND_RETRY_BACKOFF_SECONDS = float(os.getenv("WRITE_BEHIND_RETRY_BACKOFF_SECONDS", "0.5"))
+    
+    # Återupptagning av sparade sessioner (bara fönstret som kontexten behöver laddas)
+    RESUME_PAGE_SIZE = int(os.getenv("RESUME_PAGE_SIZE", "50"))
+    RESUME_MAX_MESSAGES = int(os.getenv("RESUME_MAX_MESSAGES", "400"))
+    
+    # Långtidsminne per användare (aktiveras med ENABLE_MEMORY)
+    MEMORY_DB_PATH = os.getenv("MEMORY_DB_PATH", "data/memory.db")
+    MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "5"))
+    MEMORY_BUDGET_TOKENS = int(os.getenv("MEMORY_BUDGET_TOKENS", "300"))
+    MEMORY_MIN_SIMILARITY = float(os.getenv("MEMORY_MIN_SIMILARITY", "0.2"))
+    MEMORY_MAX_PER_USER = int(os.getenv("MEMORY_MAX_PER_USER", "500"))
+    MEMORY_MIN_USER_MESSAGES = int(os.getenv("MEMORY_MIN_USER_MESSAGES", "2"))
+    
+    # Tidsmätning per steg i en tur (andel turer som mäts)
+    ENABLE_SPANS = os.getenv("ENABLE_SPANS", "true").lower() == "true"
+    SPAN_SAMPLE_RATE = float(os.getenv("SPAN_SAMPLE_RATE", "0.1"))
+    
+    # Motståndskraftiga API-anrop (deadline, retries, hedging, circuit breaker)
+    OPENAI_REQUEST_DEADLINE_SECONDS = float(os.getenv("OPENAI_REQUEST_DEADLINE_SECONDS", "30"))
+    OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+    OPENAI_RETRY_BASE_SECONDS = float(os.getenv("OPENAI_RETRY_BASE_SECONDS", "0.5"))
+    OPENAI_RETRY_MAX_SECONDS = float(os.getenv("OPENAI_RETRY_MAX_SECONDS", "8"))
+    ENABLE_HEDGED_REQUESTS = os.getenv("ENABLE_HEDGED_REQUESTS", "false").lower() == "true"
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_BREAKER_RESET_SECONDS = float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", "30"))
+    
+    # Affiliate-katalog (laddas om automatiskt när filen ändras)
+    AFFILIATE_CATALOG_PATH = os.getenv("AFFILIATE_CATALOG_PATH", "data/affiliate_catalog.json")
+    AFFILIATE_CATALOG_RELOAD_SECONDS = float(os.getenv("AFFILIATE_CATALOG_RELOAD_SECONDS", "5"))
+    
+    # Modellrouter: modellnivå per tur utifrån expertisnivå, läge och dagsbudget
+    ENABLE_MODEL_ROUTER = os.getenv("ENABLE_MODEL_ROUTER", "false").lower() == "true"
+    MODEL_TIER_ECONOMY = os.getenv("MODEL_TIER_ECONOMY", "gpt-4o-mini")
+    MODEL_TIER_STANDARD = os.getenv("MODEL_TIER_STANDARD", "gpt-4.1-mini")
+    MODEL_TIER_PREMIUM = os.getenv("MODEL_TIER_PREMIUM", "gpt-4o")
+    DAILY_BUDGET_USD = float(os.getenv("DAILY_BUDGET_USD", "5"))
+    MODEL_ROUTER_LOG_PATH = os.getenv("MODEL_ROUTER_LOG_PATH", "data/model_routing.jsonl")
+    
+    # Idempotensnycklar och single-flight för chattinlämningar
+    IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "300"))
+    IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "120"))
+    
+    # Batch-jobb för icke-interaktiv generering (halva priset, svar inom completion window)
+    ENABLE_BATCH_JOBS = os.getenv("ENABLE_BATCH_JOBS", "true").lower() == "true"
+    BATCH_DIR = os.getenv("BATCH_DIR", "data/batches")
+    BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+    BATCH_MAX_REQUESTS_PER_FILE = int(os.getenv("BATCH_MAX_REQUESTS_PER_FILE", "1000"))
+    BATCH_POLL_INTERVAL_SECONDS = float(os.getenv("BATCH_POLL_INTERVAL_SECONDS", "60"))
+    # Jobb som fastnat i 'submitting' så länge stäms av mot OpenAI (process dog efter claim)
+    BATCH_CLAIM_TIMEOUT_SECONDS = float(os.getenv("BATCH_CLAIM_TIMEOUT_SECONDS", "900"))
+    
     @classmethod
     def validate_config(cls) -> Dict[str, Any]:
         """Validera konfiguration"""
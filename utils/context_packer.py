@@ -0,0 +1,109 @@
+"""
+Context Packer för AI-Coachen
+Packar system-prompt, RAG-kontext, rullande sammanfattning och historik inom en
+explicit token-budget så att prompt-storleken är förutsägbar oavsett sessionslängd
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List
+
+# Ungefärlig overhead per chat-meddelande (roll och formattering)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Sammanfattning av tidigare delar av samtalet:\n"
+
+@dataclass
+class PackedContext:
+    """Resultat av en packning"""
+    messages: List[Dict]
+    prompt_tokens: int
+    first_included: int  # Index i historiken för äldsta medtagna meddelande
+    included_count: int
+
+class ContextPacker:
+    """Väljer de nyaste meddelandena som ryms i budgeten
+    
+    Historiken består av meddelandeposter med attributen role, content och tokens.
+    """
+    
+    def __init__(self, budget_tokens: int, summary_trigger_tokens: int = 1000):
+        self.budget_tokens = budget_tokens
+        # Hur mycket utfallen historik som måste samlas innan sammanfattningen görs om
+        self.summary_trigger_tokens = summary_trigger_tokens
+    
+    def pack(self, system_prompt: str, system_tokens: int, history: List,
+             summary: str = "", summary_tokens: int = 0,
+             turn_context: str = "", turn_context_tokens: int = 0) -> PackedContext:
+        """Packa historik (utan system-meddelande) nyast först inom budgeten
+        
+        Det senaste meddelandet tas alltid med, även om det ensamt spränger budgeten.
+        Layouten är prefix-stabil: system-prompt, sammanfattning och historik kommer
+        först och är identiska mellan turer, medan ``turn_context`` (RAG-kontext och
+        expertis för aktuell fråga) läggs precis före det senaste meddelandet.
+        """
+        used = system_tokens + MESSAGE_OVERHEAD_TOKENS
+        if summary:
+            used += summary_tokens + MESSAGE_OVERHEAD_TOKENS
+        if turn_context:
+            used += turn_context_tokens + MESSAGE_OVERHEAD_TOKENS
+        
+        first_included = len(history)
+        for index in range(len(history) - 1, -1, -1):
+            cost = history[index].tokens + MESSAGE_OVERHEAD_TOKENS
+            if used + cost > self.budget_tokens and index < len(history) - 1:
+                break
+            used += cost
+            first_included = index
+        
+        messages = [{"role": "system", "content": system_prompt}]
+        # Sammanfattningen behövs bara om något faktiskt fallit ur fönstret
+        if summary and first_included > 0:
+            messages.append({"role": "system", "content": SUMMARY_PREFIX + summary})
+        elif summary:
+            used -= summary_tokens + MESSAGE_OVERHEAD_TOKENS
+        
+        for msg in history[first_included:-1]:
+            messages.append({"role": msg.role, "content": msg.content})
+        
+        # Frågespecifikt innehåll efter det stabila prefixet
+        if turn_context:
+            messages.append({"role": "system", "content": turn_context})
+        if history:
+            messages.append({"role": history[-1].role, "content": history[-1].content})
+        
+        return PackedContext(
+            messages=messages,
+            prompt_tokens=used,
+            first_included=first_included,
+            included_count=len(history) - first_included
+        )
+    
+    def pending_for_summary(self, history: List, summarized_count: int,
+                            first_included: int) -> List:
+        """Utfallna meddelanden som ännu inte sammanfattats, om de nått tröskeln"""
+        pending = history[summarized_count:first_included]
+        if sum(msg.tokens for msg in pending) < self.summary_trigger_tokens:
+            return []
+        return pending
+    
+    @staticmethod
+    def build_summary_messages(previous_summary: str, pending: List) -> List[Dict]:
+        """Bygg prompt för att uppdatera den rullande sammanfattningen"""
+        transcript = "\n".join(f"{msg.role}: {msg.content}" for msg in pending)
+        return [
+            {
+                "role": "system",
+                "content": (
+                    "Du sammanfattar coaching-samtal. Skriv en kompakt sammanfattning på svenska "
+                    "(max 150 ord) med användarens mål, utmaningar, beslut och viktiga fakta. "
+                    "Utelämna hälsningsfraser och länkar."
+                )
+            },
+            {
+                "role": "user",
+                "content": (
+                    f"Tidigare sammanfattning:\n{previous_summary or '(ingen)'}\n\n"
+                    f"Nya meddelanden att väva in:\n{transcript}"
+                )
+            }
+        ]
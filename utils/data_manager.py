@@ -135,6 +135,10 @@ class DataManager:
                 )
             """)
             
+            # Rullande sammanfattning (tillagt i efterhand)
+            cursor.execute("ALTER TABLE coaching_sessions ADD COLUMN IF NOT EXISTS summary TEXT")
+            cursor.execute("ALTER TABLE coaching_sessions ADD COLUMN IF NOT EXISTS summarized_count INTEGER DEFAULT 0")
+            
             # Messages tabell
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS messages (
@@ -148,6 +152,29 @@ class DataManager:
                 )
             """)
             
+            # Meddelandemetadata (tokens, annoteringar) som SQLite-schemat redan har
+            cursor.execute("ALTER TABLE messages ADD COLUMN IF NOT EXISTS metadata TEXT")
+            
+            # Keyset-paginering av en sessions meddelanden (nyast först)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages (session_id, id)")
+            
+            # Batch-jobb (icke-interaktiv generering via OpenAI Batch API)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS batch_jobs (
+                    id SERIAL PRIMARY KEY,
+                    job_type VARCHAR(50) NOT NULL,
+                    post_id INTEGER REFERENCES blog_posts(id) ON DELETE CASCADE,
+                    request_body TEXT NOT NULL,
+                    options TEXT,
+                    status VARCHAR(20) DEFAULT 'queued',
+                    batch_id VARCHAR(255),
+                    result TEXT,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
             conn.commit()
     
     def _init_sqlite_schema(self):
@@ -204,6 +231,10 @@ class DataManager:
                 )
             """)
             
+            # Rullande sammanfattning (tillagt i efterhand)
+            self._ensure_sqlite_column(cursor, "coaching_sessions", "summary", "TEXT")
+            self._ensure_sqlite_column(cursor, "coaching_sessions", "summarized_count", "INTEGER DEFAULT 0")
+            
             # Messages tabell
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS messages (
@@ -217,6 +248,9 @@ class DataManager:
                 )
             """)
             
+            # Keyset-paginering av en sessions meddelanden (nyast först)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages (session_id, id)")
+            
             # Personal goals tabell
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS personal_goals (
@@ -300,60 +334,116 @@ class DataManager:
                 )
             """)
             
+            # Batch-jobb (icke-interaktiv generering via OpenAI Batch API)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS batch_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_type TEXT NOT NULL,
+                    post_id INTEGER,
+                    request_body TEXT NOT NULL,
+                    options TEXT,
+                    status TEXT DEFAULT 'queued',
+                    batch_id TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (post_id) REFERENCES blog_posts (id)
+                )
+            """)
+            
             conn.commit()
     
+    @staticmethod
+    def _ensure_sqlite_column(cursor, table: str, column: str, definition: str):
+        """Lägg till kolumn i befintlig SQLite-tabell om den saknas"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
     def save_session(self, session_data: Dict) -> bool:
-        """Spara coaching session"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    INSERT OR REPLACE INTO coaching_sessions 
-                    (id, user_id, mode, start_time, end_time, message_count, context, goals, progress_notes)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    session_data['session_id'],
-                    session_data['user_id'],
-                    session_data['mode'],
-                    session_data['start_time'],
-                    session_data.get('end_time'),
-                    session_data.get('message_count', 0),
-                    json.dumps(session_data.get('context', {})),
-                    json.dumps(session_data.get('goals', [])),
-                    session_data.get('progress_notes', '')
-                ))
-                
-                conn.commit()
-                return True
-                
-        except Exception as e:
-            self.logger.error(f"Error saving session: {str(e)}")
-            return False
+        """Spara coaching session (samma backend som write-behind-kön)"""
+        return self.save_sessions_batch([session_data], [])
     
     def save_message(self, session_id: str, role: str, content: str, 
                     timestamp: str, metadata: Dict = None) -> bool:
-        """Spara meddelande"""
+        """Spara meddelande (samma backend som write-behind-kön)"""
+        return self.save_sessions_batch([], [{
+            'session_id': session_id,
+            'role': role,
+            'content': content,
+            'timestamp': timestamp,
+            'metadata': metadata
+        }])
+    
+    def save_sessions_batch(self, sessions: List[Dict], messages: List[Dict]) -> bool:
+        """Spara sessioner och meddelanden i en transaktion (write-behind-kön)
+        
+        ``sessions`` har samma format som save_session, ``messages`` har nycklarna
+        session_id, role, content, timestamp och metadata.
+        """
+        if not sessions and not messages:
+            return True
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            session_params = [(
+                session_data['session_id'],
+                session_data['user_id'],
+                session_data['mode'],
+                session_data['start_time'],
+                session_data.get('end_time'),
+                session_data.get('message_count', 0),
+                json.dumps(session_data.get('context', {})),
+                json.dumps(session_data.get('goals', [])),
+                session_data.get('progress_notes', ''),
+                session_data.get('summary', ''),
+                session_data.get('summarized_count', 0)
+            ) for session_data in sessions]
+            message_params = [(
+                message['session_id'],
+                message['role'],
+                message['content'],
+                message['timestamp'],
+                json.dumps(message['metadata']) if message.get('metadata') else None
+            ) for message in messages]
+            
+            with self._get_connection() as conn:
                 cursor = conn.cursor()
-                
-                cursor.execute("""
-                    INSERT INTO messages (session_id, role, content, timestamp, metadata)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (
-                    session_id,
-                    role,
-                    content,
-                    timestamp,
-                    json.dumps(metadata) if metadata else None
-                ))
+                if self.use_postgres:
+                    cursor.executemany("""
+                        INSERT INTO coaching_sessions 
+                        (id, user_id, mode, start_time, end_time, message_count, context, goals, progress_notes,
+                         summary, summarized_count)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        ON CONFLICT (id) DO UPDATE SET
+                            end_time = EXCLUDED.end_time,
+                            message_count = EXCLUDED.message_count,
+                            context = EXCLUDED.context,
+                            goals = EXCLUDED.goals,
+                            progress_notes = EXCLUDED.progress_notes,
+                            summary = EXCLUDED.summary,
+                            summarized_count = EXCLUDED.summarized_count
+                    """, session_params)
+                    cursor.executemany("""
+                        INSERT INTO messages (session_id, role, content, timestamp, metadata)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """, message_params)
+                else:
+                    cursor.executemany("""
+                        INSERT OR REPLACE INTO coaching_sessions 
+                        (id, user_id, mode, start_time, end_time, message_count, context, goals, progress_notes,
+                         summary, summarized_count)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, session_params)
+                    cursor.executemany("""
+                        INSERT INTO messages (session_id, role, content, timestamp, metadata)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, message_params)
                 
                 conn.commit()
                 return True
                 
         except Exception as e:
-            self.logger.error(f"Error saving message: {str(e)}")
+            self.logger.error(f"Error saving session batch: {str(e)}")
             return False
     
     def save_personal_goal(self, goal_data: Dict) -> bool:
@@ -486,25 +576,27 @@ class DataManager:
     def load_user_sessions(self, user_id: str) -> List[Dict]:
         """Ladda användarens coaching sessions"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            placeholder = "%s" if self.use_postgres else "?"
+            with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("""
+                cursor.execute(f"""
                     SELECT * FROM coaching_sessions 
-                    WHERE user_id = ? 
+                    WHERE user_id = {placeholder} 
                     ORDER BY start_time DESC
                 """, (user_id,))
                 
-                rows = cursor.fetchall()
-                columns = [desc[0] for desc in cursor.description]
+                if self.use_postgres:
+                    sessions = [dict(row) for row in cursor.fetchall()]
+                else:
+                    rows = cursor.fetchall()
+                    columns = [desc[0] for desc in cursor.description]
+                    sessions = [dict(zip(columns, row)) for row in rows]
                 
-                sessions = []
-                for row in rows:
-                    session_dict = dict(zip(columns, row))
+                for session_dict in sessions:
                     # Parse JSON fields
                     session_dict['context'] = json.loads(session_dict['context']) if session_dict['context'] else {}
                     session_dict['goals'] = json.loads(session_dict['goals']) if session_dict['goals'] else []
-                    sessions.append(session_dict)
                 
                 return sessions
                 
@@ -512,26 +604,53 @@ class DataManager:
             self.logger.error(f"Error loading user sessions: {str(e)}")
             return []
     
+    def load_session(self, session_id: str) -> Optional[Dict]:
+        """Ladda en enskild coaching session"""
+        try:
+            placeholder = "%s" if self.use_postgres else "?"
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(f"SELECT * FROM coaching_sessions WHERE id = {placeholder}", (session_id,))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                
+                if self.use_postgres:
+                    session_dict = dict(row)
+                else:
+                    columns = [desc[0] for desc in cursor.description]
+                    session_dict = dict(zip(columns, row))
+                session_dict['context'] = json.loads(session_dict['context']) if session_dict['context'] else {}
+                session_dict['goals'] = json.loads(session_dict['goals']) if session_dict['goals'] else []
+                return session_dict
+                
+        except Exception as e:
+            self.logger.error(f"Error loading session: {str(e)}")
+            return None
+    
     def load_session_messages(self, session_id: str) -> List[Dict]:
         """Ladda meddelanden för session"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            placeholder = "%s" if self.use_postgres else "?"
+            with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("""
+                cursor.execute(f"""
                     SELECT * FROM messages 
-                    WHERE session_id = ? 
-                    ORDER BY timestamp
+                    WHERE session_id = {placeholder} 
+                    ORDER BY id
                 """, (session_id,))
                 
-                rows = cursor.fetchall()
-                columns = [desc[0] for desc in cursor.description]
+                if self.use_postgres:
+                    messages = [dict(row) for row in cursor.fetchall()]
+                else:
+                    rows = cursor.fetchall()
+                    columns = [desc[0] for desc in cursor.description]
+                    messages = [dict(zip(columns, row)) for row in rows]
                 
-                messages = []
-                for row in rows:
-                    message_dict = dict(zip(columns, row))
+                for message_dict in messages:
                     message_dict['metadata'] = json.loads(message_dict['metadata']) if message_dict['metadata'] else {}
-                    messages.append(message_dict)
                 
                 return messages
                 
@@ -539,6 +658,65 @@ class DataManager:
             self.logger.error(f"Error loading session messages: {str(e)}")
             return []
     
+    def load_session_messages_page(self, session_id: str, before_id: int = None,
+                                   limit: int = 50) -> List[Dict]:
+        """Ladda en sida meddelanden äldre än ``before_id`` (keyset-paginering)
+        
+        Sidan hämtas nyast först via indexet på (session_id, id) men returneras i
+        kronologisk ordning. ``before_id=None`` ger de senaste meddelandena.
+        """
+        try:
+            placeholder = "%s" if self.use_postgres else "?"
+            params = [session_id]
+            before_clause = ""
+            if before_id is not None:
+                before_clause = f"AND id < {placeholder}"
+                params.append(before_id)
+            params.append(int(limit))
+            
+            query = f"""
+                SELECT id, session_id, role, content, timestamp, metadata FROM messages
+                WHERE session_id = {placeholder} {before_clause}
+                ORDER BY id DESC
+                LIMIT {placeholder}
+            """
+            
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                
+                if self.use_postgres:
+                    messages = [dict(row) for row in cursor.fetchall()]
+                else:
+                    rows = cursor.fetchall()
+                    columns = [desc[0] for desc in cursor.description]
+                    messages = [dict(zip(columns, row)) for row in rows]
+                
+                for message_dict in messages:
+                    message_dict['metadata'] = json.loads(message_dict['metadata']) if message_dict['metadata'] else {}
+                
+                messages.reverse()
+                return messages
+                
+        except Exception as e:
+            self.logger.error(f"Error loading session message page: {str(e)}")
+            return []
+    
+    def count_session_messages(self, session_id: str) -> int:
+        """Antal sparade meddelanden i en session"""
+        try:
+            placeholder = "%s" if self.use_postgres else "?"
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT COUNT(*) AS count FROM messages WHERE session_id = {placeholder}",
+                               (session_id,))
+                row = cursor.fetchone()
+                return row['count'] if self.use_postgres else row[0]
+                
+        except Exception as e:
+            self.logger.error(f"Error counting session messages: {str(e)}")
+            return 0
+    
     def load_user_goals(self, user_id: str) -> List[Dict]:
         """Ladda användarens mål"""
         try:
@@ -762,8 +940,12 @@ class DataManager:
             self.logger.error(f"Error getting blog post by slug: {str(e)}")
             return None
     
-    def update_blog_post(self, post_id: int, **kwargs) -> bool:
-        """Uppdatera blogginlägg"""
+    def update_blog_post(self, post_id: int, expected_content: str = None, **kwargs) -> bool:
+        """Uppdatera blogginlägg
+
+        Med ``expected_content`` uppdateras inlägget bara om innehållet fortfarande är
+        detsamma (annars False), så att ett sent resultat inte skriver över en redigering
+        """
         try:
             # Tillåtna fält att uppdatera
             allowed_fields = ['title', 'content', 'excerpt', 'category', 'tags', 'published', 'featured']
@@ -788,15 +970,19 @@ class DataManager:
                 values.append(datetime.now())
             
             values.append(post_id)
+            content_condition = ""
+            if expected_content is not None:
+                content_condition = " AND content = %s" if self.use_postgres else " AND content = ?"
+                values.append(expected_content)
             
             query = f"""
                 UPDATE blog_posts 
                 SET {', '.join(update_fields)}
-                WHERE id = %s
+                WHERE id = %s{content_condition}
             """ if self.use_postgres else f"""
                 UPDATE blog_posts 
                 SET {', '.join(update_fields)}
-                WHERE id = ?
+                WHERE id = ?{content_condition}
             """
             
             with self._get_connection() as conn:
@@ -894,4 +1080,185 @@ class DataManager:
                 
         except Exception as e:
             self.logger.error(f"Error searching blog posts: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+    
+    # =========================
+    # BATCH JOBS
+    # =========================
+    
+    def queue_batch_job(self, job_type: str, request_body: Dict, post_id: int = None,
+                        options: Dict = None) -> Optional[int]:
+        """Lägg ett icke-brådskande genereringsjobb i kön"""
+        try:
+            params = (job_type, post_id, json.dumps(request_body, ensure_ascii=False),
+                      json.dumps(options or {}), 'queued')
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                if self.use_postgres:
+                    cursor.execute("""
+                        INSERT INTO batch_jobs (job_type, post_id, request_body, options, status)
+                        VALUES (%s, %s, %s, %s, %s)
+                        RETURNING id
+                    """, params)
+                    job_id = cursor.fetchone()['id']
+                else:
+                    cursor.execute("""
+                        INSERT INTO batch_jobs (job_type, post_id, request_body, options, status)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, params)
+                    job_id = cursor.lastrowid
+                conn.commit()
+                return job_id
+                
+        except Exception as e:
+            self.logger.error(f"Error queueing batch job: {str(e)}")
+            return None
+    
+    def get_batch_jobs(self, status: str = None, batch_id: str = None,
+                       limit: int = None, stale_seconds: float = None) -> List[Dict]:
+        """Hämta batch-jobb, äldst först
+        
+        ``stale_seconds`` ger bara jobb som inte uppdaterats på minst så många sekunder
+        """
+        try:
+            where_conditions = []
+            params = []
+            
+            if status:
+                where_conditions.append("status = %s" if self.use_postgres else "status = ?")
+                params.append(status)
+            
+            if batch_id:
+                where_conditions.append("batch_id = %s" if self.use_postgres else "batch_id = ?")
+                params.append(batch_id)
+            
+            if stale_seconds is not None:
+                if self.use_postgres:
+                    where_conditions.append("updated_at <= CURRENT_TIMESTAMP - %s * INTERVAL '1 second'")
+                    params.append(float(stale_seconds))
+                else:
+                    where_conditions.append("updated_at <= datetime('now', ?)")
+                    params.append(f"-{float(stale_seconds)} seconds")
+            
+            where_clause = ""
+            if where_conditions:
+                where_clause = "WHERE " + " AND ".join(where_conditions)
+            
+            limit_clause = f"LIMIT {int(limit)}" if limit else ""
+            
+            query = f"""
+                SELECT id, job_type, post_id, request_body, options, status, batch_id,
+                       result, error, created_at, updated_at
+                FROM batch_jobs
+                {where_clause}
+                ORDER BY id
+                {limit_clause}
+            """
+            
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                
+                if self.use_postgres:
+                    jobs = [dict(row) for row in cursor.fetchall()]
+                else:
+                    rows = cursor.fetchall()
+                    columns = [desc[0] for desc in cursor.description]
+                    jobs = [dict(zip(columns, row)) for row in rows]
+                
+                for job in jobs:
+                    job['request_body'] = json.loads(job['request_body'])
+                    job['options'] = json.loads(job['options']) if job.get('options') else {}
+                
+                return jobs
+                
+        except Exception as e:
+            self.logger.error(f"Error getting batch jobs: {str(e)}")
+            return []
+    
+    def claim_batch_jobs(self, job_ids: List[int], claim_id: str) -> List[Dict]:
+        """Ta köade jobb atomärt till status 'submitting' och returnera dem som detta anrop fick
+
+        Villkoret på status gör att två processer aldrig tar samma rad; ``claim_id``
+        ligger i batch_id tills den riktiga batchen är skapad
+        """
+        if not job_ids:
+            return []
+        try:
+            placeholder = "%s" if self.use_postgres else "?"
+            query = f"""
+                UPDATE batch_jobs
+                SET status = 'submitting', batch_id = {placeholder}, updated_at = CURRENT_TIMESTAMP
+                WHERE id IN ({', '.join([placeholder] * len(job_ids))}) AND status = 'queued'
+            """
+            
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, [claim_id] + list(job_ids))
+                conn.commit()
+                claimed = cursor.rowcount
+            
+            if claimed <= 0:
+                return []
+            return self.get_batch_jobs(status="submitting", batch_id=claim_id)
+                
+        except Exception as e:
+            self.logger.error(f"Error claiming batch jobs: {str(e)}")
+            return []
+    
+    def resolve_batch_claim(self, claim_id: str, status: str, batch_id: str = None) -> int:
+        """Flytta jobben som fortfarande har ``claim_id`` från 'submitting' till ``status``
+        
+        Villkorlig som claim_batch_jobs: rader som redan lösts av en annan process
+        lämnas orörda. Returnerar antalet flyttade jobb (-1 vid databasfel).
+        """
+        try:
+            placeholder = "%s" if self.use_postgres else "?"
+            query = f"""
+                UPDATE batch_jobs
+                SET status = {placeholder}, batch_id = {placeholder}, updated_at = CURRENT_TIMESTAMP
+                WHERE batch_id = {placeholder} AND status = 'submitting'
+            """
+            
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (status, batch_id, claim_id))
+                conn.commit()
+                return cursor.rowcount
+                
+        except Exception as e:
+            self.logger.error(f"Error resolving batch claim {claim_id}: {str(e)}")
+            return -1
+    
+    def update_batch_jobs(self, job_ids: List[int], **kwargs) -> bool:
+        """Uppdatera status, batch-id, resultat eller fel för ett eller flera jobb"""
+        try:
+            allowed_fields = ['status', 'batch_id', 'result', 'error']
+            placeholder = "%s" if self.use_postgres else "?"
+            
+            update_fields = []
+            values = []
+            for field, value in kwargs.items():
+                if field in allowed_fields:
+                    update_fields.append(f"{field} = {placeholder}")
+                    values.append(value)
+            
+            if not update_fields or not job_ids:
+                return False
+            
+            update_fields.append("updated_at = CURRENT_TIMESTAMP")
+            query = f"""
+                UPDATE batch_jobs
+                SET {', '.join(update_fields)}
+                WHERE id IN ({', '.join([placeholder] * len(job_ids))})
+            """
+            
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, values + list(job_ids))
+                conn.commit()
+                return cursor.rowcount > 0
+                
+        except Exception as e:
+            self.logger.error(f"Error updating batch jobs: {str(e)}")
+            return False
@@ -0,0 +1,166 @@
+"""
+Beständig embedding-cache för kunskapsbasen
+Dokumentens embeddings sparas som en .npy-matris per modell och öppnas med
+mmap_mode, så att en kallstart bara läser en manifest-fil och flera
+Streamlit-processer delar samma sidor via operativsystemets sidcache. Manifestet
+innehåller modell-id och en innehållshash per rad; bara nya eller ändrade
+dokument embeddas om
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from .config import Config
+
+MANIFEST_VERSION = 1
+
+def content_hash(text: str) -> str:
+    """Stabil hash av dokumenttexten (nyckel för en rad i matrisen)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingStore:
+    """Mmap-backad matris med L2-normerade float32-rader, en per text"""
+
+    def __init__(self, directory: str = None):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory or Config.RAG_EMBEDDING_CACHE_DIR
+        self.last_load: Dict = {}
+
+    def _manifest_path(self, model_id: str) -> str:
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_id)
+        return os.path.join(self.directory, f"{safe_id}.json")
+
+    def _read_manifest(self, model_id: str) -> Optional[Dict]:
+        try:
+            with open(self._manifest_path(model_id), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("model_id") != model_id:
+            return None
+        return manifest
+
+    def _open_matrix(self, manifest: Dict) -> Optional[np.ndarray]:
+        """Öppna matrisen read-only med mmap (None om filen saknas eller inte matchar)"""
+        try:
+            matrix = np.load(os.path.join(self.directory, manifest["file"]), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if matrix.ndim != 2 or matrix.shape[0] != len(manifest["hashes"]) or matrix.dtype != np.float32:
+            return None
+        return matrix
+
+    def load(self, model_id: str, texts: List[str],
+             encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Matris med en normerad rad per text i samma ordning
+
+        Rader för texter vars hash redan finns återanvänds; övriga embeddas med
+        ``encode`` i ett anrop. Oförändrad kunskapsbas ger den mmappade filen direkt.
+        """
+        started = time.perf_counter()
+        hashes = [content_hash(text) for text in texts]
+
+        manifest = self._read_manifest(model_id)
+        cached = self._open_matrix(manifest) if manifest else None
+        if cached is not None and manifest["hashes"] == hashes:
+            self._record(len(texts), 0, started)
+            return cached
+
+        rows = {}
+        if cached is not None:
+            rows = {digest: index for index, digest in enumerate(manifest["hashes"])}
+        missing = [index for index, digest in enumerate(hashes) if digest not in rows]
+
+        dim = cached.shape[1] if cached is not None else None
+        fresh = None
+        if missing:
+            fresh = np.asarray(encode([texts[index] for index in missing]), dtype=np.float32)
+            fresh = fresh.reshape(len(missing), -1)
+            norms = np.linalg.norm(fresh, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            fresh /= norms
+            if dim is not None and fresh.shape[1] != dim:
+                # Annan dimension med samma modell-id - bygg om allt
+                return self._rebuild(model_id, texts, hashes, encode, started)
+            dim = fresh.shape[1]
+
+        matrix = np.zeros((len(texts), dim or 0), dtype=np.float32)
+        fresh_rows = dict(zip(missing, range(len(missing))))
+        for index, digest in enumerate(hashes):
+            if index in fresh_rows:
+                matrix[index] = fresh[fresh_rows[index]]
+            else:
+                matrix[index] = cached[rows[digest]]
+
+        result = self._save(model_id, hashes, matrix)
+        self._record(len(texts) - len(missing), len(missing), started)
+        return result
+
+    def _rebuild(self, model_id: str, texts: List[str], hashes: List[str],
+                 encode: Callable, started: float) -> np.ndarray:
+        matrix = np.asarray(encode(texts), dtype=np.float32).reshape(len(texts), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        result = self._save(model_id, hashes, matrix / norms)
+        self._record(0, len(texts), started)
+        return result
+
+    def _save(self, model_id: str, hashes: List[str], matrix: np.ndarray) -> np.ndarray:
+        """Skriv matris och manifest atomärt och returnera den mmappade matrisen
+
+        Matrisfilen namnges efter innehållet, så en process som läser samtidigt ser
+        antingen gammalt eller nytt manifest - aldrig ett manifest som pekar på en
+        halvskriven matris.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            digest = hashlib.sha256("".join(hashes).encode("utf-8")).hexdigest()[:16]
+            prefix = os.path.splitext(os.path.basename(self._manifest_path(model_id)))[0]
+            file_name = f"{prefix}-{digest}.npy"
+            path = os.path.join(self.directory, file_name)
+
+            if not os.path.exists(path):
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".npy.tmp")
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+                os.replace(tmp_path, path)
+
+            manifest = {"version": MANIFEST_VERSION, "model_id": model_id, "dim": int(matrix.shape[1]),
+                        "file": file_name, "hashes": hashes}
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".json.tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, self._manifest_path(model_id))
+
+            self._remove_stale(prefix, file_name)
+            return np.load(path, mmap_mode="r")
+        except OSError as e:
+            # Skrivskyddad katalog e.d. - använd matrisen i minnet
+            self.logger.warning(f"Kunde inte spara embedding-cache: {str(e)}")
+            return np.ascontiguousarray(matrix, dtype=np.float32)
+
+    def _remove_stale(self, prefix: str, keep: str):
+        """Ta bort äldre matriser för modellen (processer som har dem mappade påverkas inte på POSIX)"""
+        pattern = re.compile(re.escape(prefix) + r"-[0-9a-f]{16}\.npy")
+        for name in os.listdir(self.directory):
+            if pattern.fullmatch(name) and name != keep:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _record(self, reused: int, encoded: int, started: float):
+        self.last_load = {
+            "reused": reused,
+            "encoded": encoded,
+            "seconds": round(time.perf_counter() - started, 4)
+        }
+        self.logger.info(f"Embedding-cache: {reused} återanvända, {encoded} nya embeddings")
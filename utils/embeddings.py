@@ -0,0 +1,60 @@
+"""
+Embeddings för AI-Coachen
+Gemensam fråge-embedder: samma SentenceTransformer som AdvancedRAGSystem när den
+finns laddad, annars en billig feature hashing-embedder utan externa beroenden
+"""
+
+import hashlib
+import re
+from typing import Tuple
+
+import numpy as np
+
+class HashingEmbedder:
+    """Reserv-embedder som hashar ord och tecken-trigram till en fast vektor"""
+    
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.model_id = f"hashing-{dim}"
+    
+    def _features(self, text: str):
+        words = re.findall(r"\w+", text.lower())
+        for word in words:
+            yield word
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3]
+    
+    def encode(self, text) -> np.ndarray:
+        """En text ger en vektor, en lista ger en matris (som SentenceTransformer.encode)"""
+        if isinstance(text, (list, tuple)):
+            return np.stack([self.encode(item) for item in text]) if text else np.zeros((0, self.dim), dtype=np.float32)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.md5(feature.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[index] += sign
+        return vector
+
+_hashing_embedder = HashingEmbedder()
+
+def normalize(vector: np.ndarray) -> np.ndarray:
+    """L2-normalisera en vektor (nollvektorer lämnas orörda)"""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+def get_query_embedder() -> Tuple[str, object]:
+    """Returnera (modell-id, embedder) - RAG-systemets modell om den är laddad"""
+    from .rag_system import rag_system
+    
+    model = getattr(rag_system, "embedding_model", None)
+    if model is not None:
+        return rag_system.embedding_model_id, model
+    return _hashing_embedder.model_id, _hashing_embedder
+
+def embed_query(text: str) -> Tuple[str, np.ndarray]:
+    """Embedda en fråga och returnera (modell-id, normaliserad float32-vektor)"""
+    model_id, embedder = get_query_embedder()
+    return model_id, normalize(embedder.encode(text))
@@ -0,0 +1,258 @@
+"""
+Långtidsminne för AI-Coachen
+Fakta och sammanfattningar från avslutade sessioner sparas per användare som
+embeddings (float16-blobbar i SQLite). Vid varje tur hämtas de mest relevanta
+minnena inom en token-budget, så att coachen har kontinuitet mellan sessioner
+utan att hela tidigare samtal skickas med
+
+Aktiveras med Config.ENABLE_MEMORY
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import Config
+from .embeddings import embed_query
+from .token_counter import count_tokens
+
+MEMORY_PREFIX = "Det här vet du om användaren från tidigare sessioner:\n"
+
+# Nya minnen som är så här lika ett befintligt räknas som samma minne
+DUPLICATE_SIMILARITY = 0.95
+
+# Högsta antal fakta som sparas per session
+MAX_FACTS_PER_SESSION = 8
+
+def build_extraction_messages(summary: str, transcript: List) -> List[Dict]:
+    """Prompt som plockar ut bestående fakta och en kort sammanfattning ur en session"""
+    lines = "\n".join(f"{msg.role}: {msg.content}" for msg in transcript)
+    return [
+        {
+            "role": "system",
+            "content": (
+                "Du extraherar långtidsminne från ett avslutat coaching-samtal. Svara på svenska "
+                "med en rad 'SAMMANFATTNING: ...' (max två meningar) följd av högst "
+                f"{MAX_FACTS_PER_SESSION} rader som börjar med '- ' med bestående fakta om användaren: "
+                "mål, roll, förutsättningar, preferenser och beslut. Utelämna småprat och sådant "
+                "som bara gällde just det här samtalet."
+            )
+        },
+        {
+            "role": "user",
+            "content": f"Tidigare sammanfattning:\n{summary or '(ingen)'}\n\nSamtal:\n{lines}"
+        }
+    ]
+
+def parse_extraction(text: str) -> List[Tuple[str, str]]:
+    """Tolka extraktionssvaret till (typ, text)-par"""
+    items = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.upper().startswith("SAMMANFATTNING:"):
+            summary = line.split(":", 1)[1].strip()
+            if summary:
+                items.append(("summary", summary))
+        elif line[:1] in ("-", "•", "*"):
+            fact = line[1:].strip()
+            if fact and sum(kind == "fact" for kind, _ in items) < MAX_FACTS_PER_SESSION:
+                items.append(("fact", fact))
+    return items
+
+class _UserIndex:
+    """Användarens minnen som en float16-matris för en embedder"""
+
+    __slots__ = ("model_id", "matrix", "ids", "texts", "tokens", "session_ids")
+
+    def __init__(self, model_id: str, rows: List[Tuple], dim: int):
+        self.model_id = model_id
+        self.ids = [row[0] for row in rows]
+        self.texts = [row[1] for row in rows]
+        self.tokens = [row[2] for row in rows]
+        self.session_ids = [row[3] for row in rows]
+        self.matrix = (np.frombuffer(b"".join(row[4] for row in rows), dtype=np.float16).reshape(len(rows), dim)
+                       if rows else np.zeros((0, dim), dtype=np.float16))
+
+class LongTermMemory:
+    """Vektorlager per användare i SQLite med en liten cache av inladdade matriser"""
+
+    def __init__(self, db_path: str = None, enabled: bool = None, top_k: int = None,
+                 budget_tokens: int = None, min_similarity: float = None,
+                 max_per_user: int = None, cached_users: int = 256):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path or Config.MEMORY_DB_PATH
+        self.enabled = Config.ENABLE_MEMORY if enabled is None else enabled
+        self.top_k = top_k or Config.MEMORY_TOP_K
+        self.budget_tokens = budget_tokens or Config.MEMORY_BUDGET_TOKENS
+        self.min_similarity = min_similarity if min_similarity is not None else Config.MEMORY_MIN_SIMILARITY
+        self.max_per_user = max_per_user or Config.MEMORY_MAX_PER_USER
+        self.cached_users = cached_users
+
+        self._indexes: "OrderedDict[str, _UserIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._initialized = False
+
+        self.recalls = 0
+        self.recall_hits = 0
+        self.tokens_injected = 0
+        self.stored = 0
+
+    def _init_database(self):
+        """Skapa tabellen första gången minnet används"""
+        if self._initialized:
+            return
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS memories (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    session_id TEXT,
+                    kind TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    tokens INTEGER NOT NULL,
+                    model_id TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_memories_user
+                ON memories (user_id, model_id)
+            """)
+            conn.commit()
+        self._initialized = True
+
+    def _load_index(self, user_id: str, model_id: str, dim: int) -> _UserIndex:
+        """Användarens matris för aktuell embedder (läses från SQLite vid cachemiss)"""
+        index = self._indexes.get(user_id)
+        if index is not None and index.model_id == model_id:
+            self._indexes.move_to_end(user_id)
+            return index
+
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, text, tokens, session_id, embedding FROM memories
+                WHERE user_id = ? AND model_id = ?
+                ORDER BY id
+            """, (user_id, model_id))
+            rows = cursor.fetchall()
+
+        # Vektorer från en annan embedder är inte jämförbara och hoppas över
+        index = _UserIndex(model_id, [row for row in rows if len(row[4]) == dim * 2], dim)
+        self._indexes[user_id] = index
+        while len(self._indexes) > self.cached_users:
+            self._indexes.popitem(last=False)
+        return index
+
+    def add(self, user_id: str, session_id: str, items: List[Tuple[str, str]]) -> int:
+        """Spara (typ, text)-par för användaren; nära dubbletter hoppas över"""
+        if not self.enabled or not items:
+            return 0
+
+        with self._lock:
+            self._init_database()
+            added = []
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                for kind, text in items:
+                    model_id, vector = embed_query(text)
+                    index = self._load_index(user_id, model_id, vector.shape[0])
+                    # Jämför mot sparade minnen och mot dem som lagts till i samma anrop
+                    similarities = [float(np.max(index.matrix @ vector))] if index.ids else []
+                    similarities += [float(other @ vector) for other in added]
+                    if similarities and max(similarities) >= DUPLICATE_SIMILARITY:
+                        continue
+
+                    cursor.execute("""
+                        INSERT INTO memories (user_id, session_id, kind, text, tokens, model_id, embedding, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (user_id, session_id, kind, text, count_tokens(text), model_id,
+                          vector.astype(np.float16).tobytes(), time.time()))
+                    added.append(vector)
+
+                # Äldsta minnena får ge plats när användaren nått taket
+                cursor.execute("""
+                    DELETE FROM memories WHERE user_id = ? AND id NOT IN (
+                        SELECT id FROM memories WHERE user_id = ? ORDER BY id DESC LIMIT ?
+                    )
+                """, (user_id, user_id, self.max_per_user))
+                conn.commit()
+
+            self._indexes.pop(user_id, None)
+            self.stored += len(added)
+            return len(added)
+
+    def recall(self, user_id: str, query: str,
+               exclude_session_id: Optional[str] = None) -> Tuple[str, int]:
+        """Relevanta minnen som ett kontextblock inom budgeten; ger (text, tokens)"""
+        if not self.enabled:
+            return "", 0
+
+        model_id, vector = embed_query(query)
+        with self._lock:
+            self._init_database()
+            index = self._load_index(user_id, model_id, vector.shape[0])
+            self.recalls += 1
+            if not index.ids:
+                return "", 0
+
+            similarities = index.matrix @ vector
+            candidates = np.argsort(-similarities)[:self.top_k * 2]
+
+            lines = []
+            used = count_tokens(MEMORY_PREFIX)
+            for position in candidates:
+                if len(lines) >= self.top_k or similarities[position] < self.min_similarity:
+                    break
+                if exclude_session_id and index.session_ids[position] == exclude_session_id:
+                    continue
+                cost = index.tokens[position] + 2
+                if used + cost > self.budget_tokens:
+                    continue
+                lines.append(f"- {index.texts[position]}")
+                used += cost
+
+            if not lines:
+                return "", 0
+            self.recall_hits += 1
+            self.tokens_injected += used
+            return MEMORY_PREFIX + "\n".join(lines), used
+
+    def forget_user(self, user_id: str) -> int:
+        """Radera alla minnen för en användare"""
+        with self._lock:
+            self._init_database()
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM memories WHERE user_id = ?", (user_id,))
+                conn.commit()
+                deleted = cursor.rowcount
+            self._indexes.pop(user_id, None)
+            return deleted
+
+    def get_stats(self) -> Dict:
+        """Statistik för användningsdashboarden"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'stored': self.stored,
+                'recalls': self.recalls,
+                'recall_hits': self.recall_hits,
+                'avg_tokens_injected': self.tokens_injected / self.recall_hits if self.recall_hits else 0.0,
+                'cached_users': len(self._indexes)
+            }
+
+# Processgemensamt minne
+long_term_memory = LongTermMemory()
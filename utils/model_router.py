@@ -0,0 +1,226 @@
+"""
+Model Router för AI-Coachen
+Väljer modellnivå per tur utifrån frågans expertisnivå (AIExpertIntegration),
+coaching-läge och dagens förbrukning mot budget, med en reservkedja av billigare
+modeller om förstahandsvalet inte svarar. Varje beslut loggas tillsammans med
+latens och kostnad så att policyn kan finjusteras
+
+Logg: en JSON-rad per tur i Config.MODEL_ROUTER_LOG_PATH
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import openai
+
+from .config import Config
+
+# Nivåer från billigast till dyrast
+TIERS = ("economy", "standard", "premium")
+
+# Expertisnivå (AIExpertiseLevel.value) → modellnivå
+LEVEL_TIERS = {
+    "basic": "economy",
+    "intermediate": "standard",
+    "advanced": "premium",
+    "expert": "premium"
+}
+
+# Lägsta nivå per coaching-läge (strategiska universitetsfrågor får inte ekonominivån)
+MODE_MIN_TIERS = {
+    "university": "standard"
+}
+
+# Budgetläge: andel av dagsbudgeten som förbrukats
+BUDGET_TIGHT_SHARE = 0.8
+
+# Fel där nästa modell i kedjan prövas (modellen saknas eller är överbelastad). En öppen
+# circuit breaker gäller hela upstream och ger ingen reserv
+FALLBACK_ERRORS = (
+    openai.NotFoundError,
+    openai.PermissionDeniedError,
+    openai.RateLimitError,
+    openai.InternalServerError
+)
+
+@dataclass
+class RoutingDecision:
+    """Routingbeslut för en tur; ``models`` är reservkedjan med förstahandsvalet först"""
+    tier: str
+    models: List[str]
+    level: str
+    mode: str
+    budget_state: str
+    reason: str
+    model_used: Optional[str] = None
+    fallbacks: List[str] = field(default_factory=list)
+
+    @property
+    def model(self) -> str:
+        return self.models[0]
+
+class ModelRouter:
+    """Policy för modellval plus loggning och statistik över utfallen"""
+
+    def __init__(self, enabled: bool = None, tier_models: Dict[str, str] = None,
+                 daily_budget_usd: float = None, log_path: str = None,
+                 budget_check_seconds: float = 30):
+        self.logger = logging.getLogger(__name__)
+        self.enabled = Config.ENABLE_MODEL_ROUTER if enabled is None else enabled
+        self.tier_models = tier_models or {
+            "economy": Config.MODEL_TIER_ECONOMY,
+            "standard": Config.MODEL_TIER_STANDARD,
+            "premium": Config.MODEL_TIER_PREMIUM
+        }
+        self.daily_budget_usd = (
+            Config.DAILY_BUDGET_USD if daily_budget_usd is None else daily_budget_usd
+        )
+        self.log_path = log_path if log_path is not None else Config.MODEL_ROUTER_LOG_PATH
+        self.budget_check_seconds = budget_check_seconds
+
+        self._lock = threading.Lock()
+        self._spent_today = 0.0
+        self._spent_checked_at = float("-inf")
+
+        self.by_tier: Dict[str, int] = {tier: 0 for tier in TIERS}
+        self.by_model: Dict[str, Dict] = {}
+
+    def _daily_spend(self) -> float:
+        """Dagens kostnad från usage-trackern (läses om högst var ``budget_check_seconds``)"""
+        now = time.monotonic()
+        if now - self._spent_checked_at >= self.budget_check_seconds:
+            from .api_usage_tracker import usage_tracker
+            self._spent_today = usage_tracker.get_daily_usage()['total_cost_usd']
+            self._spent_checked_at = now
+        return self._spent_today
+
+    def budget_state(self) -> str:
+        """"ok", "tight" (över 80 % av dagsbudgeten) eller "exhausted" """
+        if not self.daily_budget_usd:
+            return "ok"
+        share = self._daily_spend() / self.daily_budget_usd
+        if share >= 1:
+            return "exhausted"
+        if share >= BUDGET_TIGHT_SHARE:
+            return "tight"
+        return "ok"
+
+    def route(self, level: str, mode: str, default_model: str) -> RoutingDecision:
+        """Välj modellnivå för en tur; avstängd router ger alltid ``default_model``"""
+        if not self.enabled:
+            return RoutingDecision(tier="fixed", models=[default_model], level=level, mode=mode,
+                                   budget_state="ok", reason="router avstängd")
+
+        tier = LEVEL_TIERS.get(level, "standard")
+        reason = f"nivå {level}"
+
+        min_tier = MODE_MIN_TIERS.get(mode)
+        if min_tier and TIERS.index(tier) < TIERS.index(min_tier):
+            tier = min_tier
+            reason += f", minst {min_tier} i läge {mode}"
+
+        budget = self.budget_state()
+        if budget == "exhausted" and tier != "economy":
+            tier = "economy"
+            reason += ", dagsbudget förbrukad"
+        elif budget == "tight" and tier != "economy":
+            tier = TIERS[TIERS.index(tier) - 1]
+            reason += ", nära dagsbudget"
+
+        # Reservkedja: vald nivå och nedåt, sist coachens standardmodell
+        models = []
+        for fallback_tier in reversed(TIERS[:TIERS.index(tier) + 1]):
+            model = self.tier_models[fallback_tier]
+            if model not in models:
+                models.append(model)
+        if default_model not in models:
+            models.append(default_model)
+
+        return RoutingDecision(tier=tier, models=models, level=level, mode=mode,
+                               budget_state=budget, reason=reason)
+
+    def summary_model(self, default_model: str) -> str:
+        """Sammanfattningar av äldre historik kräver ingen dyr modell"""
+        return self.tier_models["economy"] if self.enabled else default_model
+
+    def record(self, decision: RoutingDecision, latency_ms: Optional[float] = None,
+               usage=None, cache_source: Optional[str] = None, error: Optional[Exception] = None):
+        """Logga beslutet och utfallet (``usage`` är APIUsage från usage-trackern)"""
+        model = decision.model_used or decision.model
+        cost = usage.cost_usd if usage else 0.0
+
+        with self._lock:
+            if decision.tier in self.by_tier:
+                self.by_tier[decision.tier] += 1
+            stats = self.by_model.setdefault(model, {
+                "requests": 0, "errors": 0, "fallbacks": 0, "cache_hits": 0,
+                "latency_ms_total": 0.0, "latency_samples": 0, "cost_usd": 0.0
+            })
+            stats["requests"] += 1
+            stats["errors"] += error is not None
+            stats["fallbacks"] += bool(decision.fallbacks)
+            stats["cache_hits"] += cache_source is not None
+            if latency_ms is not None and cache_source is None:
+                stats["latency_ms_total"] += latency_ms
+                stats["latency_samples"] += 1
+            stats["cost_usd"] += cost
+
+        # Fast modell utan router ger inget att finjustera - usage-trackern har kostnaden
+        if not self.log_path or not self.enabled:
+            return
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "level": decision.level,
+            "mode": decision.mode,
+            "budget_state": decision.budget_state,
+            "tier": decision.tier,
+            "reason": decision.reason,
+            "model_requested": decision.model,
+            "model_used": model,
+            "fallbacks": decision.fallbacks,
+            "latency_ms": round(latency_ms, 1) if latency_ms is not None else None,
+            "prompt_tokens": usage.prompt_tokens if usage else None,
+            "completion_tokens": usage.completion_tokens if usage else None,
+            "cost_usd": cost,
+            "cache_source": cache_source,
+            "error": str(error) if error else None
+        }
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            self.logger.warning(f"Kunde inte skriva routinglogg: {str(e)}")
+
+    def get_stats(self) -> Dict:
+        """Fördelning per nivå och utfall per modell"""
+        with self._lock:
+            by_model = {
+                model: {
+                    "requests": stats["requests"],
+                    "errors": stats["errors"],
+                    "fallbacks": stats["fallbacks"],
+                    "cache_hits": stats["cache_hits"],
+                    "avg_latency_ms": (stats["latency_ms_total"] / stats["latency_samples"]
+                                       if stats["latency_samples"] else None),
+                    "cost_usd": stats["cost_usd"]
+                }
+                for model, stats in self.by_model.items()
+            }
+            return {
+                "enabled": self.enabled,
+                "budget_state": self.budget_state() if self.enabled else "ok",
+                "daily_budget_usd": self.daily_budget_usd,
+                "by_tier": dict(self.by_tier),
+                "by_model": by_model
+            }
+
+# Processgemensam router
+model_router = ModelRouter()
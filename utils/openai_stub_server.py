@@ -0,0 +1,363 @@
+"""
+OpenAI Stub Server för AI-Coachen
+Lokal OpenAI-kompatibel server för tester och benchmarks utan API-nyckel.
+Stödjer /v1/chat/completions med och utan streaming, usage-fält, konfigurerbar
+latens och felinjicering, samt /v1/files och /v1/batches som lokal ersättning
+för OpenAI Batch API
+
+Starta fristående:
+    python -m utils.openai_stub_server --port 8900 --latency-ms 300 --error-rate 0.05
+och peka klienten mot den med OPENAI_BASE_URL=http://127.0.0.1:8900/v1
+"""
+
+import argparse
+import json
+import re
+import random
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+DEFAULT_REPLY = (
+    "Det låter som ett bra mål! Börja med att bryta ner det i mindre delmål, "
+    "till exempel en grundkurs i Python och ett litet eget projekt. "
+    "Vad känns som det naturliga första steget för dig?"
+)
+
+def _approx_tokens(text: str) -> int:
+    """Grov token-uppskattning (ca 4 tecken per token)"""
+    return max(1, len(text) // 4)
+
+class StubServer:
+    """OpenAI-kompatibel stub som körs i en bakgrundstråd
+
+    Beteendet styrs av attributen (kan ändras medan servern kör):
+    - ``latency_ms`` / ``jitter_ms``: total svarstid för icke-strömmade svar
+    - ``ttft_ms`` / ``token_interval_ms``: tid till första token och mellan tokens vid streaming
+    - ``error_rate`` / ``error_status``: andel anrop som får ett felsvar och dess statuskod
+    - ``script``: kö av engångsbeteenden som går före slumpen, t.ex. ``("status", 429)``,
+      ``("delay", 2.0)`` eller ``("ok",)``
+    - ``batch_delay_s``: hur länge en batch står som ``in_progress`` innan den körs;
+      varje rad i batchen följer samma skript och felinjicering som enskilda anrop
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0,
+                 jitter_ms: float = 0, ttft_ms: float = 0, token_interval_ms: float = 0,
+                 error_rate: float = 0.0, error_status: int = 500, reply: str = DEFAULT_REPLY,
+                 seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.ttft_ms = ttft_ms
+        self.token_interval_ms = token_interval_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.reply = reply
+        self.script: List[tuple] = []
+        self.batch_delay_s = 0.0
+
+        # Uppladdade filer och batchar (Batch API)
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict] = {}
+
+        self.requests = 0
+        self.last_request: Optional[Dict] = None  # Senaste chat completions-anropets JSON
+        self.errors_injected = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_action(self) -> tuple:
+        """Välj beteende för nästa anrop (skript först, sedan slumpad felinjicering)"""
+        with self._lock:
+            self.requests += 1
+            if self.script:
+                action = self.script.pop(0)
+            elif self.error_rate and self._random.random() < self.error_rate:
+                action = ("status", self.error_status)
+            else:
+                action = ("ok",)
+            if action[0] == "status":
+                self.errors_injected += 1
+            return action
+
+    def _latency_seconds(self) -> float:
+        jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def _completion(self, request: Dict) -> Dict:
+        prompt_tokens = sum(_approx_tokens(str(m.get("content", ""))) + 4 for m in request.get("messages", []))
+        completion_tokens = _approx_tokens(self.reply)
+        return {
+            "id": f"chatcmpl-stub-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": self.reply}
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": 0}
+            }
+        }
+
+    def _create_file(self, filename: str, content: bytes, purpose: str) -> Dict:
+        with self._lock:
+            file_id = f"file-stub-{len(self.files) + 1}"
+            self.files[file_id] = content
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+
+    def _create_batch(self, request: Dict) -> Dict:
+        with self._lock:
+            batch_id = f"batch_stub_{len(self.batches) + 1}"
+            lines = self.files.get(request.get("input_file_id"), b"").decode("utf-8").splitlines()
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": request.get("endpoint"),
+                "input_file_id": request.get("input_file_id"),
+                "completion_window": request.get("completion_window", "24h"),
+                "status": "in_progress", "created_at": int(time.time()),
+                "output_file_id": None, "error_file_id": None, "metadata": request.get("metadata"),
+                "request_counts": {"total": len([line for line in lines if line.strip()]),
+                                   "completed": 0, "failed": 0},
+                "_started": time.monotonic()
+            }
+            return self._public_batch(self.batches[batch_id])
+
+    def _retrieve_batch(self, batch_id: str) -> Optional[Dict]:
+        """Hämta batch; körs klart vid första hämtningen efter ``batch_delay_s``"""
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        with self._lock:
+            due = batch["status"] == "in_progress" and time.monotonic() - batch["_started"] >= self.batch_delay_s
+            if due:
+                batch["status"] = "finalizing"
+        if due:
+            self._run_batch(batch)
+        return self._public_batch(batch)
+
+    def _list_batches(self) -> Dict:
+        """Alla batchar nyast först, som en sida i OpenAI:s listformat"""
+        with self._lock:
+            data = [self._public_batch(batch) for batch in reversed(list(self.batches.values()))]
+        return {"object": "list", "data": data, "has_more": False,
+                "first_id": data[0]["id"] if data else None, "last_id": data[-1]["id"] if data else None}
+
+    def _run_batch(self, batch: Dict):
+        """Kör batchens rader och skriv utdata- och felfil i OpenAI:s format"""
+        output, errors = [], []
+        for line in self.files[batch["input_file_id"]].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            action = self._next_action()
+            record = {"id": f"batch_req_{self.requests}", "custom_id": item["custom_id"], "error": None}
+            if action[0] == "status":
+                record["response"] = {"status_code": action[1], "request_id": f"req_{self.requests}",
+                                      "body": {"error": {"message": "Injicerat fel", "type": "stub"}}}
+                errors.append(record)
+            else:
+                record["response"] = {"status_code": 200, "request_id": f"req_{self.requests}",
+                                      "body": self._completion(item["body"])}
+                output.append(record)
+
+        if output:
+            batch["output_file_id"] = self._create_file(
+                "batch_output.jsonl", "".join(json.dumps(r) + "\n" for r in output).encode("utf-8"), "batch_output"
+            )["id"]
+        if errors:
+            batch["error_file_id"] = self._create_file(
+                "batch_errors.jsonl", "".join(json.dumps(r) + "\n" for r in errors).encode("utf-8"), "batch_output"
+            )["id"]
+        batch["request_counts"].update(completed=len(output), failed=len(errors))
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+    @staticmethod
+    def _public_batch(batch: Dict) -> Dict:
+        return {key: value for key, value in batch.items() if not key.startswith("_")}
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _not_found(self):
+                self._send_json(404, {"error": {"message": "Okänd endpoint", "type": "not_found"}})
+
+            def do_GET(self):
+                path = self.path.split("?")[0].rstrip("/")
+                content = re.search(r"/files/([^/]+)/content$", path)
+                batch_id = re.search(r"/batches/([^/]+)$", path)
+                batch = stub._retrieve_batch(batch_id.group(1)) if batch_id else None
+                if content and content.group(1) in stub.files:
+                    body = stub.files[content.group(1)]
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif batch is not None:
+                    self._send_json(200, batch)
+                elif path.endswith("/batches"):
+                    self._send_json(200, stub._list_batches())
+                else:
+                    self._not_found()
+
+            def _upload(self, raw: bytes):
+                """Multipart-uppladdning till /v1/files"""
+                header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+                message = BytesParser(policy=HTTP).parsebytes(header + raw)
+                fields = {part.get_param("name", header="content-disposition"): part
+                          for part in message.iter_parts()}
+                upload = fields.get("file")
+                if upload is None:
+                    self._send_json(400, {"error": {"message": "Fil saknas", "type": "invalid_request_error"}})
+                    return
+                purpose = fields["purpose"].get_content() if "purpose" in fields else "batch"
+                self._send_json(200, stub._create_file(upload.get_filename() or "upload.jsonl",
+                                                       upload.get_payload(decode=True), purpose))
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                path = self.path.split("?")[0].rstrip("/")
+                if path.endswith("/files"):
+                    self._upload(raw)
+                    return
+                if path.endswith("/batches"):
+                    self._send_json(200, stub._create_batch(json.loads(raw or b"{}")))
+                    return
+                if not path.endswith("/chat/completions"):
+                    self._not_found()
+                    return
+
+                request = json.loads(raw or b"{}")
+                stub.last_request = request
+                action = stub._next_action()
+                try:
+                    if action[0] == "status":
+                        self._send_json(action[1], {"error": {"message": "Injicerat fel", "type": "stub"}})
+                        return
+
+                    delay = action[1] if action[0] == "delay" else None
+                    if request.get("stream"):
+                        self._stream(request, delay)
+                    else:
+                        time.sleep(delay if delay is not None else stub._latency_seconds())
+                        self._send_json(200, stub._completion(request))
+                except (BrokenPipeError, ConnectionResetError):
+                    # Klienten gav upp (t.ex. deadline eller hedging)
+                    pass
+
+            def _stream(self, request: Dict, delay: Optional[float]):
+                completion = stub._completion(request)
+                include_usage = (request.get("stream_options") or {}).get("include_usage")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                time.sleep(delay if delay is not None else stub.ttft_ms / 1000)
+                words = stub.reply.split(" ")
+                for index, word in enumerate(words):
+                    piece = word if index == 0 else " " + word
+                    self._event({
+                        "id": completion["id"], "object": "chat.completion.chunk",
+                        "created": completion["created"], "model": completion["model"],
+                        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                    })
+                    if stub.token_interval_ms:
+                        time.sleep(stub.token_interval_ms / 1000)
+
+                self._event({
+                    "id": completion["id"], "object": "chat.completion.chunk",
+                    "created": completion["created"], "model": completion["model"],
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                })
+                if include_usage:
+                    self._event({
+                        "id": completion["id"], "object": "chat.completion.chunk",
+                        "created": completion["created"], "model": completion["model"],
+                        "choices": [], "usage": completion["usage"]
+                    })
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _event(self, payload: Dict):
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-kompatibel stub-server för AI-Coachen")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--ttft-ms", type=float, default=150)
+    parser.add_argument("--token-interval-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    args = parser.parse_args()
+
+    stub = StubServer(host=args.host, port=args.port, latency_ms=args.latency_ms,
+                      jitter_ms=args.jitter_ms, ttft_ms=args.ttft_ms,
+                      token_interval_ms=args.token_interval_ms,
+                      error_rate=args.error_rate, error_status=args.error_status)
+    print(f"🧪 Stub-server lyssnar på {stub.base_url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,29 @@ Använder lokala embeddings och intelligent kontext-sökning
 
 import json
 import os
+import heapq
+import importlib.util
+import threading
+import time
+from collections import defaultdict
 from typing import List, Dict, Tuple, Optional
 import logging
 from dataclasses import dataclass
 import re
 
-# Försök importera sentence-transformers, använd fallback om det inte finns
-try:
-    from sentence_transformers import SentenceTransformer
-    SENTENCE_TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    SENTENCE_TRANSFORMERS_AVAILABLE = False
+# sentence-transformers (och torch) importeras först när AdvancedRAGSystem byggs -
+# här kontrolleras bara att paketet finns, så att importen av modulen är billig
+SENTENCE_TRANSFORMERS_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+if not SENTENCE_TRANSFORMERS_AVAILABLE:
     logging.warning("sentence-transformers inte installerat - använder enkel text-matching som fallback")
 
+import numpy as np
+
 from .ai_expert_knowledge import ai_expert_knowledge
+from .config import Config
+from .embedding_store import EmbeddingStore
+from .embeddings import normalize
+from .text_search import BM25Index
 
 @dataclass
 class RetrievedContext:
@@ -30,12 +39,22 @@ class RetrievedContext:
     relevance_score: float
     coaching_context: str
 
+# Fältvikter för BM25F-scorern (titel och keywords väger tyngre än brödtexten)
+BM25_FIELD_WEIGHTS = {"title": 2.0, "keywords": 1.5, "content": 1.0}
+
 class SimpleRAGSystem:
     """Enkel RAG-implementation som fungerar utan externa beroenden"""
     
-    def __init__(self):
+    def __init__(self, knowledge_docs: Optional[List[Dict]] = None, scorer: Optional[str] = None):
         self.logger = logging.getLogger(__name__)
-        self.knowledge_docs = ai_expert_knowledge.get_all_knowledge()
+        self.knowledge_docs = knowledge_docs if knowledge_docs is not None else ai_expert_knowledge.get_all_knowledge()
+        # "bm25" (BM25F över titel, keywords och innehåll) eller "jaccard" (ordöverlapp)
+        self.scorer = (scorer or Config.RAG_SCORER).lower()
+        if self.scorer == "bm25":
+            self.bm25 = BM25Index(self.knowledge_docs, weights=BM25_FIELD_WEIGHTS)
+        else:
+            self._build_index()
+            self._build_keyword_index()
         
         # AI-relaterade keywords för att identifiera AI-frågor
         self.ai_keywords = {
@@ -88,6 +107,90 @@ class SimpleRAGSystem:
         
         return intersection / union
     
+    def _build_index(self):
+        """Bygg inverterade index (term -> dokument) en gång vid laddning
+        
+        Innehåll och titel tokeniseras som i simple_text_similarity; per dokument
+        sparas antalet unika termer så att Jaccard-unionen kan räknas utan att
+        dokumentet tokeniseras om.
+        """
+        self._content_index: Dict[str, List[int]] = defaultdict(list)
+        self._title_index: Dict[str, List[int]] = defaultdict(list)
+        self._content_term_counts: List[int] = []
+        self._title_term_counts: List[int] = []
+        
+        for doc_id, doc in enumerate(self.knowledge_docs):
+            content_terms = set(doc['content'].lower().split())
+            title_terms = set(doc['title'].lower().split())
+            for term in content_terms:
+                self._content_index[term].append(doc_id)
+            for term in title_terms:
+                self._title_index[term].append(doc_id)
+            self._content_term_counts.append(len(content_terms))
+            self._title_term_counts.append(len(title_terms))
+    
+    def _build_keyword_index(self):
+        """Keywords som hela (gemena) strängar -> dokument, för keyword-bonusen"""
+        self._keyword_index: Dict[str, List[int]] = defaultdict(list)
+        for doc_id, doc in enumerate(self.knowledge_docs):
+            # Samma keyword två gånger i ett dokument ger dubbel bonus, som tidigare
+            for keyword in doc['keywords']:
+                self._keyword_index[keyword.lower()].append(doc_id)
+        
+        # Keyword-längder för att slå upp frågans delsträngar istället för att gå igenom alla keywords
+        self._keyword_lengths = sorted({len(keyword) for keyword in self._keyword_index})
+    
+    def _matching_keywords(self, query_lower: str) -> List[str]:
+        """Indexerade keywords som förekommer som delsträng i frågan"""
+        # Välj det billigaste: testa varje keyword eller slå upp frågans delsträngar
+        probes = len(query_lower) * len(self._keyword_lengths)
+        if len(self._keyword_index) <= probes:
+            return [keyword for keyword in self._keyword_index if keyword in query_lower]
+        
+        found = set()
+        for start in range(len(query_lower)):
+            for length in self._keyword_lengths:
+                if start + length > len(query_lower):
+                    break
+                candidate = query_lower[start:start + length]
+                if candidate in self._keyword_index:
+                    found.add(candidate)
+        return list(found)
+    
+    def _score_documents(self, query: str, keyword_weight: float) -> Dict[int, Tuple[float, float]]:
+        """(text-score, keyword-score) för dokument som delar minst en term eller ett keyword med frågan
+        
+        Text-score är Jaccard mot innehållet plus dubbelviktad Jaccard mot titeln.
+        Övriga dokument har score 0 och rörs inte.
+        """
+        query_lower = query.lower()
+        query_terms = set(query_lower.split())
+        
+        content_hits: Dict[int, int] = defaultdict(int)
+        title_hits: Dict[int, int] = defaultdict(int)
+        for term in query_terms:
+            for doc_id in self._content_index.get(term, ()):
+                content_hits[doc_id] += 1
+            for doc_id in self._title_index.get(term, ()):
+                title_hits[doc_id] += 1
+        
+        keyword_scores: Dict[int, float] = defaultdict(float)
+        for keyword in self._matching_keywords(query_lower):
+            for doc_id in self._keyword_index[keyword]:
+                keyword_scores[doc_id] += keyword_weight
+        
+        scores = {}
+        for doc_id in set(content_hits) | set(title_hits) | set(keyword_scores):
+            text_score = 0.0
+            intersection = content_hits.get(doc_id, 0)
+            if intersection:
+                text_score += intersection / (len(query_terms) + self._content_term_counts[doc_id] - intersection)
+            intersection = title_hits.get(doc_id, 0)
+            if intersection:
+                text_score += intersection / (len(query_terms) + self._title_term_counts[doc_id] - intersection) * 2
+            scores[doc_id] = (text_score, keyword_scores.get(doc_id, 0.0))
+        return scores
+    
     def retrieve_relevant_context(self, query: str, top_k: int = 3) -> List[RetrievedContext]:
         """Hämta relevant kontext för en fråga"""
         
@@ -95,29 +198,24 @@ class SimpleRAGSystem:
         if not self.is_ai_related_query(query):
             return []
         
+        # Bara dokument som delar termer med frågan poängsätts (inverterat index)
         scored_docs = []
+        if self.scorer == "bm25":
+            for doc_id, score in self.bm25.score(query).items():
+                if score >= Config.RAG_BM25_MIN_SCORE:
+                    scored_docs.append((score, doc_id))
+        else:
+            for doc_id, (text_score, keyword_score) in self._score_documents(query, 0.3).items():
+                total_score = text_score + keyword_score
+                if total_score > 0.1:  # Threshold för relevans
+                    scored_docs.append((total_score, doc_id))
         
-        for doc in self.knowledge_docs:
-            # Beräkna relevance score
-            content_score = self.simple_text_similarity(query, doc['content'])
-            title_score = self.simple_text_similarity(query, doc['title']) * 2  # Viktning för titel
-            keyword_score = 0
-            
-            # Bonus för matchande keywords
-            for keyword in doc['keywords']:
-                if keyword.lower() in query.lower():
-                    keyword_score += 0.3
-            
-            total_score = content_score + title_score + keyword_score
-            
-            if total_score > 0.1:  # Threshold för relevans
-                scored_docs.append((doc, total_score))
-        
-        # Sortera efter score och ta top_k
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
+        # Högst score först; lika score i kunskapsbasens ordning
+        top_docs = heapq.nsmallest(top_k, scored_docs, key=lambda x: (-x[0], x[1]))
         
         results = []
-        for doc, score in scored_docs[:top_k]:
+        for score, doc_id in top_docs:
+            doc = self.knowledge_docs[doc_id]
             context = RetrievedContext(
                 content=doc['content'],
                 category=doc['category'],
@@ -130,16 +228,13 @@ class SimpleRAGSystem:
         self.logger.info(f"Hämtade {len(results)} relevanta kontexter för AI-fråga")
         return results
     
-    def enhance_prompt_with_context(self, original_prompt: str, user_query: str) -> str:
-        """Förbättra prompt med relevant AI-expertis kontext"""
-        
+    def build_context_block(self, user_query: str) -> str:
+        """Bygg frågespecifikt kontextblock (tom sträng om inget relevant hittas)"""
         relevant_contexts = self.retrieve_relevant_context(user_query)
         
         if not relevant_contexts:
-            # Ingen AI-kontext behövs
-            return original_prompt
+            return ""
         
-        # Bygg AI-expertis kontext
         ai_context = "## AI-Expertis Kontext\n"
         ai_context += "Som AI-expert har du tillgång till följande relevanta kunskap:\n\n"
         
@@ -149,6 +244,17 @@ class SimpleRAGSystem:
             if context.coaching_context:
                 ai_context += f"**Coaching-perspektiv**: {context.coaching_context}\n\n"
         
+        return ai_context
+    
+    def enhance_prompt_with_context(self, original_prompt: str, user_query: str) -> str:
+        """Förbättra prompt med relevant AI-expertis kontext"""
+        
+        ai_context = self.build_context_block(user_query)
+        
+        if not ai_context:
+            # Ingen AI-kontext behövs
+            return original_prompt
+        
         # Integrera AI-kontext med coaching-persona
         enhanced_prompt = f"""{original_prompt}
 
@@ -165,84 +271,100 @@ Svara på svenska med professionell men varm coaching-ton."""
         return enhanced_prompt
 
 class AdvancedRAGSystem(SimpleRAGSystem):
-    """Avancerad RAG med sentence transformers (kräver extra paket)"""
+    """Avancerad RAG med sentence transformers (kräver extra paket)
+    
+    Dokumentens embeddings ligger som en L2-normerad float32-matris; en fråga
+    embeddas en gång och poängsätts mot alla dokument med en matris-vektorprodukt.
+    Matrisen sparas i en EmbeddingStore så att en kallstart bara mmappar filen.
+    """
     
-    def __init__(self):
-        super().__init__()
+    MODEL_ID = 'sentence-transformers/all-MiniLM-L6-v2'
+    
+    def __init__(self, knowledge_docs: Optional[List[Dict]] = None, scorer: Optional[str] = None,
+                 embedding_model=None, embedding_store: Optional[EmbeddingStore] = None):
+        super().__init__(knowledge_docs, scorer)
+        if not hasattr(self, "_keyword_index"):
+            self._build_keyword_index()
+        self.embedding_store = embedding_store or EmbeddingStore()
+        
+        if embedding_model is not None:
+            # T.ex. en redan laddad modell eller utils.embeddings.HashingEmbedder
+            self.embedding_model = embedding_model
+            self.embedding_model_id = getattr(embedding_model, "model_id", type(embedding_model).__name__)
+            self._precompute_embeddings()
+            return
         
         if not SENTENCE_TRANSFORMERS_AVAILABLE:
             raise ImportError("sentence-transformers krävs för AdvancedRAGSystem. Använd SimpleRAGSystem istället.")
         
         # Ladda embedding model
         try:
-            self.embedding_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-            self.embeddings_cache = {}
+            from sentence_transformers import SentenceTransformer
+            self.embedding_model = SentenceTransformer(self.MODEL_ID)
+            self.embedding_model_id = self.MODEL_ID
             self._precompute_embeddings()
         except Exception as e:
             self.logger.error(f"Kunde inte ladda embedding model: {e}")
             raise
     
     def _precompute_embeddings(self):
-        """Förberäkna embeddings för alla dokument"""
-        self.logger.info("Förberäknar embeddings för kunskapsdokument...")
-        
-        for i, doc in enumerate(self.knowledge_docs):
-            # Kombinera titel och innehåll för bättre embedding
-            text = f"{doc['title']}: {doc['content']}"
-            embedding = self.embedding_model.encode(text)
-            self.embeddings_cache[i] = embedding
-        
-        self.logger.info(f"Förberäknade embeddings för {len(self.embeddings_cache)} dokument")
+        """Förberäkna embeddings för alla dokument som en normerad matris (en rad per dokument)
+        
+        Bara nya eller ändrade dokument embeddas; övriga läses från embedding-cachen.
+        """
+        # Kombinera titel och innehåll för bättre embedding
+        texts = [f"{doc['title']}: {doc['content']}" for doc in self.knowledge_docs]
+        self.doc_matrix = self.embedding_store.load(self.embedding_model_id, texts, self.embedding_model.encode)
+        
+        stats = self.embedding_store.last_load
+        self.logger.info(
+            f"Embeddings för {len(texts)} dokument klara på {stats.get('seconds', 0):.2f} s "
+            f"({stats.get('encoded', 0)} nya)"
+        )
+    
+    def _embed_query(self, query: str) -> np.ndarray:
+        """Frågans normerade embedding (ett anrop till modellen)"""
+        return normalize(self.embedding_model.encode(query))
     
     def semantic_similarity(self, query: str, doc_index: int) -> float:
-        """Beräkna semantisk likhet med embeddings"""
+        """Beräkna semantisk likhet med embeddings (för enstaka dokument - använd semantic_scores för alla)"""
         try:
-            query_embedding = self.embedding_model.encode(query)
-            doc_embedding = self.embeddings_cache[doc_index]
-            
-            # Cosine similarity
-            import numpy as np
-            similarity = np.dot(query_embedding, doc_embedding) / (
-                np.linalg.norm(query_embedding) * np.linalg.norm(doc_embedding)
-            )
-            return float(similarity)
+            return float(self.doc_matrix[doc_index] @ self._embed_query(query))
         except Exception as e:
             self.logger.error(f"Fel vid semantisk likhet-beräkning: {e}")
             return 0.0
     
+    def semantic_scores(self, query: str) -> np.ndarray:
+        """Cosinuslikhet mot alla dokument plus keyword-bonus, som en vektor"""
+        scores = self.doc_matrix @ self._embed_query(query)
+        
+        # Bonus för keyword matches
+        for keyword in self._matching_keywords(query.lower()):
+            np.add.at(scores, self._keyword_index[keyword], 0.2)
+        return scores
+    
     def retrieve_relevant_context(self, query: str, top_k: int = 3) -> List[RetrievedContext]:
         """Hämta relevant kontext med semantisk sökning"""
         
         if not self.is_ai_related_query(query):
             return []
         
-        scored_docs = []
-        
-        for i, doc in enumerate(self.knowledge_docs):
-            # Använd semantisk likhet istället för enkel text-matching
-            semantic_score = self.semantic_similarity(query, i)
-            
-            # Bonus för keyword matches
-            keyword_score = 0
-            for keyword in doc['keywords']:
-                if keyword.lower() in query.lower():
-                    keyword_score += 0.2
-            
-            total_score = semantic_score + keyword_score
-            
-            if total_score > 0.3:  # Threshold för semantisk relevans
-                scored_docs.append((doc, total_score))
+        scores = self.semantic_scores(query)
         
-        # Sortera och returnera top_k
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
+        # Threshold för semantisk relevans, sedan top_k utan att sortera alla dokument
+        candidates = np.flatnonzero(scores > 0.3)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
         
         results = []
-        for doc, score in scored_docs[:top_k]:
+        for doc_id in candidates:
+            doc = self.knowledge_docs[doc_id]
             context = RetrievedContext(
                 content=doc['content'],
                 category=doc['category'],
                 title=doc['title'],
-                relevance_score=score,
+                relevance_score=float(scores[doc_id]),
                 coaching_context=doc['coaching_context']
             )
             results.append(context)
@@ -260,5 +382,75 @@ def create_rag_system() -> SimpleRAGSystem:
         logging.warning(f"Kunde inte skapa AdvancedRAGSystem, använder SimpleRAGSystem: {e}")
         return SimpleRAGSystem()
 
-# Globalt RAG-system instance
-rag_system = create_rag_system()
\ No newline at end of file
+class LazyRAGSystem:
+    """Lat proxy för det globala RAG-systemet
+    
+    Första användningen bygger ett SimpleRAGSystem (millisekunder). ``warm_up()``
+    bygger create_rag_system() i en bakgrundstråd och byter sedan till det i en
+    enda tilldelning; anrop som redan pågår fortsätter mot det gamla systemet.
+    Övriga attribut och metoder skickas vidare till aktuellt system.
+    """
+    
+    def __init__(self, factory=create_rag_system, fallback_factory=SimpleRAGSystem):
+        self._factory = factory
+        self._fallback_factory = fallback_factory
+        self._active: Optional[SimpleRAGSystem] = None
+        self._lock = threading.Lock()
+        self._warm_started = False
+        self._ready = threading.Event()
+        self.warmup_seconds: Optional[float] = None
+        self.warmup_error: Optional[str] = None
+    
+    def _current(self) -> SimpleRAGSystem:
+        active = self._active
+        if active is None:
+            with self._lock:
+                if self._active is None:
+                    self._active = self._fallback_factory()
+                active = self._active
+        return active
+    
+    def __getattr__(self, name):
+        return getattr(self._current(), name)
+    
+    def warm_up(self, background: bool = True) -> "LazyRAGSystem":
+        """Bygg det fullständiga RAG-systemet (en gång per process)"""
+        with self._lock:
+            if self._warm_started:
+                return self
+            self._warm_started = True
+        if background:
+            threading.Thread(target=self._warm, name="rag-warmup", daemon=True).start()
+        else:
+            self._warm()
+        return self
+    
+    def _warm(self):
+        started = time.perf_counter()
+        try:
+            system = self._factory()
+            # Atomärt byte - pågående anrop har redan sin referens till det gamla systemet
+            self._active = system
+        except Exception as e:
+            self.warmup_error = str(e)
+            logging.warning(f"Uppvärmning av RAG-systemet misslyckades, fortsätter med SimpleRAGSystem: {e}")
+        finally:
+            self.warmup_seconds = time.perf_counter() - started
+            self._ready.set()
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Vänta på uppvärmningen (True om den är klar)"""
+        return self._ready.wait(timeout)
+    
+    def get_status(self) -> Dict:
+        """Vilket system som används och hur lång tid uppvärmningen tog"""
+        active = self._active
+        return {
+            'backend': type(active).__name__ if active is not None else None,
+            'ready': self._ready.is_set(),
+            'warmup_seconds': self.warmup_seconds,
+            'warmup_error': self.warmup_error
+        }
+
+# Globalt RAG-system (byggs vid första användning, uppgraderas av warm_up())
+rag_system = LazyRAGSystem()
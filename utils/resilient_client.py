@@ -0,0 +1,345 @@
+"""
+Resilient Client för AI-Coachen
+Omsluter OpenAI-anrop med deadline per anrop, exponentiell backoff med jitter vid
+429/5xx, valfri hedging (dubblettanrop efter p95-latens) och en circuit breaker
+som svarar direkt medan upstream är ohälsosam. Utfall och latenser exporteras
+som mätvärden via get_stats()
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+import openai
+
+from .config import Config
+
+class UpstreamUnavailableError(Exception):
+    """Circuit breakern är öppen - anropet görs inte alls"""
+
+class DeadlineExceededError(Exception):
+    """Anropets totala tidsbudget tog slut innan ett svar kom"""
+
+class CircuitBreaker:
+    """Enkel circuit breaker: stängd → öppen efter N fel i rad → halvöppen efter viloperiod"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = None, reset_seconds: float = None):
+        self.failure_threshold = failure_threshold or Config.CIRCUIT_BREAKER_FAILURE_THRESHOLD
+        self.reset_seconds = reset_seconds if reset_seconds is not None else Config.CIRCUIT_BREAKER_RESET_SECONDS
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Får ett anrop göras just nu?"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                # Ett enda provanrop släpps igenom
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Felet säger inget om upstream - släpp provanropet men behåll tillståndet"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+def classify_error(error: Exception) -> str:
+    """Klassificera ett fel som mätvärdesnamn"""
+    if isinstance(error, openai.APITimeoutError):
+        return "timeout"
+    if isinstance(error, openai.APIConnectionError):
+        return "connection_error"
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code == 429:
+            return "rate_limited"
+        if error.status_code >= 500:
+            return "server_error"
+        return "client_error"
+    return "error"
+
+def proves_upstream_healthy(error: Exception) -> bool:
+    """Ett 4xx-svar (t.ex. ogiltig nyckel) betyder att upstream svarar"""
+    return isinstance(error, openai.APIStatusError) and 400 <= error.status_code < 500
+
+def is_retryable(error: Exception) -> bool:
+    """429, 5xx, timeouts och anslutningsfel är värda ett nytt försök"""
+    return classify_error(error) in ("timeout", "connection_error", "rate_limited", "server_error")
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Läs Retry-After från svaret om upstream skickat ett"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+class ResilientCaller:
+    """Kör API-anrop med deadline, retries, hedging och circuit breaker"""
+
+    def __init__(self, deadline_seconds: float = None, max_retries: int = None,
+                 backoff_base_seconds: float = None, backoff_max_seconds: float = None,
+                 hedge: bool = None, hedge_min_samples: int = None,
+                 breaker: CircuitBreaker = None):
+        self.logger = logging.getLogger(__name__)
+        self.deadline_seconds = deadline_seconds or Config.OPENAI_REQUEST_DEADLINE_SECONDS
+        self.max_retries = max_retries if max_retries is not None else Config.OPENAI_MAX_RETRIES
+        self.backoff_base_seconds = backoff_base_seconds or Config.OPENAI_RETRY_BASE_SECONDS
+        self.backoff_max_seconds = backoff_max_seconds or Config.OPENAI_RETRY_MAX_SECONDS
+        self.hedge = hedge if hedge is not None else Config.ENABLE_HEDGED_REQUESTS
+        self.hedge_min_samples = hedge_min_samples or Config.HEDGE_MIN_SAMPLES
+        self.breaker = breaker or CircuitBreaker()
+
+        # Mätvärden
+        self.outcomes = Counter()
+        self.latencies_ms = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    # --- Mätvärden ---
+
+    def _record(self, outcome: str, latency_ms: Optional[float] = None):
+        with self._lock:
+            self.outcomes[outcome] += 1
+            if latency_ms is not None:
+                self.latencies_ms.append(latency_ms)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Latens-percentil (ms) för lyckade försök"""
+        with self._lock:
+            samples = sorted(self.latencies_ms)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def _hedge_delay_seconds(self, stream: bool) -> Optional[float]:
+        """p95 i sekunder om hedging är påslaget och det finns tillräckligt med data"""
+        if not self.hedge or stream or len(self.latencies_ms) < self.hedge_min_samples:
+            return None
+        return self.percentile(95) / 1000
+
+    def get_stats(self) -> Dict:
+        """Utfall, latenser och breaker-tillstånd"""
+        with self._lock:
+            outcomes = dict(self.outcomes)
+        return {
+            'outcomes': outcomes,
+            'circuit_state': self.breaker.state,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'samples': len(self.latencies_ms)
+        }
+
+    # --- Gemensam logik ---
+
+    def _backoff_seconds(self, attempt: int, error: Exception) -> float:
+        """Full jitter: slumpa mellan 0 och exponentiellt växande tak (eller Retry-After)"""
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max_seconds)
+        cap = min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def _before_attempt(self, deadline: float) -> float:
+        """Kontrollera breaker och deadline, returnera återstående tid"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._record("deadline_exceeded")
+            raise DeadlineExceededError(f"Deadline på {self.deadline_seconds:.1f}s överskreds")
+        if not self.breaker.allow():
+            self._record("circuit_open")
+            raise UpstreamUnavailableError("OpenAI är tillfälligt otillgängligt (circuit breaker öppen)")
+        return remaining
+
+    def _after_failure(self, error: Exception, attempt: int, deadline: float) -> Optional[float]:
+        """Registrera felet; returnera väntetid före nästa försök eller None om felet ska kastas"""
+        outcome = classify_error(error)
+        self._record(outcome)
+
+        if not is_retryable(error):
+            # Bara ett 4xx från upstream visar att det svarar; lokala fel (TypeError,
+            # ValueError, okända undantag) får inte stänga en halvöppen breaker
+            if proves_upstream_healthy(error):
+                self.breaker.record_success()
+            else:
+                self.breaker.release_trial()
+            return None
+
+        self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            return None
+
+        delay = self._backoff_seconds(attempt, error)
+        if time.monotonic() + delay >= deadline:
+            return None
+
+        self._record("retry")
+        self.logger.warning(f"OpenAI-anrop misslyckades ({outcome}), försök {attempt + 1} om {delay:.2f}s")
+        return delay
+
+    def _on_success(self, started: float):
+        latency_ms = (time.monotonic() - started) * 1000
+        self.breaker.record_success()
+        self._record("success", latency_ms)
+
+    # --- Synkront ---
+
+    def new_deadline(self) -> float:
+        """Absolut deadline (time.monotonic) för ett anrop som startar nu"""
+        return time.monotonic() + self.deadline_seconds
+
+    def call(self, fn: Callable, deadline: float = None, **kwargs):
+        """Kör ``fn(**kwargs, timeout=...)`` med deadline, retries, hedging och breaker
+
+        ``deadline`` (från ``new_deadline``) låter flera anrop dela en tidsbudget,
+        t.ex. en tur som prövar reservmodeller
+        """
+        deadline = deadline if deadline is not None else self.new_deadline()
+        hedge_delay = self._hedge_delay_seconds(bool(kwargs.get("stream")))
+        attempt = 0
+
+        while True:
+            remaining = self._before_attempt(deadline)
+            started = time.monotonic()
+            try:
+                if hedge_delay is not None and hedge_delay < remaining:
+                    result = self._hedged_call(fn, kwargs, hedge_delay, deadline)
+                else:
+                    result = fn(**kwargs, timeout=remaining)
+                self._on_success(started)
+                return result
+            except Exception as e:
+                delay = self._after_failure(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+        return self._executor
+
+    def _hedged_call(self, fn: Callable, kwargs: Dict, hedge_delay: float, deadline: float):
+        """Skicka ett dubblettanrop om det första inte svarat inom p95 - första svaret vinner"""
+        executor = self._get_executor()
+        primary = executor.submit(fn, **kwargs, timeout=deadline - time.monotonic())
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        self._record("hedge_sent")
+        hedge = executor.submit(fn, **kwargs, timeout=max(0.001, deadline - time.monotonic()))
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._record("hedge_won")
+                    return future.result()
+                error = future.exception()
+
+        if error is not None:
+            raise error
+        self._record("deadline_exceeded")
+        raise DeadlineExceededError(f"Deadline på {self.deadline_seconds:.1f}s överskreds")
+
+    # --- Asynkront ---
+
+    async def acall(self, fn: Callable, deadline: float = None, **kwargs):
+        """Asynkron motsvarighet till call() för AsyncOpenAI"""
+        deadline = deadline if deadline is not None else self.new_deadline()
+        hedge_delay = self._hedge_delay_seconds(bool(kwargs.get("stream")))
+        attempt = 0
+
+        while True:
+            remaining = self._before_attempt(deadline)
+            started = time.monotonic()
+            try:
+                if hedge_delay is not None and hedge_delay < remaining:
+                    result = await self._ahedged_call(fn, kwargs, hedge_delay, deadline)
+                else:
+                    result = await fn(**kwargs, timeout=remaining)
+                self._on_success(started)
+                return result
+            except Exception as e:
+                delay = self._after_failure(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _ahedged_call(self, fn: Callable, kwargs: Dict, hedge_delay: float, deadline: float):
+        """Asynkron hedging - förloraren avbryts"""
+        primary = asyncio.ensure_future(fn(**kwargs, timeout=deadline - time.monotonic()))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        self._record("hedge_sent")
+        hedge = asyncio.ensure_future(fn(**kwargs, timeout=max(0.001, deadline - time.monotonic())))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0, deadline - time.monotonic()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._record("hedge_won")
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if error is not None:
+            raise error
+        self._record("deadline_exceeded")
+        raise DeadlineExceededError(f"Deadline på {self.deadline_seconds:.1f}s överskreds")
+
+# Processgemensam instans - breakern och mätvärdena delas av alla sessioner
+resilient_caller = ResilientCaller()
@@ -0,0 +1,169 @@
+"""
+Response Cache för AI-Coachen
+Exakt-match cache för deterministiska vägar (första turen, föreslagna frågor)
+Lagras i SQLite med TTL, LRU-utrensning och storleksgräns
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+from .config import Config
+
+class ResponseCache:
+    """Persistent cache för modellsvar nycklade på hela prompten"""
+    
+    def __init__(self, db_path: str = None, ttl_hours: float = None, max_entries: int = None):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path or Config.RESPONSE_CACHE_PATH
+        self.ttl_seconds = (ttl_hours if ttl_hours is not None else Config.RESPONSE_CACHE_TTL_HOURS) * 3600
+        self.max_entries = max_entries or Config.RESPONSE_CACHE_MAX_ENTRIES
+        
+        # Räknare för denna process
+        self.hits = 0
+        self.misses = 0
+        
+        self._init_database()
+    
+    def _init_database(self):
+        """Skapa cache-tabellen om den saknas"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    mode TEXT,
+                    model TEXT,
+                    created_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL,
+                    hit_count INTEGER DEFAULT 0
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_response_cache_last_accessed
+                ON response_cache (last_accessed)
+            """)
+            conn.commit()
+    
+    @staticmethod
+    def make_key(mode: str, messages: List[Dict], model: str, temperature: float) -> str:
+        """Bygg cache-nyckel av läge, prompt (system + normaliserad historik), modell och temperatur"""
+        normalized = [
+            [msg["role"], " ".join(msg["content"].split())]
+            for msg in messages
+        ]
+        payload = json.dumps(
+            [mode, model, round(temperature, 1), normalized],
+            ensure_ascii=False, separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, cache_key: str) -> Optional[str]:
+        """Hämta cachat svar om det finns och inte gått ut"""
+        now = time.time()
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT response, created_at FROM response_cache WHERE cache_key = ?",
+                    (cache_key,)
+                )
+                row = cursor.fetchone()
+                
+                if row and now - row[1] <= self.ttl_seconds:
+                    cursor.execute("""
+                        UPDATE response_cache 
+                        SET last_accessed = ?, hit_count = hit_count + 1
+                        WHERE cache_key = ?
+                    """, (now, cache_key))
+                    conn.commit()
+                    self.hits += 1
+                    return row[0]
+                
+                if row:
+                    # Utgången post
+                    cursor.execute("DELETE FROM response_cache WHERE cache_key = ?", (cache_key,))
+                    conn.commit()
+        except Exception as e:
+            self.logger.error(f"Error reading response cache: {str(e)}")
+        
+        self.misses += 1
+        return None
+    
+    def put(self, cache_key: str, response: str, mode: str = None, model: str = None):
+        """Spara svar och rensa minst nyligen använda poster över storleksgränsen"""
+        now = time.time()
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT OR REPLACE INTO response_cache 
+                    (cache_key, response, mode, model, created_at, last_accessed, hit_count)
+                    VALUES (?, ?, ?, ?, ?, ?, 0)
+                """, (cache_key, response, mode, model, now, now))
+                
+                cursor.execute("""
+                    DELETE FROM response_cache WHERE cache_key IN (
+                        SELECT cache_key FROM response_cache 
+                        ORDER BY last_accessed DESC 
+                        LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+                conn.commit()
+        except Exception as e:
+            self.logger.error(f"Error writing response cache: {str(e)}")
+    
+    def purge_expired(self) -> int:
+        """Ta bort alla utgångna poster"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "DELETE FROM response_cache WHERE created_at < ?",
+                    (time.time() - self.ttl_seconds,)
+                )
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            self.logger.error(f"Error purging response cache: {str(e)}")
+            return 0
+    
+    def clear(self):
+        """Töm cachen"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM response_cache")
+            conn.commit()
+    
+    def get_stats(self) -> Dict:
+        """Statistik för användningsdashboarden"""
+        entries = 0
+        total_hits = 0
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT COUNT(*), COALESCE(SUM(hit_count), 0) FROM response_cache")
+                entries, total_hits = cursor.fetchone()
+        except Exception as e:
+            self.logger.error(f"Error reading response cache stats: {str(e)}")
+        
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'total_hits_stored': total_hits
+        }
+
+# Singleton instance för global användning
+response_cache = ResponseCache()
@@ -0,0 +1,110 @@
+"""
+Semantisk svarscache för AI-Coachen
+Besvarar nästan identiska förstafrågor ("vad är machine learning?" /
+"förklara maskininlärning") från tidigare svar i samma läge
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .config import Config
+from .embeddings import embed_query
+
+class _ModeIndex:
+    """Begränsad float16-matris med svar för ett coaching-läge"""
+    
+    def __init__(self, capacity: int, dim: int):
+        self.matrix = np.zeros((capacity, dim), dtype=np.float16)
+        self.responses = [None] * capacity
+        self.queries = [None] * capacity
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.size = 0
+
+class SemanticResponseCache:
+    """Cache som matchar frågor på cosine-likhet mellan embeddings"""
+    
+    def __init__(self, threshold: float = None, max_entries: int = None):
+        self.logger = logging.getLogger(__name__)
+        self.threshold = threshold if threshold is not None else Config.SEMANTIC_CACHE_THRESHOLD
+        self.max_entries = max_entries or Config.SEMANTIC_CACHE_MAX_ENTRIES
+        
+        self._indexes: Dict[str, _ModeIndex] = {}
+        self._model_id: Optional[str] = None
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+    
+    def _index_for(self, mode: str, model_id: str, dim: int) -> _ModeIndex:
+        """Hämta index för läget - byte av embedder gör gamla vektorer ojämförbara"""
+        if model_id != self._model_id:
+            self._indexes.clear()
+            self._model_id = model_id
+        
+        index = self._indexes.get(mode)
+        if index is None:
+            index = _ModeIndex(self.max_entries, dim)
+            self._indexes[mode] = index
+        return index
+    
+    def lookup(self, mode: str, query: str) -> Optional[Tuple[str, float]]:
+        """Returnera (svar, likhet) för närmaste tidigare fråga över tröskeln"""
+        model_id, vector = embed_query(query)
+        
+        with self._lock:
+            index = self._index_for(mode, model_id, vector.shape[0])
+            if index.size == 0:
+                self.misses += 1
+                return None
+            
+            similarities = index.matrix[:index.size] @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+            
+            index.last_used[best] = time.time()
+            self.hits += 1
+            return index.responses[best], similarity
+    
+    def add(self, mode: str, query: str, response: str):
+        """Lägg till en fråga och dess svar, ersätt minst nyligen använda vid full cache"""
+        model_id, vector = embed_query(query)
+        
+        with self._lock:
+            index = self._index_for(mode, model_id, vector.shape[0])
+            if index.size < self.max_entries:
+                slot = index.size
+                index.size += 1
+            else:
+                slot = int(np.argmin(index.last_used))
+            
+            index.matrix[slot] = vector.astype(np.float16)
+            index.responses[slot] = response
+            index.queries[slot] = query
+            index.last_used[slot] = time.time()
+    
+    def get_stats(self) -> Dict:
+        """Statistik för användningsdashboarden"""
+        with self._lock:
+            entries = sum(index.size for index in self._indexes.values())
+            memory_bytes = sum(index.matrix.nbytes for index in self._indexes.values())
+        
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'embedding_model': self._model_id,
+            'matrix_bytes': memory_bytes
+        }
+
+# Singleton instance för global användning
+semantic_cache = SemanticResponseCache()
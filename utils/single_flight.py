@@ -0,0 +1,133 @@
+"""
+Single-flight för AI-Coachen
+Samtidiga identiska anrop delar på ett enda upstream-anrop och dess resultat, och
+färdiga resultat kan spelas upp igen under en kort tid (idempotensnycklar) så att
+Streamlit-omkörningar och dubbelklick inte debiteras två gånger
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from .config import Config
+
+class FlightAbandoned(Exception):
+    """Ledaren avbröts utan resultat - väntande anrop får göra anropet själva"""
+
+class Flight:
+    """Ett pågående (eller nyss avslutat) anrop för en nyckel"""
+
+    __slots__ = ("event", "result", "abandoned", "finished_at")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.abandoned = False
+        self.finished_at: Optional[float] = None
+
+class SingleFlight:
+    """Koalescering per nyckel plus uppspelning av färdiga resultat inom ``ttl_seconds``
+
+    ``begin`` ger ``(flight, leader)``. Ledaren gör anropet och avslutar med ``finish``
+    (eller ``abandon`` vid fel/avbrott); övriga väntar med ``wait``. En avslutad
+    flight som fortfarande minns returneras direkt med ``leader=False``.
+    """
+
+    def __init__(self, ttl_seconds: float = None, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.IDEMPOTENCY_TTL_SECONDS
+        self.max_entries = max_entries
+        self._flights: Dict[Hashable, Flight] = {}
+        self._lock = threading.Lock()
+
+        self.executed = 0
+        self.coalesced = 0
+        self.replayed = 0
+
+    def _expire(self, now: float):
+        """Glöm avslutade flights äldre än ttl och håll nere antalet (pågående rensas aldrig)"""
+        for key in [key for key, flight in self._flights.items()
+                    if flight.finished_at is not None and now - flight.finished_at > self.ttl_seconds]:
+            del self._flights[key]
+        overflow = len(self._flights) - self.max_entries
+        if overflow > 0:
+            finished = [key for key, flight in self._flights.items() if flight.finished_at is not None]
+            for key in finished[:overflow]:
+                del self._flights[key]
+
+    def begin(self, key: Hashable) -> Tuple[Flight, bool]:
+        """Registrera ett anrop; ``leader`` är True om det här anropet ska utföras"""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            flight = self._flights.get(key)
+            if flight is not None:
+                if flight.finished_at is not None:
+                    self.replayed += 1
+                else:
+                    self.coalesced += 1
+                return flight, False
+
+            flight = Flight()
+            self._flights[key] = flight
+            self.executed += 1
+            return flight, True
+
+    def finish(self, key: Hashable, flight: Flight, result: Any, remember: bool = True):
+        """Publicera ledarens resultat; ``remember=False`` glömmer det direkt efteråt"""
+        with self._lock:
+            flight.result = result
+            flight.finished_at = time.monotonic()
+            if not remember and self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.event.set()
+
+    def abandon(self, key: Hashable, flight: Flight):
+        """Ledaren gav upp - släpp väntande anrop och glöm nyckeln"""
+        with self._lock:
+            flight.abandoned = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.event.set()
+
+    def wait(self, flight: Flight, timeout: float = None) -> Any:
+        """Vänta på ledarens resultat (FlightAbandoned om ledaren gav upp, TimeoutError efter ``timeout``)"""
+        if not flight.event.wait(timeout if timeout is not None else Config.IDEMPOTENCY_WAIT_SECONDS):
+            raise TimeoutError("Tidsgräns i väntan på pågående anrop")
+        if flight.abandoned:
+            raise FlightAbandoned("Pågående anrop avbröts")
+        return flight.result
+
+    def do(self, key: Hashable, fn: Callable[[], Any],
+           remember: Callable[[Any], bool] = lambda result: True) -> Tuple[Any, bool]:
+        """Kör ``fn`` en gång per nyckel; ger ``(resultat, delat)``"""
+        while True:
+            flight, leader = self.begin(key)
+            if not leader:
+                try:
+                    return self.wait(flight), True
+                except FlightAbandoned:
+                    continue
+
+            try:
+                result = fn()
+            except BaseException:
+                self.abandon(key, flight)
+                raise
+            self.finish(key, flight, result, remember=remember(result))
+            return result, False
+
+    def get_stats(self) -> Dict:
+        """Utförda anrop och undertryckta dubbletter"""
+        with self._lock:
+            in_flight = sum(1 for flight in self._flights.values() if flight.finished_at is None)
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "replayed": self.replayed,
+                "suppressed": self.coalesced + self.replayed,
+                "in_flight": in_flight,
+                "remembered": len(self._flights) - in_flight
+            }
+
+# Processgemensam instans för chattinlämningar
+request_flights = SingleFlight()
@@ -0,0 +1,194 @@
+"""
+Tidsmätning per steg för AI-Coachen
+Namngivna spans (historik, token-räkning, RAG, API-anrop, affiliate, usage-spårning
+...) matas in i processgemensamma histogram så att en långsam tur kan delas upp i
+vår egen tid och OpenAI:s. Urvalet görs per tur (Config.SPAN_SAMPLE_RATE): alla
+spans i en utvald tur mäts, övriga turer kostar bara ett contextvar-uppslag per span
+
+Spans kan vara nästlade och mäter inklusive tid. ``snapshot()`` ger en
+maskinläsbar dump (JSON-kompatibel dict)
+"""
+
+import bisect
+import json
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from .config import Config
+
+# Övre gränser (ms) för histogrammens hinkar; sista hinken är allt däröver
+BUCKET_BOUNDS_MS = (
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+    1000, 2500, 5000, 10000, 30000, 60000
+)
+
+# Om aktuell tur mäts (None utanför en tur - då dras urvalet per span)
+_sampled: ContextVar[Optional[bool]] = ContextVar("span_sampled", default=None)
+
+class Histogram:
+    """Hinkhistogram med fasta gränser plus antal, summa och max"""
+
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Uppskattad percentil (linjär interpolation inom hinken)"""
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = BUCKET_BOUNDS_MS[index - 1] if index > 0 else 0.0
+                upper = BUCKET_BOUNDS_MS[index] if index < len(BUCKET_BOUNDS_MS) else self.max_ms
+                estimate = lower + (upper - lower) * max(0.0, rank - seen) / bucket_count
+                return min(estimate, self.max_ms)
+            seen += bucket_count
+        return self.max_ms
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": [
+                [bound, count] for bound, count in zip(list(BUCKET_BOUNDS_MS) + ["+Inf"], self.counts)
+                if count
+            ]
+        }
+
+class _NoopSpan:
+    """Delad span för turer som inte mäts"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopSpan()
+
+class _Span:
+    __slots__ = ("registry", "name", "started")
+
+    def __init__(self, registry: "SpanRegistry", name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry._record(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+class _Turn:
+    """Drar urvalet för en tur och mäter hela turen som spanen ``name``"""
+
+    __slots__ = ("registry", "name", "token", "span")
+
+    def __init__(self, registry: "SpanRegistry", name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        sampled = self.registry._draw()
+        self.token = _sampled.set(sampled)
+        self.span = _Span(self.registry, self.name) if sampled else None
+        if self.span:
+            self.span.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        if self.span:
+            self.span.__exit__(*exc)
+        try:
+            _sampled.reset(self.token)
+        except ValueError:
+            # Generatorn stängdes från ett annat context (t.ex. av skräpsamlaren)
+            pass
+        return False
+
+class SpanRegistry:
+    """Processgemensamma histogram per span-namn"""
+
+    def __init__(self, enabled: bool = None, sample_rate: float = None):
+        self.enabled = Config.ENABLE_SPANS if enabled is None else enabled
+        self.sample_rate = Config.SPAN_SAMPLE_RATE if sample_rate is None else sample_rate
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def _draw(self) -> bool:
+        return self.enabled and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def _record(self, name: str, ms: float):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    def turn(self, name: str = "turn") -> _Turn:
+        """Kontexthanterare runt en hel tur; spans inuti mäts bara om turen dras"""
+        return _Turn(self, name)
+
+    def span(self, name: str):
+        """Kontexthanterare som mäter ett steg (no-op om aktuell tur inte mäts)"""
+        sampled = _sampled.get()
+        if sampled is None:
+            sampled = self._draw()
+        return _Span(self, name) if sampled else _NOOP
+
+    def observe(self, name: str, ms: float):
+        """Registrera en redan uppmätt tid (följer samma urval som ``span``)"""
+        sampled = _sampled.get()
+        if sampled is None:
+            sampled = self._draw()
+        if sampled:
+            self._record(name, ms)
+
+    def snapshot(self) -> Dict:
+        """Maskinläsbar dump av alla histogram"""
+        with self._lock:
+            spans = {name: histogram.to_dict() for name, histogram in sorted(self._histograms.items())}
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "since": self.started_at,
+            "bucket_bounds_ms": list(BUCKET_BOUNDS_MS),
+            "spans": spans
+        }
+
+    def dump_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+        self.started_at = time.time()
+
+# Processgemensamt register
+span_registry = SpanRegistry()
@@ -0,0 +1,123 @@
+"""
+Textsökning för kunskapsbasen
+Gemensam tokenisering (skiljetecken, å/ä/ö, stoppord och en lätt svensk/engelsk
+stemmer) och ett BM25F-index där titel, keywords och innehåll är separata fält.
+IDF och längdnormering räknas ut när indexet byggs, så en sökning summerar bara
+färdiga bidrag för dokument som delar termer med frågan
+"""
+
+import math
+import re
+from functools import lru_cache
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+STOPWORDS = frozenset("""
+alla allt att av blev bli blir blivit de dem den denna deras dess dessa det detta dig din dina ditt
+du där då efter ej eller en er era ert ett från för ha hade han hans har henne hennes hon honom hur
+här i icke ingen inom inte jag ju kan kunde man med mellan men mig min mina mitt mot mycket ni nu
+när någon något några och om oss på samma sedan sig sin sina sitta själv skulle som så sådan sådana
+till under upp ut utan vad var vara varför varit varje vars vem vi vid vilka vilken vilket vill
+är åt än även över
+a about an and are as at be been but by can could did do does for from had has have how i if in
+into is it its me my no not of on or our so than that the their them then there these they this
+to too us was we were what when where which who why will with would you your
+""".split())
+
+# Längsta suffix först: svenska böjningsändelser (som i Snowball-stemmerns första steg,
+# modell/modeller/modellen/modellerna) och vanliga engelska ändelser. Stammen måste
+# behålla minst MIN_STEM tecken
+SUFFIXES = sorted("""
+heterna hetens anden andes andet arens arnas ernas heten heter ornas ande ades aren arna
+arne aste erna erns orna ing ade and are ast ens ern het ies ad ar as at en er es et
+or ed a e s
+""".split(), key=len, reverse=True)
+MIN_STEM = 3
+
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+def _strip_suffix(token: str) -> str:
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM:
+            if suffix == "s" and token.endswith(("ss", "us", "is")):
+                continue
+            return token[:-len(suffix)]
+    return token
+
+@lru_cache(maxsize=100_000)
+def stem(token: str) -> str:
+    """Lätt stemming: ta bort längsta matchande suffix, två varv så att böjda former
+    (träningen, företagets) landar på samma stam som grundformen"""
+    if token.isdigit():
+        return token
+    return _strip_suffix(_strip_suffix(token))
+
+def tokenize(text: str) -> List[str]:
+    """Gemener, dela på allt som inte är bokstäver/siffror, ta bort stoppord och stemma"""
+    return [
+        stem(token) for token in _TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+class BM25Index:
+    """BM25F över flera fält med förberäknade bidrag per (term, dokument)
+
+    ``documents`` är dicts med fältnamn som nycklar; listor (t.ex. keywords)
+    slås ihop till en text. ``weights`` och ``b`` anges per fält.
+    """
+
+    def __init__(self, documents: List[Dict], weights: Dict[str, float],
+                 b: Optional[Dict[str, float]] = None, k1: float = 1.2):
+        self.weights = weights
+        self.b = b or {field: 0.75 for field in weights}
+        self.k1 = k1
+        self.doc_count = len(documents)
+
+        field_tokens = [
+            {field: tokenize(self._field_text(doc.get(field, ""))) for field in weights}
+            for doc in documents
+        ]
+        avg_length = {
+            field: (sum(len(tokens[field]) for tokens in field_tokens) / self.doc_count) or 1.0
+            if self.doc_count else 1.0
+            for field in weights
+        }
+
+        # Viktad, längdnormerad termfrekvens per dokument (BM25F)
+        weighted_tf: Dict[str, Dict[int, float]] = defaultdict(dict)
+        for doc_id, tokens in enumerate(field_tokens):
+            for field, weight in weights.items():
+                if not tokens[field]:
+                    continue
+                norm = 1 - self.b[field] + self.b[field] * len(tokens[field]) / avg_length[field]
+                for term, count in Counter(tokens[field]).items():
+                    postings = weighted_tf[term]
+                    postings[doc_id] = postings.get(doc_id, 0.0) + weight * count / norm
+
+        self.idf: Dict[str, float] = {}
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        for term, postings in weighted_tf.items():
+            df = len(postings)
+            idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+            self.idf[term] = idf
+            self.postings[term] = [
+                (doc_id, idf * tf * (k1 + 1) / (k1 + tf)) for doc_id, tf in postings.items()
+            ]
+
+    @staticmethod
+    def _field_text(value) -> str:
+        if isinstance(value, (list, tuple)):
+            return " ".join(value)
+        return value or ""
+
+    def query_terms(self, query: str) -> List[str]:
+        """Frågans unika termer som finns i indexet"""
+        return [term for term in dict.fromkeys(tokenize(query)) if term in self.idf]
+
+    def score(self, query: str) -> Dict[int, float]:
+        """BM25F-score per dokument som delar minst en term med frågan"""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in self.query_terms(query):
+            for doc_id, contribution in self.postings[term]:
+                scores[doc_id] += contribution
+        return scores
@@ -0,0 +1,55 @@
+"""
+Token counting för AI-Coachen
+Delar tiktoken-encodings mellan alla coach-instanser i processen och cachar
+token-antal för statiska texter som personas
+"""
+
+import logging
+import math
+from functools import lru_cache
+
+import tiktoken
+
+# Nyare modellfamiljer som äldre tiktoken-versioner inte känner till
+ENCODING_PREFIXES = (
+    ("gpt-4o", "o200k_base"),
+    ("gpt-4.1", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("o4", "o200k_base"),
+)
+
+class ApproximateEncoding:
+    """Reserv-encoding när tiktoken inte kan ladda sin BPE-fil (t.ex. utan nätverk)"""
+    
+    CHARS_PER_TOKEN = 4
+    
+    def encode(self, text: str) -> list:
+        # Returnerar en lista med rätt längd så att len(encode(...)) fungerar som vanligt
+        return [0] * math.ceil(len(text) / self.CHARS_PER_TOKEN)
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """Hämta (och cacha) tokenizer för en modell - laddas en gång per process"""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Okänd modell - känd familj via prefix, annars standard-encodingen för chat-modeller
+            name = next((encoding for prefix, encoding in ENCODING_PREFIXES if model.startswith(prefix)),
+                        "cl100k_base")
+            return tiktoken.get_encoding(name)
+    except Exception as e:
+        logging.warning(f"Kunde inte ladda tiktoken-encoding för {model}, använder uppskattning: {e}")
+        return ApproximateEncoding()
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Räkna tokens i en text"""
+    if not text:
+        return 0
+    return len(get_encoding(model).encode(text))
+
+@lru_cache(maxsize=256)
+def count_static_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Räkna tokens för statiska texter (personas, mallar) - beräknas en gång per process"""
+    return count_tokens(text, model)
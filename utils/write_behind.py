@@ -0,0 +1,283 @@
+"""
+Write-behind för AI-Coachen
+Sessioner och meddelanden läggs i en begränsad kö i processen och skrivs av en
+bakgrundstråd i batchar (executemany i en transaktion), så att en chattur aldrig
+väntar på databasen. Kön töms när en session avslutas och när processen stängs;
+är kön full får anroparen vänta (back-pressure) istället för att data tappas.
+En misslyckad skrivning görs om med exponentiell backoff; först när alla försök
+misslyckats släpps batchen, och flush() rapporterar det
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from .config import Config
+
+class _FlushMarker:
+    """Läggs i kön av flush(); sätts när allt före den är skrivet eller släppt"""
+
+    __slots__ = ("event",)
+
+    def __init__(self):
+        self.event = threading.Event()
+
+class WriteBehindQueue:
+    """Begränsad skrivkö som töms i batchar av en bakgrundstråd
+
+    ``get_data_manager`` anropas först när något ska skrivas. Avstängd kö
+    (``enabled=False``) skriver direkt i anroparens tråd.
+    """
+
+    def __init__(self, get_data_manager: Callable, enabled: bool = None, max_queue: int = None,
+                 batch_size: int = None, flush_interval_seconds: float = None,
+                 put_timeout_seconds: float = None, max_retries: int = None,
+                 retry_backoff_seconds: float = None):
+        self.logger = logging.getLogger(__name__)
+        self.get_data_manager = get_data_manager
+        self.enabled = Config.ENABLE_WRITE_BEHIND if enabled is None else enabled
+        self.max_queue = max_queue or Config.WRITE_BEHIND_MAX_QUEUE
+        self.batch_size = batch_size or Config.WRITE_BEHIND_BATCH_SIZE
+        self.flush_interval_seconds = (
+            flush_interval_seconds if flush_interval_seconds is not None
+            else Config.WRITE_BEHIND_FLUSH_INTERVAL_SECONDS
+        )
+        self.put_timeout_seconds = put_timeout_seconds or Config.WRITE_BEHIND_PUT_TIMEOUT_SECONDS
+        self.max_retries = max_retries if max_retries is not None else Config.WRITE_BEHIND_MAX_RETRIES
+        self.retry_backoff_seconds = (
+            retry_backoff_seconds if retry_backoff_seconds is not None
+            else Config.WRITE_BEHIND_RETRY_BACKOFF_SECONDS
+        )
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._atexit_registered = False
+
+        # Mätvärden
+        self._stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.peak_depth = 0
+        self.batches = 0
+        self.sessions_written = 0
+        self.messages_written = 0
+        self.failed_batches = 0
+        self.retries = 0
+        self.dropped_batches = 0
+        self.dropped_items = 0
+        self.backpressure_waits = 0
+        self.flush_ms = deque(maxlen=500)
+        self.lag_ms = deque(maxlen=500)
+
+    # --- Inläggning ---
+
+    def enqueue_session(self, row: Dict):
+        """Köa en sessionsrad (samma format som DataManager.save_session)"""
+        self._put(("session", row, time.monotonic()))
+
+    def enqueue_message(self, message: Dict):
+        """Köa ett meddelande (session_id, role, content, timestamp, metadata)"""
+        self._put(("message", message, time.monotonic()))
+
+    def _put(self, item):
+        if not self.enabled:
+            self._write([item])
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Back-pressure: vänta på bakgrundstråden hellre än att tappa data
+            with self._stats_lock:
+                self.backpressure_waits += 1
+            while True:
+                try:
+                    self._queue.put(item, timeout=self.put_timeout_seconds)
+                    break
+                except queue.Full:
+                    self.logger.warning(f"Write-behind-kön är full ({self.max_queue}) - väntar på databasen")
+                    self._ensure_started()
+
+        with self._stats_lock:
+            self.enqueued += 1
+            self.peak_depth = max(self.peak_depth, self._queue.qsize())
+
+    # --- Bakgrundstråd ---
+
+    def _ensure_started(self):
+        """Starta (eller återstarta) bakgrundstråden och registrera tömning vid avslut"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            try:
+                first = self._queue.get(timeout=self.flush_interval_seconds)
+            except queue.Empty:
+                continue
+
+            # Samla fler poster en kort stund så att en tur blir en transaktion
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval_seconds
+            while len(batch) < self.batch_size and not isinstance(batch[-1], _FlushMarker):
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                                 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_with_retry(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_with_retry(self, batch: List) -> bool:
+        """Skriv batchen med backoff mellan försöken och släpp sedan väntande flush-anrop"""
+        items = [item for item in batch if not isinstance(item, _FlushMarker)]
+        try:
+            for attempt in range(self.max_retries + 1):
+                if self._write(items):
+                    return True
+                if attempt < self.max_retries:
+                    delay = self.retry_backoff_seconds * (2 ** attempt)
+                    with self._stats_lock:
+                        self.retries += 1
+                    self.logger.warning(f"Write-behind-batch misslyckades, försök {attempt + 2} om {delay:.2f}s")
+                    # Vid avslut görs resterande försök utan väntan
+                    self._stopping.wait(delay)
+
+            with self._stats_lock:
+                self.dropped_batches += 1
+                self.dropped_items += len(items)
+            self.logger.error(f"Write-behind-batch med {len(items)} poster släpptes efter "
+                              f"{self.max_retries + 1} försök")
+            return False
+        finally:
+            for marker in batch:
+                if isinstance(marker, _FlushMarker):
+                    marker.event.set()
+
+    def _write(self, items: List) -> bool:
+        """Skriv poster i en transaktion; False om databasen inte tog emot dem"""
+        sessions: Dict[str, Dict] = {}
+        messages: List[Dict] = []
+        enqueued_at: List[float] = []
+        for item in items:
+            kind, payload, at = item
+            enqueued_at.append(at)
+            if kind == "session":
+                # Bara senaste raden per session behöver skrivas
+                sessions.pop(payload['session_id'], None)
+                sessions[payload['session_id']] = payload
+            else:
+                messages.append(payload)
+
+        if not (sessions or messages):
+            return True
+
+        started = time.monotonic()
+        try:
+            with self._write_lock:
+                ok = self.get_data_manager().save_sessions_batch(list(sessions.values()), messages)
+        except Exception as e:
+            self.logger.error(f"Write-behind-batch misslyckades: {str(e)}")
+            ok = False
+        finished = time.monotonic()
+
+        with self._stats_lock:
+            if ok:
+                self.batches += 1
+                self.sessions_written += len(sessions)
+                self.messages_written += len(messages)
+                self.flush_ms.append((finished - started) * 1000)
+                self.lag_ms.append((finished - min(enqueued_at)) * 1000)
+            else:
+                self.failed_batches += 1
+        return ok
+
+    # --- Tömning ---
+
+    def flush(self, timeout: float = 10) -> bool:
+        """Vänta tills allt som köats hittills är skrivet
+
+        True bara om det hann klart och ingen batch släppts under tiden
+        """
+        dropped_before = self.dropped_batches
+        if self._thread is None or not self._thread.is_alive():
+            # Ingen bakgrundstråd (t.ex. vid avslut) - töm kön i anroparens tråd
+            batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    self._queue.task_done()
+                except queue.Empty:
+                    break
+            return self._write_with_retry(batch) and self.dropped_batches == dropped_before
+
+        marker = _FlushMarker()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.event.wait(timeout) and self.dropped_batches == dropped_before
+
+    def stop(self, timeout: float = 10):
+        """Töm kön och stoppa bakgrundstråden (registreras med atexit)"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            self.flush(timeout)
+            return
+        self._stopping.set()
+        thread.join(timeout)
+        self.flush(timeout)
+
+    # --- Mätvärden ---
+
+    @staticmethod
+    def _percentile(samples, p: float) -> Optional[float]:
+        samples = sorted(samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+    def get_stats(self) -> Dict:
+        """Ködjup, skrivna rader och flush-latens"""
+        with self._stats_lock:
+            flush_ms = list(self.flush_ms)
+            lag_ms = list(self.lag_ms)
+            return {
+                'enabled': self.enabled,
+                'queue_depth': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'peak_depth': self.peak_depth,
+                'enqueued': self.enqueued,
+                'batches': self.batches,
+                'sessions_written': self.sessions_written,
+                'messages_written': self.messages_written,
+                'failed_batches': self.failed_batches,
+                'retries': self.retries,
+                'dropped_batches': self.dropped_batches,
+                'dropped_items': self.dropped_items,
+                'backpressure_waits': self.backpressure_waits,
+                'flush_p50_ms': self._percentile(flush_ms, 50),
+                'flush_p95_ms': self._percentile(flush_ms, 95),
+                'lag_p95_ms': self._percentile(lag_ms, 95)
+            }